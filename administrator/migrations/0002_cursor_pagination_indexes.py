@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("administrator", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="systemlog",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="administrat_created_267107_idx"
+            ),
+        ),
+    ]
@@ -46,6 +46,9 @@ class SystemLog(models.Model):
         verbose_name = "系統日誌"
         verbose_name_plural = "系統日誌"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.action} - {self.model_name} - {self.created_at}"
@@ -25,6 +25,7 @@ urlpatterns = [
     
     # 系統日誌
     path('logs/', views.system_logs, name='system_logs'),
+    path('metrics/admission/', views.admission_metrics, name='admission_metrics'),
     
     # 問答管理
     path('questions/', views.question_management, name='question_management'),
@@ -7,12 +7,19 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.db.models import Count, Sum, Q
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from database.models import (
     Product, Category, Order, OrderItem, CustomerProfile,
-    ProductReview, Notification, Coupon, ProductQuestion
+    ProductReview, Coupon, ProductQuestion
 )
+from database.admission import controller as admission_controller
+from database.coupons import void_redemptions
+from database.notifications import notify
+from database.pagination import CursorPaginator
+from database.reservations import ReservationError, confirm_order, release_order_holds
+from database.search import search_products
 from payment.models import PaymentTransaction, Refund
 from .models import SystemLog
 from datetime import datetime, timedelta
@@ -80,10 +87,7 @@ def product_management(request):
     status_filter = request.GET.get('status')
     
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        products = search_products(products, search_query)
     
     if status_filter:
         products = products.filter(status=status_filter)
@@ -186,7 +190,7 @@ def product_delete(request, pk):
 @user_passes_test(is_admin)
 def order_management(request):
     """訂單管理"""
-    orders = Order.objects.all().order_by('-created_at')
+    orders = Order.objects.select_related('user')
     
     status_filter = request.GET.get('status')
     search_query = request.GET.get('search')
@@ -200,9 +204,8 @@ def order_management(request):
             Q(user__username__icontains=search_query)
         )
     
-    paginator = Paginator(orders, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(orders, 20, count='estimate')
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'orders': page_obj,
@@ -222,8 +225,21 @@ def order_detail_admin(request, order_id):
         new_status = request.POST.get('status')
         if new_status in dict(Order.STATUS_CHOICES):
             old_status = order.status
-            order.status = new_status
-            order.save()
+            try:
+                with transaction.atomic():
+                    if old_status == 'pending' and new_status not in ('pending', 'cancelled'):
+                        # 待付款訂單改為已付款或之後的狀態時與付款相同：扣除庫存並確認保留
+                        confirm_order(order)
+                    order.status = new_status
+                    order.save()
+                    if new_status == 'cancelled' and old_status != 'cancelled':
+                        # 取消的訂單立即釋放庫存保留，並歸還優惠券使用次數
+                        release_order_holds(order)
+                        void_redemptions([order.pk])
+            except ReservationError as e:
+                order.status = old_status
+                messages.error(request, str(e))
+                return render(request, 'administrator/order_detail.html', {'order': order})
             
             SystemLog.objects.create(
                 user=request.user,
@@ -235,8 +251,8 @@ def order_detail_admin(request, order_id):
             )
             
             # 建立通知
-            Notification.objects.create(
-                user=order.user,
+            notify(
+                order.user,
                 type='order',
                 title='訂單狀態更新',
                 message=f'您的訂單 {order.order_number} 狀態已更新為 {order.get_status_display()}'
@@ -298,8 +314,8 @@ def process_refund(request, refund_id):
         )
         
         # 建立通知
-        Notification.objects.create(
-            user=refund.order.user,
+        notify(
+            refund.order.user,
             type='payment',
             title='退款已完成',
             message=f'您的退款申請 {refund.refund_id} 已完成，金額 {refund.amount} 元'
@@ -320,8 +336,8 @@ def process_refund(request, refund_id):
         )
         
         # 建立通知
-        Notification.objects.create(
-            user=refund.order.user,
+        notify(
+            refund.order.user,
             type='payment',
             title='退款申請已拒絕',
             message=f'您的退款申請 {refund.refund_id} 已被拒絕'
@@ -356,19 +372,34 @@ def user_management(request):
     return render(request, 'administrator/user_management.html', context)
 
 
+@login_required
+@user_passes_test(is_admin)
+def admission_metrics(request):
+    """熱門商品排隊指標：各商品的排隊深度、放行數與等待時間（本行程）"""
+    metrics = admission_controller.metrics()
+    names = dict(Product.objects.filter(pk__in=metrics).values_list('pk', 'name'))
+    products = [
+        {'product_id': pk, 'name': names.get(pk, ''), **values}
+        for pk, values in sorted(metrics.items(), key=lambda item: -item[1]['queue_depth'])
+    ]
+    return JsonResponse({
+        'queue_depth': sum(item['queue_depth'] for item in products),
+        'products': products,
+    })
+
+
 @login_required
 @user_passes_test(is_admin)
 def system_logs(request):
     """系統日誌"""
-    logs = SystemLog.objects.all().order_by('-created_at')
+    logs = SystemLog.objects.select_related('user')
     
     action_filter = request.GET.get('action')
     if action_filter:
         logs = logs.filter(action=action_filter)
     
-    paginator = Paginator(logs, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(logs, 50, count='estimate')
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'logs': page_obj,
@@ -427,8 +458,8 @@ def answer_question(request, question_id):
     )
     
     # 建立通知
-    Notification.objects.create(
-        user=question.user,
+    notify(
+        question.user,
         type='system',
         title='問題已回覆',
         message=f'您對商品 {question.product.name} 的提問已獲得回覆'
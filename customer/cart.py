@@ -0,0 +1,275 @@
+"""
+顧客系統 (CS) - 購物車服務
+購物車以一次查詢載入（連同商品），總計由定價模組計算；
+導覽列使用的摘要（件數、總計）依使用者快取，購物車異動時失效。
+未登入使用者的購物車存放在簽章 Cookie，不建立任何資料列，登入後以一次 upsert 併入 ShoppingCart
+"""
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from database.models import Product, ShoppingCart
+from database.pricing import Line, price_cart
+from database.reservations import available_stock
+
+# 摘要快取秒數；商品改價時摘要的總計最多延遲這段時間
+CART_SUMMARY_TIMEOUT = 300
+
+EMPTY_SUMMARY = {'count': 0, 'total': 0}
+
+
+def _line_total():
+    return ExpressionWrapper(
+        F('product__price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def _summary_cache_key(user_id):
+    return f'cart_summary:{user_id}'
+
+
+def cart_items(user):
+    """使用者的購物車項目（含商品），每筆帶有資料庫計算的 line_total（小計）"""
+    return (
+        ShoppingCart.objects.filter(user=user)
+        .select_related('product')
+        .annotate(line_total=_line_total())
+        .order_by('created_at', 'pk')
+    )
+
+
+def price_lines(items, rule=None):
+    """以定價模組計算購物車項目（ShoppingCart 或 CartLine）的報價"""
+    return price_cart([Line(item.product.price, item.quantity) for item in items], rule)
+
+
+def get_cart(user):
+    """回傳 (購物車項目清單, 總計)"""
+    items = list(cart_items(user))
+    return items, price_lines(items).total
+
+
+def cart_summary(user):
+    """購物車件數與總計（快取）"""
+    key = _summary_cache_key(user.pk)
+    summary = cache.get(key)
+    if summary is None:
+        summary = ShoppingCart.objects.filter(user=user).aggregate(
+            count=Coalesce(Sum('quantity'), 0),
+            total=Coalesce(Sum(_line_total()), 0, output_field=DecimalField(max_digits=12, decimal_places=2)),
+        )
+        cache.set(key, summary, CART_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_cart(user_id):
+    """購物車異動提交後讓摘要快取失效"""
+    transaction.on_commit(lambda: cache.delete(_summary_cache_key(user_id)))
+
+
+def add_item(user, product, quantity, available):
+    """加入商品，數量累加但不超過可售庫存 available"""
+    cart_item, created = ShoppingCart.objects.get_or_create(
+        user=user,
+        product=product,
+        defaults={'quantity': quantity}
+    )
+    if not created:
+        cart_item.quantity = min(cart_item.quantity + quantity, available)
+        cart_item.save(update_fields=['quantity', 'updated_at'])
+    invalidate_cart(user.pk)
+    return cart_item
+
+
+def set_quantity(cart_item, quantity):
+    cart_item.quantity = quantity
+    cart_item.save(update_fields=['quantity', 'updated_at'])
+    invalidate_cart(cart_item.user_id)
+
+
+def remove_item(cart_item):
+    cart_item.delete()
+    invalidate_cart(cart_item.user_id)
+
+
+class CartUpdateError(Exception):
+    """批次更新有項目無法套用，errors 為 {商品 ID: 原因}；整批都不會套用"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('；'.join(errors.values()))
+
+
+def validate_changes(changes, user=None, current=None):
+    """
+    以一次查詢檢查 {商品 ID: 新數量} 的可售庫存，有問題時拋出 CartUpdateError。
+    不扣除 user 自己的結帳保留；current 為目前的 {商品 ID: 數量}，減少數量一律允許
+    """
+    current = current or {}
+    available = available_stock(list(changes), user=user)
+    errors = {}
+    for product_id, quantity in changes.items():
+        if product_id not in available:
+            errors[product_id] = '商品不存在'
+        elif quantity > current.get(product_id, 0) and quantity > available[product_id]:
+            errors[product_id] = f'庫存不足（剩餘 {max(available[product_id], 0)}）'
+    if errors:
+        raise CartUpdateError(errors)
+
+
+def apply_changes(user, changes):
+    """
+    批次設定購物車數量 {商品 ID: 新數量}（0 為移除），檢查庫存後
+    以 bulk_update／bulk_create／delete 各一個語句套用
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {item.product_id: item for item in ShoppingCart.objects.filter(user=user, product__in=changes)}
+        validate_changes(changes, user, {product_id: item.quantity for product_id, item in existing.items()})
+        to_update, to_create, to_delete = [], [], []
+        for product_id, quantity in changes.items():
+            item = existing.get(product_id)
+            if quantity <= 0:
+                if item:
+                    to_delete.append(item.pk)
+            elif item:
+                item.quantity, item.updated_at = quantity, now
+                to_update.append(item)
+            else:
+                to_create.append(ShoppingCart(user=user, product_id=product_id, quantity=quantity))
+        if to_update:
+            ShoppingCart.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        if to_create:
+            ShoppingCart.objects.bulk_create(to_create)
+        if to_delete:
+            ShoppingCart.objects.filter(pk__in=to_delete).delete()
+        invalidate_cart(user.pk)
+
+
+# 匿名購物車 Cookie（格式：商品ID-數量.商品ID-數量，以簽章防止竄改）
+COOKIE_NAME = 'cart'
+COOKIE_SALT = 'customer.cart'
+COOKIE_MAX_AGE = 30 * 24 * 3600
+# Cookie 大小有限，匿名購物車最多的商品項數
+MAX_ANONYMOUS_LINES = 50
+
+
+@dataclass
+class CartLine:
+    """匿名購物車項目，介面與 ShoppingCart 相同（pk 為商品 ID）"""
+    pk: int
+    product: Product
+    quantity: int
+
+    @property
+    def line_total(self):
+        return self.product.price * self.quantity
+
+
+def _parse(value):
+    quantities = {}
+    for part in value.split('.') if value else []:
+        product_id, _, quantity = part.partition('-')
+        if product_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+            quantities[int(product_id)] = int(quantity)
+    return quantities
+
+
+class AnonymousCart:
+    """未登入使用者的購物車，由 AnonymousCartMiddleware 讀取並於回應時寫回 Cookie"""
+
+    def __init__(self, request):
+        self.quantities = _parse(
+            request.get_signed_cookie(COOKIE_NAME, default='', salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE)
+        )
+        self.modified = False
+
+    def __bool__(self):
+        return bool(self.quantities)
+
+    def is_full(self, product_id):
+        return product_id not in self.quantities and len(self.quantities) >= MAX_ANONYMOUS_LINES
+
+    def add(self, product_id, quantity, available):
+        """加入商品，數量累加但不超過可售庫存 available"""
+        self.set(product_id, min(self.quantities.get(product_id, 0) + quantity, available))
+
+    def set(self, product_id, quantity):
+        if quantity > 0:
+            self.quantities[product_id] = quantity
+        else:
+            self.quantities.pop(product_id, None)
+        self.modified = True
+
+    def remove(self, product_id):
+        self.set(product_id, 0)
+
+    def clear(self):
+        self.quantities = {}
+        self.modified = True
+
+    def apply_changes(self, changes):
+        """批次設定數量，與 apply_changes(user, changes) 相同"""
+        validate_changes(changes, current=self.quantities)
+        lines = {product_id for product_id in self.quantities if changes.get(product_id, 1) > 0}
+        lines |= {product_id for product_id, quantity in changes.items() if quantity > 0}
+        if len(lines) > MAX_ANONYMOUS_LINES:
+            raise CartUpdateError({None: '購物車商品項目已達上限，請登入後繼續選購'})
+        for product_id, quantity in changes.items():
+            self.set(product_id, quantity)
+
+    def lines(self):
+        """購物車項目（一次查詢載入商品，已下架刪除的商品略過）"""
+        products = Product.objects.in_bulk(list(self.quantities))
+        return [
+            CartLine(pk=product_id, product=products[product_id], quantity=quantity)
+            for product_id, quantity in self.quantities.items()
+            if product_id in products
+        ]
+
+    def get_cart(self):
+        """回傳 (購物車項目清單, 總計)，與 get_cart(user) 相同"""
+        lines = self.lines()
+        return lines, price_lines(lines).total
+
+    def summary(self):
+        _, total = self.get_cart()
+        return {'count': sum(self.quantities.values()), 'total': total}
+
+    def save(self, response):
+        if not self.modified:
+            return
+        if self.quantities:
+            value = '.'.join(f'{product_id}-{quantity}' for product_id, quantity in self.quantities.items())
+            response.set_signed_cookie(
+                COOKIE_NAME, value, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax'
+            )
+        else:
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+
+
+def merge_anonymous_cart(user, quantities):
+    """
+    登入後將匿名購物車併入 ShoppingCart：數量與既有項目相加並以可售庫存為上限，
+    以一次 INSERT ... ON CONFLICT (user, product) DO UPDATE 寫入，回傳併入的項數
+    """
+    if not quantities:
+        return 0
+    existing = dict(
+        ShoppingCart.objects.filter(user=user, product__in=quantities).values_list('product_id', 'quantity')
+    )
+    available = available_stock(list(quantities), user=user)
+    rows = []
+    for product_id, quantity in quantities.items():
+        merged = min(existing.get(product_id, 0) + quantity, available.get(product_id, 0))
+        if merged > existing.get(product_id, 0):
+            rows.append(ShoppingCart(user=user, product_id=product_id, quantity=merged))
+    ShoppingCart.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['user', 'product'], update_fields=['quantity', 'updated_at']
+    )
+    invalidate_cart(user.pk)
+    return len(rows)
@@ -0,0 +1,103 @@
+"""
+顧客系統 (CS) - 結帳服務
+進入結帳時保留購物車商品的數量，下單時將保留轉給訂單（不扣庫存），付款確認時才扣除庫存。
+下單在同一個交易中完成，任何步驟失敗即整筆回滾，保留量不會超過可售庫存，因此並行結帳也不會超賣
+"""
+from django.db import transaction
+
+from database.coupons import CouponError, claim_coupon, record_redemption
+from database.ids import ORDER_PREFIX, new_id
+from database.models import Order, OrderItem, ShoppingCart
+from database.notifications import notify
+from database.reservations import InsufficientStock, attach_holds, hold_stock, payment_hold_ttl
+from .cart import invalidate_cart, price_lines
+
+
+class CheckoutError(Exception):
+    """結帳失敗，訊息可直接顯示給使用者"""
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f"{'、'.join(product.name for product in products)} 庫存不足")
+
+
+def _cart_quantities(cart_items):
+    quantities = {}
+    for item in cart_items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+
+def hold_cart(user, cart_items):
+    """進入結帳時保留購物車商品的數量並回傳保留到期時間，可售數量不足時拋出 OutOfStock"""
+    try:
+        return hold_stock(user, _cart_quantities(cart_items))
+    except InsufficientStock as e:
+        raise OutOfStock(e.products) from e
+
+
+def place_order(user, shipping_address, shipping_phone, notes='', coupon_code=''):
+    """
+    將使用者的購物車轉為訂單，回傳 (訂單, 優惠券錯誤訊息或 None)。
+    進入結帳時建立的保留若仍有效則直接轉給訂單，否則重新保留；庫存於付款確認時才扣除。
+    查詢數固定，不隨購物車項目數增加；任何步驟失敗時整筆回滾，購物車與保留維持原狀。
+    """
+    with transaction.atomic():
+        cart_items = list(ShoppingCart.objects.filter(user=user).select_related('product'))
+        if not cart_items:
+            raise CheckoutError('購物車是空的')
+
+        quantities = _cart_quantities(cart_items)
+
+        quote = price_lines(cart_items)
+        coupon, discount, coupon_error = None, 0, None
+        if coupon_code:
+            # 優惠券無法使用時仍照原價下單，並回傳原因
+            try:
+                coupon, discount = claim_coupon(coupon_code, user, quote.subtotal)
+            except CouponError as e:
+                coupon_error = str(e)
+        total = quote.subtotal - discount
+
+        order_number = new_id(ORDER_PREFIX)
+        order = Order.objects.create(
+            user=user,
+            order_number=order_number,
+            total_amount=total,
+            shipping_address=shipping_address,
+            shipping_phone=shipping_phone,
+            notes=notes,
+            status='pending'
+        )
+        if not attach_holds(user, quantities, order):
+            try:
+                hold_stock(user, quantities, ttl=payment_hold_ttl(), order=order)
+            except InsufficientStock as e:
+                raise OutOfStock(e.products) from e
+        if coupon is not None:
+            record_redemption(coupon, user, order, discount)
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                quantity=item.quantity,
+                price=item.product.price,
+                subtotal=item.subtotal
+            )
+            for item in cart_items
+        ])
+
+        ShoppingCart.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+        invalidate_cart(user.pk)
+
+        notify(
+            user,
+            type='order',
+            title='訂單已建立',
+            message=f'您的訂單 {order_number} 已建立，請完成付款'
+        )
+
+    return order, coupon_error
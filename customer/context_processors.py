@@ -0,0 +1,25 @@
+"""
+顧客系統 (CS) - 模板上下文處理器
+"""
+from django.utils.functional import SimpleLazyObject
+
+from database.notifications import unread_count
+
+from . import cart
+
+
+def cart_summary(request):
+    """提供快取的購物車摘要給導覽列徽章，僅在模板使用時才載入"""
+    if not request.user.is_authenticated:
+        anonymous_cart = getattr(request, 'anonymous_cart', None)
+        if not anonymous_cart:
+            return {'cart_summary': cart.EMPTY_SUMMARY}
+        return {'cart_summary': SimpleLazyObject(anonymous_cart.summary)}
+    return {'cart_summary': SimpleLazyObject(lambda: cart.cart_summary(request.user))}
+
+
+def unread_notifications(request):
+    """提供快取的未讀通知數給導覽列徽章，僅在模板使用時才載入"""
+    if not request.user.is_authenticated:
+        return {'unread_notification_count': 0}
+    return {'unread_notification_count': SimpleLazyObject(lambda: unread_count(request.user))}
@@ -0,0 +1,131 @@
+"""
+顧客系統 (CS) - 商品篩選面向（facets）
+每組面向的計數只用一次查詢取得，並依正規化後的篩選條件快取
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from database.categories import get_category_tree
+
+# (參數值, 顯示名稱, 下限, 上限)
+PRICE_BUCKETS = [
+    ('0-500', 'NT$ 500 以下', None, 500),
+    ('500-1000', 'NT$ 500 - 1,000', 500, 1000),
+    ('1000-3000', 'NT$ 1,000 - 3,000', 1000, 3000),
+    ('3000-', 'NT$ 3,000 以上', 3000, None),
+]
+
+# (參數值, 顯示名稱, 最低平均評分)
+RATING_BANDS = [
+    ('4', '4 星以上', 4),
+    ('3', '3 星以上', 3),
+    ('2', '2 星以上', 2),
+]
+
+FACET_CACHE_TIMEOUT = 60
+
+
+def _price_q(key):
+    for bucket_key, _, low, high in PRICE_BUCKETS:
+        if bucket_key == key:
+            q = Q()
+            if low is not None:
+                q &= Q(price__gte=low)
+            if high is not None:
+                q &= Q(price__lt=high)
+            return q
+    return None
+
+
+def _rating_q(key):
+    for band_key, _, minimum in RATING_BANDS:
+        if band_key == key:
+            return Q(rating_average__gte=minimum)
+    return None
+
+
+class CatalogFilters:
+    """由 GET 參數解析出的商品篩選條件，無效值一律忽略"""
+
+    def __init__(self, params):
+        category = params.get('category', '')
+        self.category = int(category) if category.isdigit() else None
+        self.price = params.get('price') if _price_q(params.get('price')) is not None else None
+        self.rating = params.get('rating') if _rating_q(params.get('rating')) is not None else None
+        self.in_stock = params.get('in_stock') == '1'
+        self.search = (params.get('search') or '').strip()
+        self._category_ids = None
+
+    def category_ids(self):
+        if self._category_ids is None and self.category is not None:
+            self._category_ids = get_category_tree().subtree_ids(self.category)
+        return self._category_ids
+
+    def q(self, exclude=None):
+        """組合所有篩選條件；exclude 指定的面向不套用（用於計算該面向自己的數量）"""
+        q = Q()
+        if self.category is not None and exclude != 'category':
+            q &= Q(category_id__in=self.category_ids())
+        if self.price and exclude != 'price':
+            q &= _price_q(self.price)
+        if self.rating and exclude != 'rating':
+            q &= _rating_q(self.rating)
+        if self.in_stock and exclude != 'in_stock':
+            q &= Q(stock__gt=0)
+        return q
+
+    def signature(self):
+        """正規化後的條件簽章，作為快取鍵"""
+        data = [self.search.lower(), self.category, self.price, self.rating, self.in_stock]
+        return hashlib.md5(json.dumps(data).encode()).hexdigest()
+
+
+def facet_counts(queryset, filters, tree):
+    """
+    計算各面向的商品數量（不套用該面向自身的條件）。
+    價格、評分、庫存合併為一次條件彙總查詢，分類另以一次 GROUP BY 查詢後在記憶體中累加子樹。
+    """
+    cache_key = f'catalog_facets:{tree.version}:{filters.signature()}'
+    facets = cache.get(cache_key)
+    if facets is not None:
+        return facets
+
+    aggregates = {}
+    for index, (key, _, _, _) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price_{index}'] = Count('pk', filter=_price_q(key) & filters.q(exclude='price'))
+    for index, (key, _, _) in enumerate(RATING_BANDS):
+        aggregates[f'rating_{index}'] = Count('pk', filter=_rating_q(key) & filters.q(exclude='rating'))
+    aggregates['in_stock'] = Count('pk', filter=Q(stock__gt=0) & filters.q(exclude='in_stock'))
+    totals = queryset.order_by().aggregate(**aggregates)
+
+    direct_counts = dict(
+        queryset.filter(filters.q(exclude='category'))
+        .order_by()
+        .values_list('category_id')
+        .annotate(count=Count('pk'))
+    )
+
+    def subtree_count(node):
+        return direct_counts.get(node.pk, 0) + sum(subtree_count(child) for child in node.children)
+
+    facets = {
+        'category': [
+            {'id': node.pk, 'name': node.name, 'depth': node.depth, 'count': subtree_count(node)}
+            for node in tree
+        ],
+        'price': [
+            {'key': key, 'label': label, 'count': totals[f'price_{index}']}
+            for index, (key, label, _, _) in enumerate(PRICE_BUCKETS)
+        ],
+        'rating': [
+            {'key': key, 'label': label, 'count': totals[f'rating_{index}']}
+            for index, (key, label, _) in enumerate(RATING_BANDS)
+        ],
+        'in_stock': totals['in_stock'],
+        'total': sum(direct_counts.values()),
+    }
+    cache.set(cache_key, facets, FACET_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,31 @@
+"""
+顧客系統 (CS) - 中介軟體
+"""
+from .cart import AnonymousCart, merge_anonymous_cart
+
+
+class AnonymousCartMiddleware:
+    """
+    提供 request.anonymous_cart（簽章 Cookie 中的匿名購物車），回應時寫回 Cookie；
+    使用者登入後將匿名購物車併入資料庫並清除 Cookie。須放在 AuthenticationMiddleware 之後
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.anonymous_cart = AnonymousCart(request)
+        # 已登入的使用者帶著匿名購物車（例如在另一個分頁登入）時先併入，頁面即顯示合併後的購物車
+        self._merge(request)
+        response = self.get_response(request)
+        # 本次請求中登入
+        self._merge(request)
+        request.anonymous_cart.save(response)
+        return response
+
+    @staticmethod
+    def _merge(request):
+        cart = request.anonymous_cart
+        if cart and request.user.is_authenticated:
+            merge_anonymous_cart(request.user, cart.quantities)
+            cart.clear()
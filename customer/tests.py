@@ -1,3 +1,620 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from database.admission import controller as admission_controller
+from database.categories import get_category_tree
+from database.models import (
+    Category, Coupon, CouponRedemption, IdempotencyKey, Notification, Order, OrderItem, Product, ProductReview,
+    ShoppingCart, StockReservation,
+)
+from database.idempotency import purge_idempotency_keys
+from database.ids import generator as id_generator
+from database.notifications import notify, unread_count
+from database.reservations import OrderNotPayable, available_stock, confirm_order, release_expired_holds
+from payment.models import PaymentMethod, PaymentTransaction
+from .checkout import CheckoutError, OutOfStock, hold_cart, place_order
+from .facets import CatalogFilters, facet_counts
+
+
+def _retry_locked(func, attempts=50):
+    """SQLite 同時只允許一個寫入者，鎖定時稍後重試"""
+    for attempt in range(attempts):
+        try:
+            return func()
+        except OperationalError:
+            time.sleep(0.01 * (attempt + 1))
+    raise AssertionError('資料庫持續鎖定')
+
+
+class CheckoutConcurrencyTests(TransactionTestCase):
+    """並行結帳壓力測試：多個執行緒同時搶購，庫存不得超賣"""
+
+    STOCK = 10
+    BUYERS = 40
+
+    def setUp(self):
+        self.product = Product.objects.create(name='限量商品', description='', price=100, stock=self.STOCK)
+        self.other = Product.objects.create(name='一般商品', description='', price=50, stock=1000)
+        self.users = [User.objects.create_user(f'buyer{i}') for i in range(self.BUYERS)]
+        for user in self.users:
+            ShoppingCart.objects.create(user=user, product=self.product, quantity=1)
+            ShoppingCart.objects.create(user=user, product=self.other, quantity=2)
+
+    def _run_concurrently(self, func, args_list):
+        """並行執行 func；執行緒中任何非預期的例外都讓測試失敗（否則只會印出而測試照樣通過）"""
+        barrier = threading.Barrier(len(args_list))
+        results = []
+        errors = []
+
+        def worker(*args):
+            barrier.wait()
+            try:
+                results.append(_retry_locked(lambda: func(*args)))
+            except CheckoutError:
+                results.append('out_of_stock')
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=worker, args=args) for args in args_list]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_concurrent_checkout_never_oversells(self):
+        results = self._run_concurrently(
+            lambda user: place_order(user, '台北市', '0912345678')[0], [(user,) for user in self.users]
+        )
+        orders = [result for result in results if isinstance(result, Order)]
+        self.assertEqual(len(orders), self.STOCK)
+        self.assertEqual(results.count('out_of_stock'), self.BUYERS - self.STOCK)
+        self.assertEqual(available_stock([self.product.pk])[self.product.pk], 0)
+        # 失敗的結帳整筆回滾：購物車與其他商品的保留都不受影響
+        self.assertEqual(ShoppingCart.objects.count(), 2 * (self.BUYERS - self.STOCK))
+        self.assertEqual(StockReservation.objects.filter(product=self.other).count(), self.STOCK)
+
+        results = self._run_concurrently(confirm_order, [(order,) for order in orders])
+        self.assertEqual(results, [None] * self.STOCK)
+        self.product.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(self.other.stock, 1000 - 2 * self.STOCK)
+        self.assertEqual(Order.objects.filter(status='paid').count(), self.STOCK)
+        self.assertEqual(OrderItem.objects.filter(product=self.product).count(), self.STOCK)
+
+    def test_concurrent_coupon_use_respects_usage_limit(self):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='LIMIT3', description='', discount_type='fixed', discount_value=10,
+            valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1), usage_limit=3,
+        )
+        Product.objects.filter(pk=self.product.pk).update(stock=self.BUYERS)
+        results = self._run_concurrently(
+            lambda user: place_order(user, '台北市', '0912345678', coupon_code='LIMIT3'), [(user,) for user in self.users]
+        )
+        self.assertEqual(len(results), self.BUYERS)
+        self.assertEqual(sum(1 for _, error in results if error is None), 3)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 3)
+        self.assertEqual(CouponRedemption.objects.count(), 3)
+        self.assertEqual(Order.objects.filter(total_amount=190).count(), 3)
+
+    def test_coupon_per_user_limit_and_release_on_cancel(self):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='ONCE', description='', discount_type='percentage', discount_value=10,
+            valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1), per_user_limit=1,
+        )
+        user = self.users[0]
+        order, error = place_order(user, '台北市', '0912345678', coupon_code='ONCE')
+        self.assertIsNone(error)
+        ShoppingCart.objects.create(user=user, product=self.other, quantity=1)
+        _, error = place_order(user, '台北市', '0912345678', coupon_code='ONCE')
+        self.assertEqual(error, '每人限用 1 次')
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 1)
+
+        # 逾時取消的訂單歸還使用次數
+        StockReservation.objects.filter(order=order).update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired_holds()
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 0)
+        self.assertFalse(CouponRedemption.objects.exists())
+
+    def test_checkout_query_count_is_constant(self):
+        # 先配發編號節點，不計入第一次結帳的查詢數
+        id_generator.next_value()
+        counts = []
+        for user, extra in ((self.users[0], 0), (self.users[1], 5)):
+            for i in range(extra):
+                product = Product.objects.create(name=f'商品{i}', description='', price=10, stock=5)
+                ShoppingCart.objects.create(user=user, product=product, quantity=1)
+            hold_cart(user, ShoppingCart.objects.filter(user=user))
+            with CaptureQueriesContext(connection) as queries:
+                order, _ = place_order(user, '台北市', '0912345678')
+            self.assertEqual(order.items.count(), 2 + extra)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_expired_holds_are_released_and_orders_cancelled(self):
+        user = self.users[0]
+        order, _ = place_order(user, '台北市', '0912345678')
+        StockReservation.objects.filter(order=order).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(available_stock([self.product.pk])[self.product.pk], self.STOCK)
+
+        released, cancelled = release_expired_holds()
+        self.assertEqual((released, cancelled), (2, 1))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        with self.assertRaises(OrderNotPayable):
+            confirm_order(order)
+
+    def test_hold_blocks_other_buyers(self):
+        hold_cart(self.users[0], ShoppingCart.objects.filter(user=self.users[0]))
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+        with self.assertRaises(OutOfStock):
+            place_order(self.users[1], '台北市', '0912345678')
+        order, _ = place_order(self.users[0], '台北市', '0912345678')
+        confirm_order(order)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+    def test_empty_cart(self):
+        ShoppingCart.objects.filter(user=self.users[0]).delete()
+        with self.assertRaises(CheckoutError):
+            place_order(self.users[0], '台北市', '0912345678')
+
+
+@override_settings(ADMISSION_RATE=1, ADMISSION_BURST=2)
+class AdmissionTests(TestCase):
+    """熱門商品排隊：超過令牌桶容量的請求排隊，不寫入資料庫"""
+
+    def setUp(self):
+        admission_controller.reset()
+        self.product = Product.objects.create(name='限量商品', description='', price=100, stock=100)
+        self.url = reverse('customer:add_to_cart', args=[self.product.pk])
+
+    def _buyer(self, i):
+        self.client.force_login(User.objects.create_user(f'queue{i}'))
+        return self.client
+
+    def test_burst_is_admitted_then_queued(self):
+        for i in range(2):
+            self.assertEqual(self._buyer(i).post(self.url).status_code, 302)
+        client = self._buyer(2)
+        response = client.post(self.url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'queued')
+        self.assertEqual(response.json()['position'], 1)
+        # 一般請求顯示排隊頁面，輪到後以原本的數量重新送出
+        response = client.post(self.url, {'quantity': 2})
+        self.assertContains(response, 'name="quantity" value="2"', status_code=202)
+        self.assertEqual(ShoppingCart.objects.count(), 2)
+        self.assertEqual(admission_controller.metrics()[self.product.pk]['queue_depth'], 1)
+
+        # 令牌補充後輪詢即放行，之後加入購物車不再排隊
+        with mock.patch('database.admission.time.monotonic', return_value=time.monotonic() + 1.5):
+            status = client.get(reverse('customer:admission_status'), {'products': self.product.pk}).json()
+        self.assertEqual(status['status'], 'admitted')
+        self.assertEqual(client.post(self.url).status_code, 302)
+        self.assertEqual(ShoppingCart.objects.count(), 3)
+
+    def test_unknown_products_do_not_create_buckets(self):
+        client = self._buyer(0)
+        self.assertEqual(client.post(reverse('customer:add_to_cart', args=[999999])).status_code, 404)
+        status_url = reverse('customer:admission_status')
+        self.assertEqual(client.get(status_url, {'products': '999998,999999'}).status_code, 400)
+        too_many = ','.join(str(pk) for pk in range(1, 202))
+        self.assertEqual(client.get(status_url, {'products': too_many}).status_code, 400)
+        self.assertEqual(admission_controller.metrics(), {})
+
+    def test_idle_buckets_are_evicted(self):
+        admission_controller.request(self.product.pk)
+        later = time.monotonic() + 3600
+        with mock.patch('database.admission.time.monotonic', return_value=later):
+            admission_controller.request(self.product.pk + 1)
+        self.assertEqual(list(admission_controller.metrics()), [self.product.pk + 1])
+
+
+class IdempotencyTests(TestCase):
+    """重複送出結帳與付款表單只處理一次"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('idem')
+        self.product = Product.objects.create(name='商品', description='', price=100, stock=5)
+        ShoppingCart.objects.create(user=self.user, product=self.product, quantity=1)
+        self.client.force_login(self.user)
+
+    def test_replayed_checkout_and_payment(self):
+        self.client.get(reverse('customer:checkout'))
+        form = {'shipping_address': '台北市', 'shipping_phone': '0912345678', 'idempotency_key': 'k1'}
+        first = self.client.post(reverse('customer:checkout'), form)
+        second = self.client.post(reverse('customer:checkout'), form)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(second['Location'], first['Location'])
+
+        method = PaymentMethod.objects.create(name='信用卡', code='card')
+        order = Order.objects.get()
+        url = reverse('payment:process_payment', args=[order.pk])
+        responses = [self.client.post(url, {'payment_method': method.pk, 'idempotency_key': 'k2'}) for _ in range(2)]
+        self.assertEqual(responses[0]['Location'], responses[1]['Location'])
+        self.assertEqual(PaymentTransaction.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 4)
+
+        # 同一把鍵用於其他請求
+        self.assertEqual(self.client.post(reverse('customer:checkout'), {'idempotency_key': 'k2'}).status_code, 422)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertEqual(purge_idempotency_keys(), 2)
+
+    def test_stock_alert_failure_does_not_fail_committed_payment(self):
+        self.client.get(reverse('customer:checkout'))
+        form = {'shipping_address': '台北市', 'shipping_phone': '0912345678', 'idempotency_key': 'k1'}
+        self.client.post(reverse('customer:checkout'), form)
+        order = Order.objects.get()
+        method = PaymentMethod.objects.create(name='信用卡', code='card')
+
+        url = reverse('payment:process_payment', args=[order.pk])
+        with mock.patch('database.reservations.record_sales', side_effect=OperationalError('database is locked')):
+            with self.assertLogs('django', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, {'payment_method': method.pk, 'idempotency_key': 'k2'})
+        self.assertRedirects(
+            response, reverse('payment:payment_detail', args=[PaymentTransaction.objects.get().pk]),
+            fetch_redirect_response=False,
+        )
+
+    def test_failed_transaction_record_rolls_back_payment(self):
+        self.client.get(reverse('customer:checkout'))
+        form = {'shipping_address': '台北市', 'shipping_phone': '0912345678', 'idempotency_key': 'k1'}
+        self.client.post(reverse('customer:checkout'), form)
+        order = Order.objects.get()
+        method = PaymentMethod.objects.create(name='信用卡', code='card')
+
+        url = reverse('payment:process_payment', args=[order.pk])
+        with mock.patch.object(PaymentTransaction.objects, 'create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(url, {'payment_method': method.pk, 'idempotency_key': 'k2'})
+        order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+        self.assertEqual(self.product.stock, 5)
+
+
+class AdminOrderStatusTests(TestCase):
+    """管理者變更訂單狀態：待付款改為已付款以後的狀態時扣除庫存，取消時立即釋放保留"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='商品', description='', price=100, stock=5)
+        self.buyer = User.objects.create_user('buyer')
+        ShoppingCart.objects.create(user=self.buyer, product=self.product, quantity=2)
+        self.order, _ = place_order(self.buyer, '台北市', '0912345678')
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+
+    def _set_status(self, status):
+        return self.client.post(reverse('administrator:order_detail', args=[self.order.pk]), {'status': status})
+
+    def test_shipping_pending_order_deducts_stock(self):
+        self._set_status('shipped')
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((self.order.status, self.product.stock), ('shipped', 3))
+        self.assertEqual(StockReservation.objects.get(order=self.order).status, 'confirmed')
+
+    def test_insufficient_stock_is_refused(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+        self.assertContains(self._set_status('paid'), '庫存不足')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+
+    def test_cancel_releases_holds(self):
+        self._set_status('cancelled')
+        self.assertEqual(StockReservation.objects.get(order=self.order).status, 'released')
+        self.assertEqual(available_stock([self.product.pk])[self.product.pk], 5)
+
+
+class BatchCartUpdateTests(TestCase):
+    """批次更新購物車：一次請求套用多筆，庫存不足時整批不套用"""
+
+    def setUp(self):
+        admission_controller.reset()
+        cache.clear()
+        self.user = User.objects.create_user('batch')
+        self.products = [Product.objects.create(name=f'商品{i}', description='', price=10, stock=5) for i in range(4)]
+        for product in self.products[:2]:
+            ShoppingCart.objects.create(user=self.user, product=product, quantity=1)
+        self.client.force_login(self.user)
+
+    def _post(self, changes):
+        return self.client.post(
+            reverse('customer:batch_update_cart'), data=json.dumps({'changes': changes}), content_type='application/json'
+        )
+
+    def test_own_checkout_hold_does_not_block_cart_edits(self):
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(stock=2)
+        ShoppingCart.objects.filter(user=self.user, product=product).update(quantity=2)
+        self.client.get(reverse('customer:checkout'))
+        self.assertTrue(StockReservation.objects.filter(user=self.user, product=product, status='held').exists())
+
+        cart_item = ShoppingCart.objects.get(user=self.user, product=product)
+        self.client.post(reverse('customer:update_cart', args=[cart_item.pk]), {'quantity': 1})
+        self.assertEqual(ShoppingCart.objects.get(pk=cart_item.pk).quantity, 1)
+        self.assertEqual(self._post([{'product_id': product.pk, 'quantity': 2}]).status_code, 200)
+
+    def test_cart_quantity_limit_excludes_other_holds(self):
+        product = self.products[0]
+        other = User.objects.create_user('other')
+        ShoppingCart.objects.create(user=other, product=product, quantity=3)
+        hold_cart(other, ShoppingCart.objects.filter(user=other))
+        # 自己結帳中的保留不計入
+        self.client.get(reverse('customer:checkout'))
+        response = self.client.get(reverse('customer:cart'))
+        self.assertContains(
+            response, f'max="2" class="form-control cart-quantity" style="width: 80px;" data-product-id="{product.pk}"'
+        )
+
+    def test_batch_update(self):
+        changes = [
+            {'product_id': self.products[0].pk, 'quantity': 3},
+            {'product_id': self.products[1].pk, 'quantity': 0},
+            {'product_id': self.products[2].pk, 'quantity': 2},
+        ]
+        response = self._post(changes)
+        self.assertEqual(response.json(), {'success': True, 'summary': {'count': 5, 'total': '50'}})
+        self.assertEqual(
+            dict(ShoppingCart.objects.filter(user=self.user).values_list('product_id', 'quantity')),
+            {self.products[0].pk: 3, self.products[2].pk: 2},
+        )
+
+        # 查詢數不隨項目數增加
+        counts = []
+        for products in (self.products[:2], self.products):
+            with CaptureQueriesContext(connection) as queries:
+                self._post([{'product_id': product.pk, 'quantity': 1} for product in products])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_coupon_preview(self):
+        now = timezone.now()
+        Coupon.objects.create(
+            code='TEN', description='', discount_type='percentage', discount_value=10,
+            valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1),
+        )
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('customer:coupon_preview'), {'code': 'TEN'}).json()
+        self.assertEqual((data['valid'], data['subtotal'], data['discount'], data['total']), (True, '20.00', '2.00', '18.00'))
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+        self.assertFalse(self.client.get(reverse('customer:coupon_preview'), {'code': 'NOPE'}).json()['valid'])
+
+    def test_insufficient_stock_applies_nothing(self):
+        response = self._post([
+            {'product_id': self.products[0].pk, 'quantity': 2},
+            {'product_id': self.products[1].pk, 'quantity': 6},
+        ])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errors'][0]['product_id'], self.products[1].pk)
+        self.assertEqual(ShoppingCart.objects.get(user=self.user, product=self.products[0]).quantity, 1)
+        self.assertEqual(self._post([{'product_id': 'x'}]).status_code, 400)
+
+
+class AnonymousCartTests(TestCase):
+    """未登入的購物車只存在 Cookie，登入後併入資料庫"""
+
+    def setUp(self):
+        self.products = [Product.objects.create(name=f'商品{i}', description='', price=10, stock=3) for i in range(2)]
+
+    def test_guest_cart_writes_nothing_and_merges_on_login(self):
+        with CaptureQueriesContext(connection) as queries:
+            for product in self.products:
+                self.client.post(
+                    reverse('customer:guest_add_to_cart', args=[product.pk]), {'quantity': 2},
+                    HTTP_ORIGIN='http://testserver',
+                )
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertContains(self.client.get(reverse('customer:cart')), 'NT$ 40')
+
+        user = User.objects.create_user('guest')
+        ShoppingCart.objects.create(user=user, product=self.products[0], quantity=2)
+        self.client.force_login(user)
+        response = self.client.get(reverse('customer:cart'))
+        self.assertEqual(response.cookies['cart'].value, '')
+        self.assertContains(response, 'NT$ 50')
+        # 數量相加並以庫存為上限
+        self.assertEqual(
+            dict(ShoppingCart.objects.filter(user=user).values_list('product_id', 'quantity')),
+            {self.products[0].pk: 3, self.products[1].pk: 2},
+        )
+
+    def test_cross_site_guest_add_is_rejected(self):
+        url = reverse('customer:guest_add_to_cart', args=[self.products[0].pk])
+        self.assertEqual(self.client.post(url, HTTP_ORIGIN='https://evil.example').status_code, 403)
+        # 沒有 Origin 與 Referer 時無法確認來源
+        self.assertEqual(self.client.post(url).status_code, 403)
+        self.assertEqual(self.client.post(url, HTTP_REFERER='http://testserver/products/').status_code, 302)
+
+    def test_authenticated_user_is_sent_to_csrf_protected_form(self):
+        user = User.objects.create_user('member')
+        self.client.force_login(user)
+        product = self.products[0]
+        response = self.client.post(
+            reverse('customer:guest_add_to_cart', args=[product.pk]), HTTP_ORIGIN='http://testserver'
+        )
+        self.assertRedirects(response, reverse('customer:product_detail', args=[product.pk]))
+        self.assertFalse(ShoppingCart.objects.filter(user=user).exists())
+
+
+class NotificationDigestViewTests(TestCase):
+    """通知中心只顯示摘要，展開時才載入先前各則"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader')
+        self.client.force_login(self.user)
+        for number in range(3):
+            notify(self.user, type='payment', title='付款成功', message=f'付款 {number}')
+
+    def test_list_defers_payload_and_items_expand_digest(self):
+        response = self.client.get(reverse('customer:notification_list'))
+        self.assertContains(response, '共 3 則')
+        self.assertNotContains(response, '付款 0')
+
+        digest = response.context['notifications'][0]
+        data = self.client.get(reverse('customer:notification_items', args=[digest.pk])).json()
+        self.assertEqual([item['message'] for item in data['items']], ['付款 2', '付款 1', '付款 0'])
+
+    def test_digest_with_new_item_moves_to_top(self):
+        notify(self.user, type='order', title='訂單已建立', message='訂單')
+        notify(self.user, type='payment', title='付款成功', message='付款 3')
+        notifications = self.client.get(reverse('customer:notification_list')).context['notifications']
+        self.assertEqual([notification.type for notification in notifications], ['payment', 'order'])
+
+    def test_badge_and_mark_read_use_counter(self):
+        digest = Notification.objects.get(user=self.user)
+        self.assertContains(self.client.get(reverse('customer:product_list')), 'id="notification-count">1<')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('customer:mark_notification_read', args=[digest.pk]))
+        self.assertContains(self.client.get(reverse('customer:product_list')), 'id="notification-count"><')
+        self.assertEqual(self.client.post(reverse('customer:mark_notification_read', args=[0])).status_code, 404)
+
+
+class BulkNotificationTests(TestCase):
+    """批次已讀與刪除：每個操作一個 UPDATE／DELETE，只影響自己的通知並同步未讀數"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('bulk')
+        other = User.objects.create_user('other')
+        Notification.objects.bulk_create(
+            [Notification(user=self.user, type='system', title=f'通知{i}', message='') for i in range(5)]
+            + [Notification(user=other, type='system', title='他人', message='')]
+        )
+        self.client.force_login(self.user)
+
+    def post_json(self, name, data=None):
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse(f'customer:{name}'), json.dumps(data or {}),
+                content_type='application/json', HTTP_ACCEPT='application/json',
+            )
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('UPDATE "database_notification"', 'DELETE'))]
+        return response.json()['count'], unread_count(self.user), len(writes)
+
+    def test_mark_selected_then_all_read(self):
+        ids = list(Notification.objects.filter(user=self.user).values_list('pk', flat=True)[:2])
+        other = Notification.objects.get(title='他人').pk
+        self.assertEqual(self.post_json('mark_notifications_read', {'ids': ids + [other]}), (2, 3, 1))
+        self.assertEqual(self.post_json('mark_all_notifications_read'), (3, 0, 1))
+        self.assertFalse(Notification.objects.get(pk=other).is_read)
+
+    def test_delete_read_older_than_days(self):
+        Notification.objects.filter(user=self.user, title__in=['通知0', '通知1']).update(
+            is_read=True, updated_at=timezone.now() - timedelta(days=40)
+        )
+        Notification.objects.filter(title='通知2').update(is_read=True)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('customer:delete_read_notifications'), {'days': 30})
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('DELETE')]), 1)
+        self.assertRedirects(response, reverse('customer:notification_list'))
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 3)
+        for days in ('x', -1, 3651, 10 ** 12):
+            response = self.client.post(reverse('customer:delete_read_notifications'), {'days': days})
+            self.assertEqual(response.status_code, 400)
+
+    def test_out_of_range_ids_are_rejected(self):
+        for ids in ([0], [-1], [2 ** 63], ['1e30']):
+            response = self.client.post(
+                reverse('customer:mark_notifications_read'), json.dumps({'ids': ids}), content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(unread_count(self.user), 5)
+
+
+class ProductPageTests(TestCase):
+    """商品頁：搜尋無結果或退回 icontains 時仍可依相關度分頁；不存在的商品不記錄瀏覽"""
+
+    def setUp(self):
+        Product.objects.create(name='iPhone15 蘋果手機', description='', price=100, stock=1)
+
+    def test_review_changes_etag_without_last_modified(self):
+        product = Product.objects.get()
+        url = reverse('customer:product_detail', args=[product.pk])
+        cache.clear()
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response.headers)
+        etag = response.headers['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductReview.objects.create(product=product, user=User.objects.create_user('critic'), rating=1, comment='差')
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=etag), '差')
+
+    def test_missing_product_is_not_counted(self):
+        with mock.patch('customer.views.record_view') as record:
+            self.assertEqual(self.client.get(reverse('customer:product_detail', args=[999])).status_code, 404)
+        record.assert_not_called()
+
+    def test_zero_hit_and_fallback_search(self):
+        url = reverse('customer:product_list')
+        self.assertEqual(self.client.get(url, {'search': 'zzz'}).status_code, 200)
+        self.assertContains(self.client.get(url, {'search': 'iphone'}), 'iPhone15')
+        with mock.patch('database.search.ranked_product_ids', return_value=None):
+            self.assertContains(self.client.get(url, {'search': 'phone'}), 'iPhone15')
+
+
+class FacetCountTests(TestCase):
+    """篩選面向：各面向不套用自身條件、分類數量累加子樹，計數共兩次查詢且結果會快取"""
+
+    def setUp(self):
+        cache.clear()
+        electronics = Category.objects.create(name='電子')
+        phones = Category.objects.create(name='手機', parent=electronics)
+        self.android = Category.objects.create(name='Android', parent=phones)
+        books = Category.objects.create(name='書籍')
+        self.electronics, self.phones, self.books = electronics, phones, books
+        for category, price, stock, rating in [
+            (phones, 300, 1, 4.5),
+            (self.android, 400, 0, 3.2),
+            (self.android, 100, 3, 0),
+            (electronics, 1500, 2, 0),
+            (books, 200, 5, 4.0),
+        ]:
+            Product.objects.create(
+                name='商品', description='', category=category, price=price, stock=stock, rating_average=rating
+            )
+
+    def test_each_facet_excludes_its_own_filter(self):
+        filters = CatalogFilters({'category': str(self.electronics.pk), 'price': '0-500', 'in_stock': '1'})
+        tree = get_category_tree()
+        with CaptureQueriesContext(connection) as queries:
+            facets = facet_counts(Product.objects.filter(status='active'), filters, tree)
+        self.assertEqual(len(queries), 2)
+
+        # 價格面向不套用價格條件：電子分類下有庫存的 100、300、1500 元
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [2, 0, 1, 0])
+        self.assertEqual([band['count'] for band in facets['rating']], [1, 1, 1])
+        self.assertEqual(facets['in_stock'], 2)
+        # 分類面向不套用分類條件，子分類的商品累加到上層
+        counts = {node['id']: node['count'] for node in facets['category']}
+        self.assertEqual(counts, {self.electronics.pk: 2, self.phones.pk: 2, self.android.pk: 1, self.books.pk: 1})
+        self.assertEqual(facets['total'], 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(facet_counts(Product.objects.filter(status='active'), filters, tree), facets)
+        self.assertEqual(len(queries), 0)
@@ -11,11 +11,15 @@ urlpatterns = [
     # 購物車
     path('cart/', views.cart, name='cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
+    path('cart/guest/add/<int:product_id>/', views.guest_add_to_cart, name='guest_add_to_cart'),
     path('cart/update/<int:cart_id>/', views.update_cart, name='update_cart'),
+    path('cart/batch/', views.batch_update_cart, name='batch_update_cart'),
     path('cart/remove/<int:cart_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('queue/status/', views.admission_status, name='admission_status'),
     
     # 結帳與訂單
     path('checkout/', views.checkout, name='checkout'),
+    path('checkout/coupon-preview/', views.coupon_preview, name='coupon_preview'),
     path('orders/', views.order_list, name='order_list'),
     path('orders/<int:order_id>/', views.order_detail, name='order_detail'),
     
@@ -31,6 +35,10 @@ urlpatterns = [
     
     # 通知
     path('notifications/', views.notification_list, name='notification_list'),
+    path('notifications/read-all/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
+    path('notifications/read/', views.mark_notifications_read, name='mark_notifications_read'),
+    path('notifications/delete-read/', views.delete_read_notifications, name='delete_read_notifications'),
+    path('notifications/<int:notification_id>/items/', views.notification_items, name='notification_items'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     
     # 商品問答
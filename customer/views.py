@@ -2,58 +2,92 @@
 顧客系統 (CS) - 視圖
 根據 FOMO 系統需求規格書建立
 """
+import json
+from datetime import timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Avg, Count
+from django.db.models import Count
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import HttpResponseForbidden, JsonResponse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from database.models import (
-    Product, Category, ShoppingCart, Order, OrderItem,
-    ProductReview, Favorite, CustomerProfile, Notification, Coupon, ProductQuestion,
+    Product, ShoppingCart, Order, OrderItem,
+    ProductReview, Favorite, CustomerProfile, Notification, ProductQuestion,
     ProductTracking, ProductPriceHistory
 )
+from database.admission import admit
+from database.categories import get_category_tree
+from database.counters import record_view
+from database.coupons import get_active_coupon
+from database.idempotency import idempotent, new_idempotency_key
+from database.notifications import delete_read, mark_read, unread_count
+from database.page_cache import (
+    CATALOG_VERSION_KEY, cache_anonymous_page, category_version_key, product_version_key
+)
+from database.pagination import CursorPaginator
+from database.pricing import CouponRule
+from database.recommendations import get_related_products
+from database.reservations import available_stock
+from database.search import search_products
+from .cart import (
+    CartUpdateError, add_item, apply_changes, cart_summary, get_cart, price_lines, remove_item, set_quantity
+)
+from .checkout import CheckoutError, hold_cart, place_order
+from .facets import FACET_CACHE_TIMEOUT, CatalogFilters, facet_counts
 from payment.models import PaymentTransaction
-import uuid
-from datetime import datetime
 
 
+def _product_list_validators(request):
+    category = request.GET.get('category', '')
+    return [category_version_key(category) if category.isdigit() else CATALOG_VERSION_KEY]
+
+
+def _product_detail_validators(request, pk):
+    category_id = Product.objects.filter(pk=pk).values_list('category_id', flat=True).first()
+    # 相關商品取自同分類，因此同分類商品異動也要讓詳情頁失效
+    return [product_version_key(pk), category_version_key(category_id)]
+
+
+# 側欄的面向數量涵蓋其他分類，列表頁快取不超過面向快取的時間
+@cache_anonymous_page(_product_list_validators, timeout=FACET_CACHE_TIMEOUT)
 def product_list(request):
     """商品列表"""
     products = Product.objects.filter(status='active')
-    category_id = request.GET.get('category')
-    search_query = request.GET.get('search')
-    sort_by = request.GET.get('sort', 'newest')
-    
-    if category_id:
-        products = products.filter(category_id=category_id)
+    filters = CatalogFilters(request.GET)
+    search_query = filters.search
+    sort_by = request.GET.get('sort', 'relevance' if search_query else 'newest')
     
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        products = search_products(products, search_query)
+    
+    facets = facet_counts(products, filters, get_category_tree())
+    products = products.filter(filters.q())
     
     if sort_by == 'price_low':
-        products = products.order_by('price')
+        ordering = ('price', 'id')
     elif sort_by == 'price_high':
-        products = products.order_by('-price')
+        ordering = ('-price', '-id')
     elif sort_by == 'rating':
-        products = products.annotate(avg_rating=Avg('reviews__rating')).order_by('-avg_rating')
+        ordering = ('-rating_average', '-rating_count', '-id')
+    elif search_query and sort_by == 'relevance':
+        # 搜尋時預設依全文索引的相關度排序
+        ordering = ('search_rank', 'id')
     else:
-        products = products.order_by('-created_at')
+        ordering = ('-created_at', '-id')
     
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    categories = Category.objects.all()
+    paginator = CursorPaginator(products, 12, ordering=ordering, count='cached')
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'products': page_obj,
-        'categories': categories,
-        'current_category': category_id,
+        'facets': facets,
+        'filters': filters,
+        'current_category': filters.category,
         'search_query': search_query,
         'sort_by': sort_by,
     }
@@ -62,9 +96,16 @@ def product_list(request):
 
 def product_detail(request, pk):
     """商品詳情"""
+    # 商品不存在時 get_object_or_404 會先拋出 404，不記錄瀏覽
+    response = _product_detail_page(request, pk)
+    # 瀏覽次數先累加在記憶體，由背景定期批次寫回（快取命中時同樣計入）
+    record_view(Product, pk)
+    return response
+
+
+@cache_anonymous_page(_product_detail_validators)
+def _product_detail_page(request, pk):
     product = get_object_or_404(Product, pk=pk)
-    product.view_count += 1
-    product.save()
     
     reviews = ProductReview.objects.filter(product=product).order_by('-created_at')[:10]
     questions = ProductQuestion.objects.filter(product=product, is_public=True).order_by('-created_at')[:10]
@@ -73,10 +114,7 @@ def product_detail(request, pk):
     if request.user.is_authenticated:
         is_favorited = Favorite.objects.filter(user=request.user, product=product).exists()
     
-    related_products = Product.objects.filter(
-        category=product.category,
-        status='active'
-    ).exclude(pk=pk)[:4]
+    related_products = get_related_products(product)
     
     context = {
         'product': product,
@@ -88,37 +126,134 @@ def product_detail(request, pk):
     return render(request, 'customer/product_detail.html', context)
 
 
+def _wants_json(request):
+    return 'application/json' in request.headers.get('Accept', '')
+
+
+# 排隊狀態一次最多查詢的商品數（結帳排隊時為購物車的商品項數）
+MAX_ADMISSION_PRODUCTS = 200
+
+
+def _admission_queue(request, status, product_ids, resume_url, resume_method='get'):
+    """
+    尚未輪到時回傳排隊狀態：fetch 請求回傳 JSON，一般請求顯示排隊頁面，
+    頁面輪詢 admission_status，輪到後重新送出原本的請求
+    """
+    if _wants_json(request):
+        return JsonResponse(status.as_dict(), status=202)
+    context = {
+        'status': status,
+        'product_ids': ','.join(str(pk) for pk in sorted(set(product_ids))),
+        'resume_url': resume_url,
+        'resume_method': resume_method,
+        'form_data': {key: value for key, value in request.POST.items() if key != 'csrfmiddlewaretoken'},
+    }
+    return render(request, 'customer/admission_queue.html', context, status=202)
+
+
 @login_required
+def admission_status(request):
+    """排隊狀態（供排隊頁面輪詢）"""
+    try:
+        product_ids = [int(pk) for pk in request.GET.get('products', '').split(',') if pk]
+    except ValueError:
+        product_ids = []
+    if len(product_ids) > MAX_ADMISSION_PRODUCTS:
+        return JsonResponse({'error': '商品數量過多'}, status=400)
+    product_ids = _existing_product_ids(product_ids)
+    if not product_ids:
+        return JsonResponse({'error': '未指定商品'}, status=400)
+    return JsonResponse(admit(request, product_ids).as_dict())
+
+
+def _existing_product_ids(product_ids):
+    """只保留存在的商品；入場控制為每項商品建立令牌桶，不可為任意 ID 建立"""
+    return list(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+
+
+def _available(request, product_id):
+    """可售庫存；已登入時不扣除自己進入結帳時的保留"""
+    user = request.user if request.user.is_authenticated else None
+    return available_stock([product_id], user=user).get(product_id, 0)
+
+
 def add_to_cart(request, product_id):
-    """加入購物車"""
+    """加入購物車（未登入時加入匿名購物車）"""
+    if not request.user.is_authenticated:
+        return guest_add_to_cart(request, product_id)
+
     product = get_object_or_404(Product, pk=product_id)
+
+    # 熱門商品開賣時先排隊，限制同一商品寫入資料庫的速率
+    status = admit(request, [product_id])
+    if not status.admitted:
+        return _admission_queue(
+            request, status, [product_id], reverse('customer:add_to_cart', args=[product_id]), 'post'
+        )
+
     quantity = int(request.POST.get('quantity', 1))
+    available = _available(request, product.pk)
     
-    if product.stock < quantity:
+    if available < quantity:
         messages.error(request, '庫存不足')
         return redirect('customer:product_detail', pk=product_id)
     
-    cart_item, created = ShoppingCart.objects.get_or_create(
-        user=request.user,
-        product=product,
-        defaults={'quantity': quantity}
-    )
-    
-    if not created:
-        cart_item.quantity += quantity
-        if cart_item.quantity > product.stock:
-            cart_item.quantity = product.stock
-        cart_item.save()
+    add_item(request.user, product, quantity, available)
     
     messages.success(request, f'已將 {product.name} 加入購物車')
     return redirect('customer:cart')
 
 
-@login_required
+def _is_same_origin(request):
+    """Origin（或 Referer）須為本站；兩者皆無時無法判斷來源，一律視為跨站"""
+    source = request.headers.get('Origin') or request.headers.get('Referer')
+    return bool(source) and url_has_allowed_host_and_scheme(
+        source, allowed_hosts={request.get_host()}, require_https=request.is_secure()
+    )
+
+
+@csrf_exempt
+@require_POST
+def guest_add_to_cart(request, product_id):
+    """
+    加入匿名購物車，只寫入簽章 Cookie，不寫入資料庫。
+    快取的商品頁不含 CSRF token，因此改以 Origin／Referer 檢查是否為同站送出。
+    已登入者須經由有 CSRF 保護的 add_to_cart，此處不寫入任何資料
+    """
+    if not _is_same_origin(request):
+        return HttpResponseForbidden('跨站請求')
+    if request.user.is_authenticated:
+        # 登入前開啟的商品頁仍指向此網址，導回商品頁以重新整理後的表單加入
+        messages.info(request, '您已登入，請重新加入購物車')
+        return redirect('customer:product_detail', pk=product_id)
+    product = get_object_or_404(Product, pk=product_id)
+    quantity = int(request.POST.get('quantity', 1))
+    cart = request.anonymous_cart
+
+    if product.available_stock < quantity:
+        messages.error(request, '庫存不足')
+        return redirect('customer:product_detail', pk=product_id)
+    if cart.is_full(product.pk):
+        messages.error(request, '購物車商品項目已達上限，請登入後繼續選購')
+        return redirect('customer:cart')
+
+    cart.add(product.pk, quantity, product.available_stock)
+    messages.success(request, f'已將 {product.name} 加入購物車')
+    return redirect('customer:cart')
+
+
 def cart(request):
     """購物車"""
-    cart_items = ShoppingCart.objects.filter(user=request.user)
-    total = sum(item.subtotal for item in cart_items)
+    if request.user.is_authenticated:
+        cart_items, total = get_cart(request.user)
+    else:
+        cart_items, total = request.anonymous_cart.get_cart()
+    
+    # 數量上限為可售庫存（扣除他人的保留，不扣除自己結帳中的保留），一次查詢取得
+    user = request.user if request.user.is_authenticated else None
+    available = available_stock([item.product.pk for item in cart_items], user=user)
+    for item in cart_items:
+        item.available = available[item.product.pk]
     
     context = {
         'cart_items': cart_items,
@@ -127,49 +262,141 @@ def cart(request):
     return render(request, 'customer/cart.html', context)
 
 
-@login_required
 @require_POST
 def update_cart(request, cart_id):
-    """更新購物車項目"""
-    cart_item = get_object_or_404(ShoppingCart, pk=cart_id, user=request.user)
+    """更新購物車項目（匿名購物車的項目 ID 為商品 ID）"""
     quantity = int(request.POST.get('quantity', 1))
+    if request.user.is_authenticated:
+        cart_item = get_object_or_404(ShoppingCart.objects.select_related('product'), pk=cart_id, user=request.user)
+        product = cart_item.product
+        current = cart_item.quantity
+    else:
+        cart_item = None
+        product = get_object_or_404(Product, pk=cart_id)
+        current = request.anonymous_cart.quantities.get(product.pk, 0)
     
     if quantity <= 0:
-        cart_item.delete()
+        if cart_item:
+            remove_item(cart_item)
+        else:
+            request.anonymous_cart.remove(product.pk)
         messages.success(request, '已從購物車移除')
     else:
-        if quantity > cart_item.product.stock:
+        # 減少數量一律允許；增加時才檢查可售庫存
+        if quantity > current and quantity > _available(request, product.pk):
             messages.error(request, '庫存不足')
             return redirect('customer:cart')
-        cart_item.quantity = quantity
-        cart_item.save()
+        if cart_item:
+            set_quantity(cart_item, quantity)
+        else:
+            request.anonymous_cart.set(product.pk, quantity)
         messages.success(request, '購物車已更新')
     
     return redirect('customer:cart')
 
 
-@login_required
+# 批次更新一次最多的項目數
+MAX_CART_CHANGES = 100
+
+
+def _parse_cart_changes(request):
+    """解析 {"changes": [{"product_id": 1, "quantity": 2}, ...]}，回傳 {商品 ID: 數量}；格式錯誤時回傳 None"""
+    try:
+        changes = json.loads(request.body)['changes']
+        parsed = {int(change['product_id']): int(change['quantity']) for change in changes}
+    except (ValueError, TypeError, KeyError):
+        return None
+    if not parsed or len(parsed) > MAX_CART_CHANGES or min(parsed.values()) < 0:
+        return None
+    return parsed
+
+
+@require_POST
+def batch_update_cart(request):
+    """
+    批次更新購物車（JSON），數量 0 為移除。庫存以一次查詢檢查，任一項目不足時整批不套用並回傳 409；
+    成功時回傳新的購物車摘要
+    """
+    changes = _parse_cart_changes(request)
+    if changes is None:
+        return JsonResponse({'success': False, 'error': '格式錯誤'}, status=400)
+
+    if request.user.is_authenticated:
+        # 增加數量與登入後的加入購物車相同，熱門商品需先排隊
+        current = dict(
+            ShoppingCart.objects.filter(user=request.user, product__in=changes).values_list('product_id', 'quantity')
+        )
+        increased = [pk for pk, quantity in changes.items() if quantity > current.get(pk, 0)]
+        increased = _existing_product_ids(increased) if increased else []
+        status = admit(request, increased) if increased else None
+        if status and not status.admitted:
+            return JsonResponse(status.as_dict(), status=202)
+
+    try:
+        if request.user.is_authenticated:
+            apply_changes(request.user, changes)
+            summary = cart_summary(request.user)
+        else:
+            request.anonymous_cart.apply_changes(changes)
+            summary = request.anonymous_cart.summary()
+    except CartUpdateError as e:
+        return JsonResponse({
+            'success': False,
+            'errors': [{'product_id': pk, 'error': error} for pk, error in e.errors.items()],
+        }, status=409)
+    return JsonResponse({'success': True, 'summary': summary})
+
+
+def coupon_preview(request):
+    """優惠券試算（JSON）：以目前購物車計算折扣後金額，不佔用使用次數、不寫入資料庫"""
+    code = request.GET.get('code', '').strip()
+    if request.user.is_authenticated:
+        items, _ = get_cart(request.user)
+    else:
+        items, _ = request.anonymous_cart.get_cart()
+    coupon = get_active_coupon(code) if code else None
+    if coupon is None:
+        quote, error = price_lines(items), '無效的優惠券'
+    elif coupon.usage_limit and coupon.used_count >= coupon.usage_limit:
+        quote, error = price_lines(items), '優惠券已達使用上限'
+    else:
+        quote = price_lines(items, CouponRule.from_coupon(coupon))
+        error = quote.coupon_error
+    return JsonResponse({'valid': error is None, **quote.as_dict(), 'coupon_error': error})
+
+
 @require_POST
 def remove_from_cart(request, cart_id):
     """從購物車移除"""
-    cart_item = get_object_or_404(ShoppingCart, pk=cart_id, user=request.user)
-    cart_item.delete()
+    if request.user.is_authenticated:
+        cart_item = get_object_or_404(ShoppingCart, pk=cart_id, user=request.user)
+        remove_item(cart_item)
+    else:
+        request.anonymous_cart.remove(cart_id)
     messages.success(request, '已從購物車移除')
     return redirect('customer:cart')
 
 
 @login_required
+@idempotent
 def checkout(request):
     """結帳"""
-    cart_items = ShoppingCart.objects.filter(user=request.user)
-    if not cart_items.exists():
+    cart_items, total = get_cart(request.user)
+    if not cart_items:
         messages.error(request, '購物車是空的')
         return redirect('customer:cart')
     
-    # 檢查庫存
-    for item in cart_items:
-        if item.quantity > item.product.stock:
-            messages.error(request, f'{item.product.name} 庫存不足')
+    hold_expires_at = None
+    if request.method != 'POST':
+        # 進入結帳時保留購物車商品，保留期間其他人無法買走；熱門商品須先排隊
+        product_ids = [item.product_id for item in cart_items]
+        status = admit(request, product_ids)
+        if not status.admitted:
+            return _admission_queue(request, status, product_ids, reverse('customer:checkout'))
+        try:
+            hold_expires_at = hold_cart(request.user, cart_items)
+        except CheckoutError as e:
+            messages.error(request, str(e))
             return redirect('customer:cart')
     
     profile, _ = CustomerProfile.objects.get_or_create(user=request.user)
@@ -184,81 +411,30 @@ def checkout(request):
             messages.error(request, '請填寫配送資訊')
             return render(request, 'customer/checkout.html', {
                 'cart_items': cart_items,
+                'total': total,
                 'profile': profile,
+                'idempotency_key': new_idempotency_key(),
             })
         
-        # 計算總金額
-        total = sum(item.subtotal for item in cart_items)
-        discount = 0
-        
-        # 檢查優惠券
-        if coupon_code:
-            try:
-                coupon = Coupon.objects.get(
-                    code=coupon_code,
-                    is_active=True,
-                    valid_from__lte=datetime.now(),
-                    valid_until__gte=datetime.now()
-                )
-                if coupon.usage_limit and coupon.used_count >= coupon.usage_limit:
-                    messages.error(request, '優惠券已達使用上限')
-                elif total < coupon.min_purchase:
-                    messages.error(request, f'未達最低消費 {coupon.min_purchase} 元')
-                else:
-                    if coupon.discount_type == 'percentage':
-                        discount = total * (coupon.discount_value / 100)
-                        if coupon.max_discount:
-                            discount = min(discount, coupon.max_discount)
-                    else:
-                        discount = coupon.discount_value
-                    total -= discount
-            except Coupon.DoesNotExist:
-                messages.error(request, '無效的優惠券')
-        
-        # 建立訂單
-        order_number = f"ORD{datetime.now().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
-        order = Order.objects.create(
-            user=request.user,
-            order_number=order_number,
-            total_amount=total,
-            shipping_address=shipping_address,
-            shipping_phone=shipping_phone,
-            notes=notes,
-            status='pending'
-        )
-        
-        # 建立訂單項目
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price=item.product.price,
-                subtotal=item.subtotal
+        try:
+            order, coupon_error = place_order(
+                request.user, shipping_address, shipping_phone, notes=notes, coupon_code=coupon_code
             )
-            # 減少庫存
-            item.product.stock -= item.quantity
-            item.product.save()
-        
-        # 清空購物車
-        cart_items.delete()
-        
-        # 建立通知
-        Notification.objects.create(
-            user=request.user,
-            type='order',
-            title='訂單已建立',
-            message=f'您的訂單 {order_number} 已建立，請完成付款'
-        )
+        except CheckoutError as e:
+            messages.error(request, str(e))
+            return redirect('customer:cart')
         
+        if coupon_error:
+            messages.error(request, coupon_error)
         messages.success(request, '訂單已建立')
         return redirect('customer:order_detail', order_id=order.id)
     
-    total = sum(item.subtotal for item in cart_items)
     context = {
         'cart_items': cart_items,
         'total': total,
         'profile': profile,
+        'hold_expires_at': hold_expires_at,
+        'idempotency_key': new_idempotency_key(),
     }
     return render(request, 'customer/checkout.html', context)
 
@@ -266,10 +442,9 @@ def checkout(request):
 @login_required
 def order_list(request):
     """訂單列表"""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    paginator = Paginator(orders, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    orders = Order.objects.filter(user=request.user)
+    paginator = CursorPaginator(orders, 10)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'orders': page_obj,
@@ -336,9 +511,10 @@ def add_review(request, product_id):
     )
     
     if not created:
+        # 透過 save() 觸發信號，依新舊評分差值更新商品評分彙總
         review.rating = rating
         review.comment = comment
-        review.save()
+        review.save(update_fields=['rating', 'comment', 'updated_at'])
         messages.success(request, '評價已更新')
     else:
         messages.success(request, '評價已新增')
@@ -380,28 +556,104 @@ def favorite_list(request):
 @login_required
 def notification_list(request):
     """通知列表"""
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-    unread_count = notifications.filter(is_read=False).count()
+    # 摘要先前各則的內容於展開時才載入
+    notifications = Notification.objects.filter(user=request.user).defer('payload')
     
-    paginator = Paginator(notifications, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 依最近一則的時間排序（與列表顯示的時間一致），摘要有新的一則時移到最前面
+    paginator = CursorPaginator(notifications, 20, ordering=('-updated_at', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'notifications': page_obj,
-        'unread_count': unread_count,
+        'unread_count': unread_count(request.user),
     }
     return render(request, 'customer/notification_list.html', context)
 
 
+@login_required
+def notification_items(request, notification_id):
+    """展開通知摘要：回傳合併在其中的各則通知（由新到舊）"""
+    notification = get_object_or_404(Notification, pk=notification_id, user=request.user)
+    latest = {
+        'title': notification.title,
+        'message': notification.message,
+        'created_at': notification.updated_at.isoformat(),
+    }
+    return JsonResponse({'count': notification.count, 'items': [latest] + notification.payload[::-1]})
+
+
 @login_required
 @require_POST
 def mark_notification_read(request, notification_id):
     """標記通知為已讀"""
-    notification = get_object_or_404(Notification, pk=notification_id, user=request.user)
-    notification.is_read = True
-    notification.save()
-    return JsonResponse({'success': True})
+    if not mark_read(request.user, [notification_id]):
+        get_object_or_404(Notification, pk=notification_id, user=request.user)
+    return JsonResponse({'success': True, 'unread_count': unread_count(request.user)})
+
+
+# 一次標記為已讀的最多通知數
+MAX_NOTIFICATION_IDS = 500
+# 「刪除已讀通知」預設保留的天數，以及可指定的最大天數（超過時 timedelta 與日期計算會溢位）
+READ_RETENTION_DAYS = 30
+MAX_RETENTION_DAYS = 3650
+# 通知 ID 須落在 BigAutoField 的正數範圍內，超出時資料庫參數會溢位
+MAX_NOTIFICATION_ID = 2 ** 63 - 1
+
+
+def _notifications_updated(request, count, message):
+    """批次操作完成：fetch 請求回傳 JSON（含最新未讀數），表單送出則回到通知中心"""
+    if _wants_json(request):
+        return JsonResponse({'success': True, 'count': count, 'unread_count': unread_count(request.user)})
+    messages.success(request, message)
+    return redirect('customer:notification_list')
+
+
+def _parse_notification_ids(request):
+    """由 JSON {"ids": [...]} 或表單的 ids 欄位取得通知 ID；格式錯誤時回傳 None"""
+    try:
+        if request.content_type == 'application/json':
+            ids = json.loads(request.body)['ids']
+        else:
+            ids = request.POST.getlist('ids')
+        ids = {int(pk) for pk in ids}
+    except (ValueError, TypeError, KeyError):
+        return None
+    if len(ids) > MAX_NOTIFICATION_IDS or not all(0 < pk <= MAX_NOTIFICATION_ID for pk in ids):
+        return None
+    return ids
+
+
+@login_required
+@require_POST
+def mark_all_notifications_read(request):
+    """全部標記為已讀（單一 UPDATE）"""
+    updated = mark_read(request.user)
+    return _notifications_updated(request, updated, f'已將 {updated} 則通知標記為已讀')
+
+
+@login_required
+@require_POST
+def mark_notifications_read(request):
+    """將所選通知標記為已讀（單一 UPDATE）"""
+    ids = _parse_notification_ids(request)
+    if ids is None:
+        return JsonResponse({'success': False, 'error': '格式錯誤'}, status=400)
+    updated = mark_read(request.user, ids) if ids else 0
+    return _notifications_updated(request, updated, f'已將 {updated} 則通知標記為已讀')
+
+
+@login_required
+@require_POST
+def delete_read_notifications(request):
+    """刪除超過指定天數（days，預設 30，最多 3650）的已讀通知（單一 DELETE）"""
+    try:
+        days = int(request.POST.get('days', READ_RETENTION_DAYS))
+    except ValueError:
+        days = -1
+    if not 0 <= days <= MAX_RETENTION_DAYS:
+        return JsonResponse({'success': False, 'error': '天數格式錯誤'}, status=400)
+    deleted = delete_read(request.user, timedelta(days=days))
+    return _notifications_updated(request, deleted, f'已刪除 {deleted} 則已讀通知')
 
 
 @login_required
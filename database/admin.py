@@ -2,9 +2,10 @@ from django.contrib import admin
 from .models import (
     Category, Product, ProductImage, CustomerProfile,
     ShoppingCart, Order, OrderItem, ProductReview,
-    Favorite, Notification, Coupon, ProductQuestion,
-    ProductTracking, ProductPriceHistory
+    Favorite, Notification, Coupon, CouponRedemption, IdempotencyKey, ProductQuestion,
+    ProductTracking, ProductPriceHistory, StockReservation
 )
+from .notifications import adjust_unread, delete_notifications
 
 
 @admin.register(Category)
@@ -17,10 +18,14 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price', 'stock', 'status', 'view_count', 'created_at']
+    list_display = ['name', 'category', 'price', 'stock', 'status', 'rating_average', 'rating_count', 'view_count', 'created_at']
     list_filter = ['status', 'category', 'created_at']
     search_fields = ['name', 'description']
-    readonly_fields = ['view_count', 'created_at', 'updated_at']
+    readonly_fields = [
+        'view_count', 'created_at', 'updated_at',
+        'rating_sum', 'rating_count', 'rating_average',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    ]
 
 
 @admin.register(ProductImage)
@@ -31,8 +36,9 @@ class ProductImageAdmin(admin.ModelAdmin):
 
 @admin.register(CustomerProfile)
 class CustomerProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'phone', 'created_at']
+    list_display = ['user', 'phone', 'unread_notifications', 'created_at']
     search_fields = ['user__username', 'phone']
+    readonly_fields = ['unread_notifications']
 
 
 @admin.register(ShoppingCart)
@@ -72,16 +78,46 @@ class FavoriteAdmin(admin.ModelAdmin):
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ['user', 'type', 'title', 'is_read', 'created_at']
+    list_display = ['user', 'type', 'title', 'count', 'is_read', 'created_at', 'updated_at']
     list_filter = ['type', 'is_read', 'created_at']
     search_fields = ['user__username', 'title']
+    
+    def save_model(self, request, obj, form, change):
+        # 維護使用者的未讀通知數
+        super().save_model(request, obj, form, change)
+        if not change:
+            adjust_unread({obj.user_id: 0 if obj.is_read else 1})
+        elif 'is_read' in form.changed_data:
+            adjust_unread({obj.user_id: -1 if obj.is_read else 1})
+    
+    def delete_model(self, request, obj):
+        delete_notifications(Notification.objects.filter(pk=obj.pk))
+    
+    def delete_queryset(self, request, queryset):
+        delete_notifications(queryset)
 
 
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
-    list_display = ['code', 'discount_type', 'discount_value', 'is_active', 'valid_from', 'valid_until']
+    list_display = ['code', 'discount_type', 'discount_value', 'used_count', 'usage_limit', 'per_user_limit', 'is_active', 'valid_from', 'valid_until']
     list_filter = ['is_active', 'discount_type', 'valid_from']
     search_fields = ['code']
+    readonly_fields = ['used_count']
+
+
+@admin.register(CouponRedemption)
+class CouponRedemptionAdmin(admin.ModelAdmin):
+    list_display = ['coupon', 'user', 'order', 'discount', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['coupon__code', 'user__username', 'order__order_number']
+    raw_id_fields = ['order']
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'path', 'status', 'response_status', 'created_at', 'expires_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['key', 'user__username', 'path']
 
 
 @admin.register(ProductQuestion)
@@ -110,3 +146,11 @@ class ProductPriceHistoryAdmin(admin.ModelAdmin):
     list_filter = ['changed_at']
     search_fields = ['product__name']
     readonly_fields = ['changed_at']
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'user', 'order', 'quantity', 'status', 'expires_at', 'created_at']
+    list_filter = ['status', 'expires_at']
+    search_fields = ['product__name', 'user__username', 'order__order_number']
+    raw_id_fields = ['product', 'user', 'order']
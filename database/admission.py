@@ -0,0 +1,192 @@
+"""
+熱門商品的入場控制
+每項商品一個令牌桶（每秒補充 ADMISSION_RATE 個，最多累積 ADMISSION_BURST 個），
+令牌足夠且無人排隊時直接放行，否則發給號碼牌排隊；令牌依速率補充時依號碼順序放行。
+放行後於 session 中取得一段時間的通行證，期間加入購物車與結帳不再排隊，
+因此同一商品寫入資料庫的速率有上限，限量商品開賣時不會同時搶鎖。
+狀態存放在行程內（本機快取），多個行程時每個行程各自限速；
+無人排隊且閒置超過 IDLE_BUCKET_TTL 的令牌桶會被移除（重新建立時令牌為滿，行為相同）
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+
+SESSION_KEY = 'admission'
+# 令牌桶閒置多久後移除，以及檢查閒置的間隔（秒）
+IDLE_BUCKET_TTL = 600
+EVICT_INTERVAL = 60
+
+
+def admission_rate():
+    """每項商品每秒放行人數"""
+    return getattr(settings, 'ADMISSION_RATE', 5)
+
+
+def admission_burst():
+    """令牌桶容量（無人排隊時可瞬間放行的人數）"""
+    return getattr(settings, 'ADMISSION_BURST', 20)
+
+
+def pass_ttl():
+    """放行後的通行證有效秒數"""
+    return getattr(settings, 'ADMISSION_PASS_TTL', 300)
+
+
+@dataclass
+class AdmissionStatus:
+    admitted: bool
+    position: int = 0
+    wait_seconds: float = 0.0
+
+    def as_dict(self):
+        return {
+            'status': 'admitted' if self.admitted else 'queued',
+            'position': self.position,
+            'wait_seconds': round(self.wait_seconds, 1),
+        }
+
+
+class _Bucket:
+    """單一商品的令牌桶與排隊號碼"""
+
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.refilled_at = now
+        self.used_at = now
+        self.next_ticket = 0   # 下一張號碼牌
+        self.served = 0        # 小於此值的號碼已放行
+        self.issued = {}       # 排隊中的號碼 → 發出時間
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def depth(self):
+        return self.next_ticket - self.served
+
+    def refill(self, now, rate, burst):
+        """補充令牌並依號碼順序放行排隊者"""
+        self.tokens = min(burst, self.tokens + (now - self.refilled_at) * rate)
+        self.refilled_at = now
+        while self.depth and self.tokens >= 1:
+            self.tokens -= 1
+            issued_at = self.issued.pop(self.served, None)
+            if issued_at is not None:
+                wait = now - issued_at
+                self.waits += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            self.served += 1
+            self.admitted_total += 1
+
+
+class AdmissionController:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._evicted_at = time.monotonic()
+
+    def _bucket(self, product_id, now):
+        if now - self._evicted_at >= EVICT_INTERVAL:
+            self._evict_idle(now)
+        bucket = self._buckets.get(product_id)
+        if bucket is None:
+            bucket = self._buckets[product_id] = _Bucket(admission_burst(), now)
+        bucket.refill(now, admission_rate(), admission_burst())
+        bucket.used_at = now
+        return bucket
+
+    def _evict_idle(self, now):
+        """移除無人排隊且閒置過久的令牌桶（呼叫端持有鎖）"""
+        self._evicted_at = now
+        idle = [
+            product_id for product_id, bucket in self._buckets.items()
+            if not bucket.depth and now - bucket.used_at >= IDLE_BUCKET_TTL
+        ]
+        for product_id in idle:
+            del self._buckets[product_id]
+
+    def request(self, product_id, ticket=None):
+        """
+        申請入場，回傳 (AdmissionStatus, 號碼牌)；放行時號碼牌為 None。
+        已持有號碼牌時檢查是否輪到；號碼牌不屬於本行程（例如重新啟動）時重新排隊。
+        """
+        now = time.monotonic()
+        rate = admission_rate()
+        with self._lock:
+            bucket = self._bucket(product_id, now)
+            if ticket is not None and ticket < bucket.served:
+                return AdmissionStatus(True), None
+            if ticket is None or ticket >= bucket.next_ticket:
+                if not bucket.depth and bucket.tokens >= 1:
+                    bucket.tokens -= 1
+                    bucket.admitted_total += 1
+                    return AdmissionStatus(True), None
+                ticket = bucket.next_ticket
+                bucket.next_ticket += 1
+                bucket.issued[ticket] = now
+                bucket.queued_total += 1
+            position = ticket - bucket.served + 1
+            wait = max(0.0, (position - bucket.tokens) / rate)
+            return AdmissionStatus(False, position, wait), ticket
+
+    def metrics(self):
+        """各商品的排隊深度、放行與等待時間統計"""
+        now = time.monotonic()
+        rate, burst = admission_rate(), admission_burst()
+        with self._lock:
+            result = {}
+            for product_id, bucket in self._buckets.items():
+                bucket.refill(now, rate, burst)
+                oldest = min(bucket.issued.values(), default=None)
+                result[product_id] = {
+                    'queue_depth': bucket.depth,
+                    'tokens': round(bucket.tokens, 2),
+                    'admitted_total': bucket.admitted_total,
+                    'queued_total': bucket.queued_total,
+                    'wait_seconds_avg': round(bucket.wait_total / bucket.waits, 2) if bucket.waits else 0.0,
+                    'wait_seconds_max': round(bucket.wait_max, 2),
+                    'oldest_wait_seconds': round(now - oldest, 2) if oldest is not None else 0.0,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+controller = AdmissionController()
+
+
+def admit(request, product_ids):
+    """
+    為目前使用者申請這些商品的入場，回傳 AdmissionStatus（排隊時為最後一項商品的名次與預估等待）。
+    號碼牌與通行證記錄在 session，輪詢時帶入同一張號碼牌。
+    """
+    state = request.session.get(SESSION_KEY, {})
+    passes, tickets = state.get('passes', {}), state.get('tickets', {})
+    now = time.time()
+    passes = {pk: expires for pk, expires in passes.items() if expires > now}
+
+    status = AdmissionStatus(True)
+    for product_id in sorted(set(product_ids)):
+        key = str(product_id)
+        if key in passes:
+            continue
+        current, ticket = controller.request(product_id, tickets.get(key))
+        if current.admitted:
+            tickets.pop(key, None)
+            passes[key] = now + pass_ttl()
+        else:
+            tickets[key] = ticket
+            if status.admitted or current.position > status.position:
+                status = current
+
+    new_state = {'passes': passes, 'tickets': tickets}
+    if new_state != state:
+        request.session[SESSION_KEY] = new_state
+    return status
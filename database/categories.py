@@ -0,0 +1,98 @@
+"""
+分類樹快取
+整棵分類樹在每個行程中只載入一次，分類異動時以共用快取中的版本號讓各行程失效
+"""
+import secrets
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import Category
+
+TREE_VERSION_KEY = 'category_tree_version'
+
+
+class CategoryNode:
+    """分類樹節點（不含資料庫連線，可安全地跨請求共用）"""
+
+    def __init__(self, pk, name, parent_id, depth, path):
+        self.pk = self.id = pk
+        self.name = name
+        self.parent_id = parent_id
+        self.depth = depth
+        self.path = path
+        self.children = []
+
+    def __str__(self):
+        return self.name
+
+
+class CategoryTree:
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.by_id = {}
+        for pk, name, parent_id, depth, path in rows:
+            self.by_id[pk] = CategoryNode(pk, name, parent_id, depth, path)
+        self.roots = []
+        for node in self.by_id.values():
+            parent = self.by_id.get(node.parent_id)
+            (parent.children if parent else self.roots).append(node)
+        for node in self.by_id.values():
+            node.children.sort(key=lambda child: child.name)
+        self.roots.sort(key=lambda node: node.name)
+        self.nodes = list(self._walk(self.roots))
+
+    def _walk(self, nodes):
+        for node in nodes:
+            yield node
+            yield from self._walk(node.children)
+
+    def __iter__(self):
+        """依前序（父節點在前、兄弟依名稱）走訪所有節點"""
+        return iter(self.nodes)
+
+    def get(self, pk):
+        return self.by_id.get(pk)
+
+    def subtree_ids(self, pk):
+        """分類本身及所有子孫的 ID；分類不存在時回傳空清單"""
+        node = self.by_id.get(pk)
+        return [pk] + [descendant.pk for descendant in self._walk(node.children)] if node else []
+
+
+_lock = threading.Lock()
+_cached = {'version': None, 'tree': None}
+
+
+def _new_version():
+    # 時間加上隨機值：快取被清空後不會沿用舊的版本號，並行的兩次異動也不會寫入相同的版本
+    return f'{time.time_ns():x}-{secrets.token_hex(4)}'
+
+
+def _current_version():
+    version = cache.get(TREE_VERSION_KEY)
+    if version is None:
+        cache.add(TREE_VERSION_KEY, _new_version(), None)
+        version = cache.get(TREE_VERSION_KEY)
+    return version
+
+
+def get_category_tree():
+    """取得目前版本的分類樹，版本未變時不查詢資料庫"""
+    version = _current_version()
+    tree = _cached['tree']
+    if tree is not None and _cached['version'] == version:
+        return tree
+    rows = Category.objects.order_by('path').values_list('id', 'name', 'parent_id', 'depth', 'path')
+    tree = CategoryTree(list(rows), version)
+    with _lock:
+        _cached['version'], _cached['tree'] = version, tree
+    return tree
+
+
+def invalidate_category_tree():
+    """分類新增、修改或刪除後呼叫，讓所有行程重新載入分類樹"""
+    cache.set(TREE_VERSION_KEY, _new_version(), None)
+    with _lock:
+        _cached['version'], _cached['tree'] = None, None
@@ -0,0 +1,11 @@
+"""
+資料庫系統 (DBS) - 模板上下文處理器
+"""
+from django.utils.functional import SimpleLazyObject
+
+from .categories import get_category_tree
+
+
+def category_tree(request):
+    """提供快取的分類樹給導覽列，僅在模板使用時才載入"""
+    return {'category_tree': SimpleLazyObject(get_category_tree)}
@@ -0,0 +1,99 @@
+"""
+瀏覽次數寫回緩衝（write-behind）
+瀏覽時只在行程記憶體中累加，由背景執行緒定期以 F() 批次寫回資料庫
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer:
+    """依 (模型, 主鍵) 累加瀏覽次數，flush() 時每種增量值只發一次 UPDATE"""
+
+    def __init__(self, field='view_count'):
+        self.field = field
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._worker = None
+
+    def record(self, model, pk, amount=1):
+        with self._lock:
+            self._pending[(model, pk)] += amount
+        self._ensure_worker()
+
+    def pending(self, model, pk):
+        """尚未寫回的次數，可與資料庫值相加作為即時顯示"""
+        with self._lock:
+            return self._pending.get((model, pk), 0)
+
+    def flush(self):
+        """將緩衝寫回資料庫，回傳更新的列數"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        if not pending:
+            return 0
+
+        # 依模型與增量值分組，相同增量的列合併為一次 UPDATE
+        groups = defaultdict(list)
+        for (model, pk), amount in pending.items():
+            groups[(model, amount)].append(pk)
+
+        updated = 0
+        try:
+            for (model, amount), pks in groups.items():
+                updated += model.objects.filter(pk__in=pks).update(**{self.field: F(self.field) + amount})
+        except Exception:
+            # 寫回失敗時把次數放回緩衝，下次再試
+            with self._lock:
+                for key, amount in pending.items():
+                    self._pending[key] += amount
+            raise
+        return updated
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='view-count-flusher', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        interval = getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 10)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('瀏覽次數寫回失敗')
+            finally:
+                connections.close_all()
+
+
+view_counts = ViewCountBuffer()
+
+
+def record_view(model, pk):
+    """記錄一次瀏覽（不寫入資料庫）"""
+    view_counts.record(model, pk)
+
+
+def flush_view_counts():
+    """立即寫回所有緩衝中的瀏覽次數"""
+    return view_counts.flush()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        view_counts.flush()
+    except Exception:
+        logger.exception('結束前寫回瀏覽次數失敗')
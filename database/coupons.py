@@ -0,0 +1,96 @@
+"""
+優惠券驗證與使用
+有效的優惠券由短時間快取讀取，結帳時不必每次以時間區間查詢；
+使用次數以條件式 UPDATE 原子遞增（used_count < usage_limit 才成功），並發結帳也不會超過上限，
+每筆使用另記於 CouponRedemption，用來檢查每人使用次數並在訂單取消時歸還
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import Coupon, CouponRedemption
+from .pricing import CouponNotApplicable, CouponRule, discount_cents, from_cents, to_cents
+
+COUPON_CACHE_TIMEOUT = 60
+
+
+class CouponError(Exception):
+    """優惠券無法使用，訊息可直接顯示給使用者"""
+
+
+def _coupon_cache_key(code):
+    return f'coupon:{code}'
+
+
+def invalidate_coupon(code):
+    cache.delete(_coupon_cache_key(code))
+
+
+def get_active_coupon(code):
+    """讀取目前有效的優惠券（快取中的 used_count 可能過時，僅供提早拒絕）；無效時回傳 None"""
+    key = _coupon_cache_key(code)
+    coupon = cache.get(key)
+    if coupon is None:
+        coupon = Coupon.objects.filter(code=code).first() or False
+        cache.set(key, coupon, COUPON_CACHE_TIMEOUT)
+    now = timezone.now()
+    if not coupon or not coupon.is_active or not coupon.valid_from <= now <= coupon.valid_until:
+        return None
+    return coupon
+
+
+def calculate_discount(coupon, total):
+    """計算折扣金額，未達最低消費時拋出 CouponError"""
+    try:
+        return from_cents(discount_cents(to_cents(total), CouponRule.from_coupon(coupon)))
+    except CouponNotApplicable as e:
+        raise CouponError(str(e)) from e
+
+
+def claim_coupon(code, user, total):
+    """
+    驗證並佔用一次優惠券使用次數，回傳 (優惠券, 折扣金額)；須在呼叫端的交易中執行，
+    並於建立訂單後以 record_redemption 寫入使用紀錄。無法使用時拋出 CouponError 且不佔用次數。
+    """
+    coupon = get_active_coupon(code)
+    if coupon is None:
+        raise CouponError('無效的優惠券')
+    if coupon.usage_limit and coupon.used_count >= coupon.usage_limit:
+        raise CouponError('優惠券已達使用上限')
+    discount = calculate_discount(coupon, total)
+
+    with transaction.atomic():
+        # 條件式遞增同時鎖定優惠券列，同一優惠券的使用依序進行，之後的每人次數檢查不會競爭
+        claimed = Coupon.objects.filter(
+            Q(usage_limit__isnull=True) | Q(used_count__lt=F('usage_limit')),
+            pk=coupon.pk,
+        ).update(used_count=F('used_count') + 1)
+        if not claimed:
+            invalidate_coupon(code)
+            raise CouponError('優惠券已達使用上限')
+        if coupon.per_user_limit:
+            used = CouponRedemption.objects.filter(coupon=coupon, user=user).count()
+            if used >= coupon.per_user_limit:
+                # 離開儲存點時回滾上面的遞增
+                raise CouponError(f'每人限用 {coupon.per_user_limit} 次')
+    return coupon, discount
+
+
+def record_redemption(coupon, user, order, discount):
+    return CouponRedemption.objects.create(coupon=coupon, user=user, order=order, discount=discount)
+
+
+def void_redemptions(order_ids):
+    """刪除這些訂單的使用紀錄並以單一 UPDATE 歸還各優惠券的使用次數，回傳歸還的次數"""
+    redemptions = CouponRedemption.objects.filter(order__in=order_ids)
+    counts = dict(redemptions.values_list('coupon_id').annotate(count=Count('pk')))
+    if not counts:
+        return 0
+    with transaction.atomic():
+        redemptions.delete()
+        Coupon.objects.filter(pk__in=counts).update(used_count=F('used_count') - Case(
+            *[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+            output_field=IntegerField(),
+        ))
+    return sum(counts.values())
@@ -0,0 +1,108 @@
+"""
+冪等鍵
+表單以隱藏欄位 idempotency_key（或 Idempotency-Key 標頭）帶入每次呈現時產生的鍵，
+第一次送出時記錄鍵與轉址結果；重複點擊或用戶端重試帶著同一把鍵送出時，直接回放記錄的轉址，
+不再執行下單、扣庫存或建立交易。到期的鍵由 purge_idempotency_keys 命令清理
+"""
+import time
+import uuid
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+FORM_FIELD = 'idempotency_key'
+HEADER = 'Idempotency-Key'
+
+# 同一把鍵的第一個請求尚在處理時，最多等待的秒數
+WAIT_TIMEOUT = 5
+WAIT_INTERVAL = 0.1
+
+
+def key_ttl():
+    """冪等鍵保存秒數"""
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)
+
+
+def new_idempotency_key():
+    """呈現表單時產生的新鍵"""
+    return uuid.uuid4().hex
+
+
+def _request_key(request):
+    key = request.POST.get(FORM_FIELD) or request.headers.get(HEADER, '')
+    return key.strip()[:64]
+
+
+def _replay(request, record):
+    messages.info(request, '此請求已處理，不會重複建立')
+    response = HttpResponseRedirect(record.response_location)
+    response.status_code = record.response_status
+    return response
+
+
+def _wait_for(record):
+    """等待第一個請求完成，回傳完成後的紀錄；逾時或第一個請求失敗（紀錄已刪除）時回傳 None"""
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None or record.status == 'completed':
+            return record
+    return None
+
+
+def idempotent(view):
+    """
+    讓 POST 視圖具冪等性（須放在 login_required 之後）。
+    只記錄轉址回應（成功或失敗後的導向）；其他回應（例如表單驗證錯誤重新呈現）或例外會刪除鍵，允許以同一把鍵重試。
+    未帶鍵的請求照常處理。
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = _request_key(request) if request.method == 'POST' else ''
+        if not key:
+            return view(request, *args, **kwargs)
+
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=request.user, key=key, path=request.path,
+                    expires_at=timezone.now() + timedelta(seconds=key_ttl()),
+                )
+        except IntegrityError:
+            record = IdempotencyKey.objects.get(user=request.user, key=key)
+            if record.path != request.path:
+                return HttpResponse('冪等鍵已用於其他請求', status=422)
+            if record.status != 'completed':
+                record = _wait_for(record)
+                if record is None:
+                    return HttpResponse('相同的請求正在處理中，請稍後再試', status=409)
+            return _replay(request, record)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if 300 <= response.status_code < 400 and response.has_header('Location'):
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status='completed', response_status=response.status_code, response_location=response['Location'],
+            )
+        else:
+            record.delete()
+        return response
+
+    return wrapper
+
+
+def purge_idempotency_keys():
+    """刪除已到期的冪等鍵，回傳刪除筆數"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
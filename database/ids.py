@@ -0,0 +1,170 @@
+"""
+訂單、交易與退款編號產生器
+編號為「前綴 + 16 碼 Crockford Base32」，數值由 48 位元毫秒時間戳、16 位元節點與 16 位元序號組成：
+- 字串順序即時間順序，新編號附加在唯一索引尾端，也能以編號範圍查詢時間區間（id_range）
+- 節點由 settings.ID_NODE 指定，未指定時每個行程向資料庫租用一個（IdNode.node），不同行程的編號不會重複：
+  配發時取最小的空閒節點，租約（ID_NODE_LEASE 秒）到期的節點可重新配發；使用中的行程在租約剩一半前續約，
+  續約失敗（例如行程暫停過久、節點已轉給其他行程）或配發所在的交易回滾時重新配發；65536 個節點全在使用中時拋出例外
+- 同一行程內嚴格遞增：時鐘倒退時沿用上次的時間戳，同一毫秒序號用完時借用下一毫秒
+"""
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+NODE_BITS = 16
+SEQUENCE_BITS = 16
+ID_LENGTH = 16  # 80 位元 / 每碼 5 位元
+
+MAX_NODES = 1 << NODE_BITS
+
+ORDER_PREFIX = 'ORD'
+TRANSACTION_PREFIX = 'TXN'
+REFUND_PREFIX = 'REF'
+
+
+def encode(value):
+    chars = []
+    for _ in range(ID_LENGTH):
+        value, index = divmod(value, 32)
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def decode(text):
+    value = 0
+    for char in text.upper():
+        value = value * 32 + ALPHABET.index(char)
+    return value
+
+
+class NodeExhausted(RuntimeError):
+    """所有節點都在租約中，無法配發"""
+
+
+def node_lease():
+    """節點租約秒數"""
+    return getattr(settings, 'ID_NODE_LEASE', 600)
+
+
+class IdGenerator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._node = None
+        self._lease_pk = None      # 租用中的 IdNode 主鍵
+        self._unconfirmed = None   # 尚未確認提交的 IdNode 主鍵
+        self._renew_at = 0.0       # 下次續約的時間（time.monotonic）
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _owner(self):
+        return {'hostname': socket.gethostname()[:255], 'pid': os.getpid()}
+
+    def _allocate_node(self):
+        configured = getattr(settings, 'ID_NODE', None)
+        if configured is not None:
+            self._lease_pk = None
+            return configured % MAX_NODES
+        from .models import IdNode
+        now = timezone.now()
+        for _ in range(3):
+            IdNode.objects.filter(renewed_at__lte=now - timedelta(seconds=node_lease())).delete()
+            used = set(IdNode.objects.values_list('node', flat=True))
+            free = next((node for node in range(MAX_NODES) if node not in used), None)
+            if free is None:
+                raise NodeExhausted(f'{MAX_NODES} 個編號節點都在租約中')
+            try:
+                with transaction.atomic():
+                    lease = IdNode.objects.create(node=free, renewed_at=now, **self._owner())
+                break
+            except IntegrityError:
+                # 其他行程同時取得同一節點，重新挑選
+                continue
+        else:
+            raise NodeExhausted('無法取得編號節點')
+        self._lease_pk = lease.pk
+        self._renew_at = time.monotonic() + node_lease() / 4
+        # 配發可能發生在呼叫端的交易中（例如結帳），交易提交前都須確認此列仍在：
+        # 回滾會撤銷此列，同一節點可能再配發給其他行程
+        self._unconfirmed = lease.pk
+        transaction.on_commit(lambda: self._confirm(lease.pk))
+        return free
+
+    def _confirm(self, pk):
+        # 於 next_value 持有鎖時也可能被呼叫（未在交易中時立即執行），因此不取鎖
+        if self._unconfirmed == pk:
+            self._unconfirmed = None
+
+    def _node_rolled_back(self):
+        from .models import IdNode
+        return not IdNode.objects.filter(pk=self._unconfirmed, **self._owner()).exists()
+
+    def _renew(self):
+        """
+        續約並回傳是否仍持有節點。只在租約至少還剩一半時續約：
+        續約可能隨呼叫端的交易回滾，下次續約（租約的四分之一後）前租約仍不會到期
+        """
+        from .models import IdNode
+        now = timezone.now()
+        renewed = IdNode.objects.filter(
+            pk=self._lease_pk, renewed_at__gt=now - timedelta(seconds=node_lease() / 2), **self._owner()
+        ).update(renewed_at=now)
+        self._renew_at = time.monotonic() + node_lease() / 4
+        return bool(renewed)
+
+    def _current_node(self):
+        # fork 出的子行程（例如 gunicorn --preload）需重新配發節點
+        if self._pid != os.getpid():
+            self._unconfirmed = None
+            self._node, self._pid = self._allocate_node(), os.getpid()
+            self._last_ms, self._sequence = -1, 0
+        elif self._unconfirmed is not None and self._node_rolled_back():
+            self._node = self._allocate_node()
+        elif self._lease_pk is not None and time.monotonic() >= self._renew_at and not self._renew():
+            self._node = self._allocate_node()
+        return self._node
+
+    def next_value(self):
+        with self._lock:
+            node = self._current_node()
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms, self._sequence = now_ms, 0
+            else:
+                self._sequence += 1
+                if self._sequence >> SEQUENCE_BITS:
+                    self._last_ms, self._sequence = self._last_ms + 1, 0
+            return (self._last_ms << (NODE_BITS + SEQUENCE_BITS)) | (node << SEQUENCE_BITS) | self._sequence
+
+
+generator = IdGenerator()
+
+
+def new_id(prefix):
+    """產生新編號，例如 new_id(ORDER_PREFIX) → 'ORD01JA2B3C4D5E6F7G'"""
+    return prefix + encode(generator.next_value())
+
+
+def _time_bound(moment):
+    return encode(int(moment.timestamp() * 1000) << (NODE_BITS + SEQUENCE_BITS))
+
+
+def id_range(prefix, start, end):
+    """
+    時間區間 [start, end) 內產生的編號範圍，供索引範圍查詢：
+    Order.objects.filter(order_number__gte=low, order_number__lt=high)
+    """
+    return prefix + _time_bound(start), prefix + _time_bound(end)
+
+
+def id_datetime(value, prefix=''):
+    """由編號還原產生時間（UTC）"""
+    milliseconds = decode(value[len(prefix):]) >> (NODE_BITS + SEQUENCE_BITS)
+    return datetime.fromtimestamp(milliseconds / 1000, tz=dt_timezone.utc)
@@ -0,0 +1,153 @@
+"""
+上傳圖片的縮圖與 WebP 變體
+變體存放在原檔旁（例如 products/a.jpg → products/a.w400.jpg、products/a.w400.webp），另有原尺寸的 WebP；
+上傳後交由背景執行緒池產生，模板以 srcset 讓瀏覽器挑選合適尺寸
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.images import get_image_dimensions
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# 需要產生變體的圖片欄位 {模型: 欄位名稱}
+IMAGE_FIELDS = {
+    'database.Product': 'image',
+    'database.ProductImage': 'image',
+    'database.CustomerProfile': 'avatar',
+    'projects.ProjectImage': 'image',
+}
+
+VARIANT_WIDTHS = (200, 400, 800)
+
+# 變體沿用原檔格式（JPEG/PNG），另產生 WebP 版本
+FALLBACK_FORMATS = {'JPEG': 'jpg', 'PNG': 'png'}
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+# 變體尚未產生時，短時間內不再重複檢查儲存空間
+MISSING_CACHE_TIMEOUT = 60
+
+_executor = None
+
+
+def _variants_cache_key(name):
+    return f'image_variants:{name}'
+
+
+def variant_name(name, width, extension):
+    root, _ = os.path.splitext(name)
+    return f'{root}.w{width}.{extension}'
+
+
+def _encode(image, image_format):
+    buffer = BytesIO()
+    if image_format == 'WEBP':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif image_format == 'JPEG':
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, image_format, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_variants(name, storage=default_storage):
+    """
+    為單張圖片產生所有寬度小於原圖的變體及原尺寸的 WebP，已存在的變體不重新產生。
+    回傳 {'widths': [...], 'width': 原圖寬度, 'extension': 原格式副檔名}，並寫入快取供 srcset 使用。
+    """
+    with storage.open(name, 'rb') as file:
+        original = Image.open(file)
+        original.load()
+    image_format = original.format if original.format in FALLBACK_FORMATS else 'JPEG'
+    extension = FALLBACK_FORMATS[image_format]
+    # 依 EXIF 轉正，變體不保留 EXIF
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    widths = [width for width in VARIANT_WIDTHS if width < original.width]
+    for width in widths + [original.width]:
+        targets = [(variant_name(name, width, 'webp'), 'WEBP')]
+        if width != original.width:
+            targets.append((variant_name(name, width, extension), image_format))
+        missing = [(target, target_format) for target, target_format in targets if not storage.exists(target)]
+        if not missing:
+            continue
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.LANCZOS)
+        for target, target_format in missing:
+            storage.save(target, _encode(resized, target_format))
+
+    variants = {'widths': widths, 'width': original.width, 'extension': extension}
+    cache.set(_variants_cache_key(name), variants, None)
+    return variants
+
+
+def get_variants(name, storage=default_storage):
+    """已產生的變體資訊；快取遺失時由儲存空間檢查，尚未產生時回傳 None"""
+    variants = cache.get(_variants_cache_key(name))
+    if variants is not None:
+        return variants or None
+    try:
+        with storage.open(name, 'rb') as file:
+            width, _ = get_image_dimensions(file)
+    except OSError:
+        width = None
+    if not width or not storage.exists(variant_name(name, width, 'webp')):
+        cache.set(_variants_cache_key(name), False, MISSING_CACHE_TIMEOUT)
+        return None
+    variants = {
+        'widths': [w for w in VARIANT_WIDTHS if w < width],
+        'width': width,
+        'extension': 'png' if name.lower().endswith('.png') else 'jpg',
+    }
+    cache.set(_variants_cache_key(name), variants, None)
+    return variants
+
+
+def _executor_instance():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def _generate_safely(name):
+    try:
+        generate_variants(name)
+    except Exception:
+        logger.exception('產生圖片變體失敗：%s', name)
+
+
+def schedule_variants(name):
+    """交易提交後在背景執行緒池產生變體（PIL 縮圖與編碼時會釋放 GIL）"""
+    if not name or cache.get(_variants_cache_key(name)):
+        return
+    transaction.on_commit(lambda: _executor_instance().submit(_generate_safely, name))
+
+
+def srcset(fieldfile, webp=False):
+    """組合 srcset 字串（含原尺寸），webp 為 True 時使用 WebP 變體；尚無變體時回傳空字串"""
+    if not fieldfile:
+        return ''
+    variants = get_variants(fieldfile.name, fieldfile.storage)
+    if not variants:
+        return ''
+    storage, name = fieldfile.storage, fieldfile.name
+    extension = 'webp' if webp else variants['extension']
+    candidates = [f'{storage.url(variant_name(name, width, extension))} {width}w' for width in variants['widths']]
+    original = variant_name(name, variants['width'], 'webp') if webp else name
+    candidates.append(f"{storage.url(original)} {variants['width']}w")
+    return ', '.join(candidates)
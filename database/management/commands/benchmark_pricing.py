@@ -0,0 +1,50 @@
+"""
+定價模組微基準測試
+"""
+import timeit
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from database.pricing import CouponRule, Line, price_cart, price_carts, price_line_arrays, to_cents
+
+
+class Command(BaseCommand):
+    help = '以隨機購物車測量定價模組的逐一計算、批次計算與向量化核心的速度（不存取資料庫）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carts', type=int, default=10000, help='購物車數')
+        parser.add_argument('--lines', type=int, default=5, help='每個購物車的平均項目數')
+        parser.add_argument('--repeat', type=int, default=5, help='每項測量重複次數（取最佳值）')
+        parser.add_argument('--seed', type=int, default=0, help='亂數種子')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        cart_count = options['carts']
+        counts = rng.poisson(options['lines'] - 1, cart_count) + 1
+        prices = rng.integers(100, 500000, counts.sum())
+        quantities = rng.integers(1, 5, counts.sum())
+        cart_index = np.repeat(np.arange(cart_count), counts)
+
+        carts, offset = [], 0
+        for count in counts:
+            carts.append([
+                Line(Decimal(int(prices[i])) / 100, int(quantities[i])) for i in range(offset, offset + count)
+            ])
+            offset += count
+
+        rule = CouponRule(percentage=True, value=1000, min_purchase=100000, max_discount=50000)
+        # 批次結果須與逐一計算相同
+        _, _, totals = price_carts(carts, rule)
+        sample = range(0, cart_count, max(1, cart_count // 100))
+        assert all(to_cents(price_cart(carts[i], rule).total) == int(totals[i]) for i in sample)
+
+        cases = [
+            ('price_cart（逐一）', lambda: [price_cart(lines, rule) for lines in carts]),
+            ('price_carts（批次）', lambda: price_carts(carts, rule)),
+            ('price_line_arrays（向量化核心）', lambda: price_line_arrays(cart_index, prices, quantities, cart_count, rule)),
+        ]
+        self.stdout.write(f'{cart_count} 個購物車，共 {counts.sum()} 個項目')
+        for name, func in cases:
+            best = min(timeit.repeat(func, number=1, repeat=options['repeat']))
+            self.stdout.write(f'{name:<32} {best * 1000:10.2f} ms  {best / cart_count * 1e6:8.2f} µs/購物車')
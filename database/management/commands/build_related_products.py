@@ -0,0 +1,18 @@
+"""
+計算相關商品
+"""
+from django.core.management.base import BaseCommand
+from database.recommendations import TOP_N, build_related_products
+
+
+class Command(BaseCommand):
+    help = '由共同購買與共同收藏計算相關商品（預設只重算上次計算後有新訂單或收藏的商品）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='重新計算全部商品')
+        parser.add_argument('--top-n', type=int, default=TOP_N, help='每項商品保留的相關商品數')
+
+    def handle(self, *args, **options):
+        build = build_related_products(full=options['full'], top_n=options['top_n'])
+        mode = '完整重建' if build.is_full else '增量更新'
+        self.stdout.write(self.style.SUCCESS(f'相關商品{mode}完成，更新 {build.products_updated} 項商品'))
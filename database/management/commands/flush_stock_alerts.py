@@ -0,0 +1,16 @@
+"""
+發送庫存／狀態變動通知
+"""
+from django.core.management.base import BaseCommand
+from database.stock_alerts import flush_product_changes
+
+
+class Command(BaseCommand):
+    help = '發送合併視窗已結束的庫存／狀態變動通知（網站行程中也有背景執行緒定期執行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='不等待視窗結束，立即發送全部')
+
+    def handle(self, *args, **options):
+        sent = flush_product_changes(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'已發送 {sent} 則通知'))
@@ -0,0 +1,37 @@
+"""
+補產生既有圖片的縮圖與 WebP 變體
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from database.images import IMAGE_FIELDS, generate_variants
+
+
+class Command(BaseCommand):
+    help = '為所有已上傳的圖片平行產生縮圖與 WebP 變體（已存在的變體會略過）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='平行處理的執行緒數')
+
+    def handle(self, *args, **options):
+        names = set()
+        for label, field in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            names.update(model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                         .values_list(field, flat=True))
+
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(generate_variants, name): name for name in sorted(names)}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}：{exc}')
+                if (done + failed) % 100 == 0:
+                    self.stdout.write(f'已處理 {done + failed}/{len(names)} 張')
+
+        self.stdout.write(self.style.SUCCESS(f'圖片變體產生完成：成功 {done} 張，失敗 {failed} 張'))
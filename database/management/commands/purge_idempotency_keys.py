@@ -0,0 +1,13 @@
+"""
+清理到期的冪等鍵
+"""
+from django.core.management.base import BaseCommand
+from database.idempotency import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = '刪除已到期的冪等鍵（建議每日排程執行）'
+
+    def handle(self, *args, **options):
+        deleted = purge_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f'已刪除 {deleted} 筆到期的冪等鍵'))
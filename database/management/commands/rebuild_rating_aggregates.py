@@ -0,0 +1,17 @@
+"""
+重建商品評分彙總
+"""
+from django.core.management.base import BaseCommand
+from database.ratings import refresh_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = '由商品評價重新計算並修復商品的評分彙總欄位'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, nargs='*', dest='product_ids', help='只處理指定的商品 ID')
+        parser.add_argument('--batch-size', type=int, default=500, help='每批寫回的商品數量')
+
+    def handle(self, *args, **options):
+        fixed = refresh_rating_aggregates(options['product_ids'] or None, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'評分彙總已重建，修正 {fixed} 項商品'))
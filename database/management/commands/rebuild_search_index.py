@@ -0,0 +1,19 @@
+"""
+重建商品全文搜尋索引
+"""
+from django.core.management.base import BaseCommand
+from database.search import rebuild_index, search_backend
+
+
+class Command(BaseCommand):
+    help = '分批重建商品全文搜尋索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='每批處理的商品數量')
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if backend is None:
+            self.stdout.write(self.style.WARNING('目前資料庫不支援全文索引，搜尋將使用一般比對'))
+        total = rebuild_index(chunk_size=options['chunk_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'搜尋索引重建完成，共 {total} 項商品'))
@@ -0,0 +1,13 @@
+"""
+釋放到期的庫存保留
+"""
+from django.core.management.base import BaseCommand
+from database.reservations import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = '釋放已到期的庫存保留，並取消逾時未付款的訂單（網站行程中也有背景執行緒定期執行）'
+
+    def handle(self, *args, **options):
+        released, cancelled = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f'已釋放 {released} 筆保留，取消 {cancelled} 筆訂單'))
@@ -0,0 +1,13 @@
+"""
+校正未讀通知數
+"""
+from django.core.management.base import BaseCommand
+from database.notifications import repair_unread_counts
+
+
+class Command(BaseCommand):
+    help = '以實際未讀通知筆數校正顧客資料的未讀數（建議每小時排程執行）'
+
+    def handle(self, *args, **options):
+        repaired = repair_unread_counts()
+        self.stdout.write(self.style.SUCCESS(f'已校正 {repaired} 位使用者的未讀通知數'))
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:42
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model("database", "Product")
+    ProductReview = apps.get_model("database", "ProductReview")
+    annotations = {"rating_sum": Sum("rating"), "rating_count": Count("id")}
+    for star in range(1, 6):
+        annotations[f"rating_{star}_count"] = Count("id", filter=Q(rating=star))
+    rows = ProductReview.objects.order_by().values("product_id").annotate(**annotations)
+    for row in rows:
+        product_id = row.pop("product_id")
+        row["rating_average"] = row["rating_sum"] / row["rating_count"]
+        Product.objects.filter(pk=product_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0003_productpricehistory_producttracking"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_1_count",
+            field=models.IntegerField(default=0, verbose_name="一星數量"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_2_count",
+            field=models.IntegerField(default=0, verbose_name="二星數量"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_3_count",
+            field=models.IntegerField(default=0, verbose_name="三星數量"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_4_count",
+            field=models.IntegerField(default=0, verbose_name="四星數量"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_5_count",
+            field=models.IntegerField(default=0, verbose_name="五星數量"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_average",
+            field=models.FloatField(db_index=True, default=0, verbose_name="平均評分"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.IntegerField(default=0, verbose_name="評價數量"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.IntegerField(default=0, verbose_name="評分總和"),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
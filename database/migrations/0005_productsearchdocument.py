@@ -0,0 +1,131 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = "database_productsearch_fts"
+DOCUMENT_TABLE = "database_productsearchdocument"
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', name_tokens), 'A') || "
+    "setweight(to_tsvector('simple', description_tokens), 'B')"
+)
+
+SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"name_tokens, description_tokens, "
+    f"content='{DOCUMENT_TABLE}', content_rowid='product_id')",
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name_tokens, description_tokens) "
+    f"VALUES (new.product_id, new.name_tokens, new.description_tokens); END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name_tokens, description_tokens) "
+    f"VALUES ('delete', old.product_id, old.name_tokens, old.description_tokens); END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name_tokens, description_tokens) "
+    f"VALUES ('delete', old.product_id, old.name_tokens, old.description_tokens); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name_tokens, description_tokens) "
+    f"VALUES (new.product_id, new.name_tokens, new.description_tokens); END",
+]
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+POSTGRESQL_INSTALL = [
+    f"CREATE INDEX {DOCUMENT_TABLE}_tsv ON {DOCUMENT_TABLE} USING gin (({PG_VECTOR}))",
+]
+POSTGRESQL_UNINSTALL = [
+    f"DROP INDEX IF EXISTS {DOCUMENT_TABLE}_tsv",
+]
+BACKFILL_CHUNK_SIZE = 500
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def install_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        _run(schema_editor, SQLITE_INSTALL)
+    elif vendor == "postgresql":
+        _run(schema_editor, POSTGRESQL_INSTALL)
+
+
+def backfill_search_documents(apps, schema_editor):
+    """
+    為既有商品分批建立搜尋文件（SQLite 由觸發器同步寫入 FTS 表）。
+    search_backend() 在索引表建立後即改用全文索引，未回填時既有商品全都搜尋不到
+    """
+    from database.search import tokenize
+
+    Product = apps.get_model("database", "Product")
+    ProductSearchDocument = apps.get_model("database", "ProductSearchDocument")
+    last_pk = 0
+    while True:
+        chunk = list(
+            Product.objects.filter(pk__gt=last_pk).order_by("pk")
+            .values_list("pk", "name", "description")[:BACKFILL_CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        ProductSearchDocument.objects.bulk_create([
+            ProductSearchDocument(
+                product_id=pk,
+                name_tokens=" ".join(tokenize(name)),
+                description_tokens=" ".join(tokenize(description)),
+            )
+            for pk, name, description in chunk
+        ])
+        last_pk = chunk[-1][0]
+
+
+def uninstall_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        _run(schema_editor, SQLITE_UNINSTALL)
+    elif vendor == "postgresql":
+        _run(schema_editor, POSTGRESQL_UNINSTALL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0004_product_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchDocument",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="database.product",
+                        verbose_name="商品",
+                    ),
+                ),
+                ("name_tokens", models.TextField(blank=True, verbose_name="名稱詞元")),
+                (
+                    "description_tokens",
+                    models.TextField(blank=True, verbose_name="描述詞元"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新時間"),
+                ),
+            ],
+            options={
+                "verbose_name": "商品搜尋文件",
+                "verbose_name_plural": "商品搜尋文件",
+            },
+        ),
+        migrations.RunPython(install_fulltext_index, uninstall_fulltext_index),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0005_productsearchdocument"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="database_no_user_id_98b5a0_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="database_or_created_b8d694_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="database_or_user_id_55530a_idx",
+            ),
+        ),
+    ]
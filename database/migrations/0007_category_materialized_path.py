@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:49
+
+from django.db import migrations, models
+
+
+def backfill_category_paths(apps, schema_editor):
+    Category = apps.get_model("database", "Category")
+    children = {}
+    for pk, parent_id in Category.objects.values_list("id", "parent_id"):
+        children.setdefault(parent_id, []).append(pk)
+    stack = [(pk, "") for pk in children.get(None, [])]
+    while stack:
+        pk, parent_path = stack.pop()
+        path = f"{parent_path}{pk:08d}/"
+        Category.objects.filter(pk=pk).update(path=path, depth=path.count("/") - 1)
+        stack.extend((child, path) for child in children.get(pk, []))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0006_cursor_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="depth",
+            field=models.PositiveSmallIntegerField(
+                default=0, editable=False, verbose_name="層級"
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=255,
+                verbose_name="樹狀路徑",
+            ),
+        ),
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0007_category_materialized_path"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RelatedProductBuild",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "is_full",
+                    models.BooleanField(default=False, verbose_name="完整重建"),
+                ),
+                (
+                    "last_order_id",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="已處理的最後訂單 ID"
+                    ),
+                ),
+                (
+                    "last_favorite_id",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="已處理的最後收藏 ID"
+                    ),
+                ),
+                (
+                    "products_updated",
+                    models.PositiveIntegerField(default=0, verbose_name="更新商品數"),
+                ),
+                (
+                    "built_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="計算時間"),
+                ),
+            ],
+            options={
+                "verbose_name": "相關商品計算紀錄",
+                "verbose_name_plural": "相關商品計算紀錄",
+                "ordering": ["-built_at", "-id"],
+            },
+        ),
+        migrations.CreateModel(
+            name="RelatedProduct",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField(verbose_name="相似度")),
+                ("rank", models.PositiveSmallIntegerField(verbose_name="排名")),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="neighbours",
+                        to="database.product",
+                        verbose_name="商品",
+                    ),
+                ),
+                (
+                    "related",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="database.product",
+                        verbose_name="相關商品",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "相關商品",
+                "verbose_name_plural": "相關商品",
+                "indexes": [
+                    models.Index(
+                        fields=["product", "rank"],
+                        name="database_re_product_1ec4b2_idx",
+                    )
+                ],
+                "unique_together": {("product", "related")},
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0008_related_products"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField(verbose_name="數量")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("held", "保留中"),
+                            ("confirmed", "已確認"),
+                            ("released", "已釋放"),
+                        ],
+                        default="held",
+                        max_length=20,
+                        verbose_name="狀態",
+                    ),
+                ),
+                ("expires_at", models.DateTimeField(verbose_name="到期時間")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="建立時間"),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_reservations",
+                        to="database.order",
+                        verbose_name="訂單",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="database.product",
+                        verbose_name="商品",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_reservations",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="使用者",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "庫存保留",
+                "verbose_name_plural": "庫存保留",
+                "indexes": [
+                    models.Index(
+                        fields=["product", "status", "expires_at"],
+                        name="database_st_product_f66ef6_idx",
+                    ),
+                    models.Index(
+                        fields=["status", "expires_at"],
+                        name="database_st_status_da0bbc_idx",
+                    ),
+                    models.Index(
+                        fields=["user", "status"], name="database_st_user_id_26734e_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
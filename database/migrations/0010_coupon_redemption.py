@@ -0,0 +1,83 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0009_stock_reservation"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="coupon",
+            name="per_user_limit",
+            field=models.IntegerField(
+                blank=True, null=True, verbose_name="每人使用次數限制"
+            ),
+        ),
+        migrations.CreateModel(
+            name="CouponRedemption",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "discount",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="折扣金額"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="使用時間"),
+                ),
+                (
+                    "coupon",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="redemptions",
+                        to="database.coupon",
+                        verbose_name="優惠券",
+                    ),
+                ),
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="coupon_redemption",
+                        to="database.order",
+                        verbose_name="訂單",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="coupon_redemptions",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="使用者",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "優惠券使用紀錄",
+                "verbose_name_plural": "優惠券使用紀錄",
+                "indexes": [
+                    models.Index(
+                        fields=["coupon", "user"], name="database_co_coupon__48ac90_idx"
+                    )
+                ],
+            },
+        ),
+    ]
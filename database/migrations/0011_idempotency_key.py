@@ -0,0 +1,77 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0010_coupon_redemption"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, verbose_name="冪等鍵")),
+                ("path", models.CharField(max_length=255, verbose_name="請求路徑")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("processing", "處理中"), ("completed", "已完成")],
+                        default="processing",
+                        max_length=20,
+                        verbose_name="狀態",
+                    ),
+                ),
+                (
+                    "response_status",
+                    models.PositiveSmallIntegerField(
+                        blank=True, null=True, verbose_name="回應狀態碼"
+                    ),
+                ),
+                (
+                    "response_location",
+                    models.CharField(
+                        blank=True, max_length=500, verbose_name="回應轉址"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="建立時間"),
+                ),
+                ("expires_at", models.DateTimeField(verbose_name="到期時間")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="idempotency_keys",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="使用者",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "冪等鍵",
+                "verbose_name_plural": "冪等鍵",
+                "indexes": [
+                    models.Index(
+                        fields=["expires_at"], name="database_id_expires_de8e7e_idx"
+                    )
+                ],
+                "unique_together": {("user", "key")},
+            },
+        ),
+    ]
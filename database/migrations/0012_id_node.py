@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0011_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdNode",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hostname", models.CharField(max_length=255, verbose_name="主機名稱")),
+                ("pid", models.PositiveIntegerField(verbose_name="行程 ID")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="配發時間"),
+                ),
+            ],
+            options={
+                "verbose_name": "編號產生節點",
+                "verbose_name_plural": "編號產生節點",
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0012_id_node"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="count",
+            field=models.PositiveIntegerField(default=1, verbose_name="則數"),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="payload",
+            field=models.JSONField(blank=True, default=list, verbose_name="先前通知"),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now, verbose_name="更新時間"
+            ),
+            preserve_default=False,
+        ),
+    ]
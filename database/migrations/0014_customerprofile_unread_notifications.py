@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:25
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_notifications(apps, schema_editor):
+    CustomerProfile = apps.get_model("database", "CustomerProfile")
+    Notification = apps.get_model("database", "Notification")
+    unread = (
+        Notification.objects.filter(user=OuterRef("user"), is_read=False)
+        .values("user").annotate(total=Count("pk")).values("total")
+    )
+    CustomerProfile.objects.update(
+        unread_notifications=Coalesce(Subquery(unread, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0013_notification_digest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customerprofile",
+            name="unread_notifications",
+            field=models.PositiveIntegerField(default=0, verbose_name="未讀通知數"),
+        ),
+        migrations.RunPython(backfill_unread_notifications, migrations.RunPython.noop),
+    ]
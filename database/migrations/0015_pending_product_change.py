@@ -0,0 +1,67 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0014_customerprofile_unread_notifications"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingProductChange",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="database.product",
+                        verbose_name="商品",
+                    ),
+                ),
+                (
+                    "stock_before",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="視窗開始時庫存"
+                    ),
+                ),
+                (
+                    "stock_after",
+                    models.IntegerField(blank=True, null=True, verbose_name="最新庫存"),
+                ),
+                (
+                    "status_before",
+                    models.CharField(
+                        blank=True,
+                        max_length=20,
+                        null=True,
+                        verbose_name="視窗開始時狀態",
+                    ),
+                ),
+                (
+                    "status_after",
+                    models.CharField(
+                        blank=True, max_length=20, null=True, verbose_name="最新狀態"
+                    ),
+                ),
+                (
+                    "opened_at",
+                    models.DateTimeField(db_index=True, verbose_name="視窗開始時間"),
+                ),
+                (
+                    "version",
+                    models.PositiveIntegerField(default=0, verbose_name="版本"),
+                ),
+            ],
+            options={
+                "verbose_name": "待發送商品變動",
+                "verbose_name_plural": "待發送商品變動",
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0015_pending_product_change"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="notification",
+            options={
+                "ordering": ["-updated_at"],
+                "verbose_name": "通知",
+                "verbose_name_plural": "通知",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "-updated_at", "-id"],
+                name="database_no_user_id_fdc6a7_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def clear_node_allocations(apps, schema_editor):
+    # 舊的配發紀錄以主鍵為節點，沒有租約；重新啟動後各行程改為租用節點
+    apps.get_model("database", "IdNode").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0016_notification_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_node_allocations, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="idnode",
+            name="node",
+            field=models.PositiveIntegerField(default=0, unique=True, verbose_name="節點編號"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="idnode",
+            name="renewed_at",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now, verbose_name="續約時間"
+            ),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0017_id_node_lease"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="notification",
+            name="database_no_user_id_98b5a0_idx",
+        ),
+    ]
@@ -2,17 +2,26 @@
 資料庫系統 (DBS) - 核心資料模型
 根據 FOMO 系統需求規格書建立
 """
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils.functional import cached_property
 from decimal import Decimal
 
 
 class Category(models.Model):
     """商品分類"""
+    # 物化路徑每層的 ID 位數，例如 "00000001/00000005/"
+    PATH_DIGITS = 8
+    
     name = models.CharField(max_length=100, verbose_name="分類名稱")
     description = models.TextField(blank=True, verbose_name="分類描述")
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='children', verbose_name="父分類")
+    path = models.CharField(max_length=255, default='', editable=False, db_index=True, verbose_name="樹狀路徑")
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name="層級")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
     
@@ -23,6 +32,56 @@ class Category(models.Model):
     
     def __str__(self):
         return self.name
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.__dict__.get('parent_id')
+        return instance
+    
+    def clean(self):
+        if self.pk and self.parent_id and self.path:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if parent_path.startswith(self.path):
+                raise ValidationError({'parent': '不能將分類移到自己或其子分類之下'})
+    
+    def save(self, *args, **kwargs):
+        # 與路徑更新放在同一交易中，分類樹快取會在提交後才失效
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._update_path()
+    
+    def _update_path(self):
+        if self.path and getattr(self, '_loaded_parent_id', self.parent_id) == self.parent_id:
+            return
+        
+        parent_path = self.parent.path if self.parent_id else ''
+        new_path = f'{parent_path}{self.pk:0{self.PATH_DIGITS}d}/'
+        new_depth = new_path.count('/') - 1
+        old_path, old_depth = self.path, self.depth
+        if new_path != old_path:
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+            if old_path:
+                # 以一次 UPDATE 改寫整個子樹的路徑前綴
+                Category.subtree_of(old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(new_path), Substr('path', len(old_path) + 1), output_field=models.CharField()),
+                    depth=F('depth') + (new_depth - old_depth),
+                )
+        self.path, self.depth = new_path, new_depth
+        self._loaded_parent_id = self.parent_id
+    
+    @classmethod
+    def subtree_of(cls, path):
+        """路徑前綴的範圍查詢（可使用 path 索引）"""
+        # '~' 排在數字與 '/' 之後，作為前綴範圍的上界
+        return cls.objects.filter(path__gte=path, path__lt=path + '~')
+    
+    def get_descendants(self, include_self=True):
+        """子孫分類，只需一次索引查詢"""
+        descendants = Category.subtree_of(self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
 
 
 class Product(models.Model):
@@ -43,6 +102,15 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
     view_count = models.IntegerField(default=0, verbose_name="瀏覽次數")
+    # 評分彙總（由 ProductReview 信號維護，可用 rebuild_rating_aggregates 修復）
+    rating_sum = models.IntegerField(default=0, verbose_name="評分總和")
+    rating_count = models.IntegerField(default=0, verbose_name="評價數量")
+    rating_average = models.FloatField(default=0, db_index=True, verbose_name="平均評分")
+    rating_1_count = models.IntegerField(default=0, verbose_name="一星數量")
+    rating_2_count = models.IntegerField(default=0, verbose_name="二星數量")
+    rating_3_count = models.IntegerField(default=0, verbose_name="三星數量")
+    rating_4_count = models.IntegerField(default=0, verbose_name="四星數量")
+    rating_5_count = models.IntegerField(default=0, verbose_name="五星數量")
     
     class Meta:
         verbose_name = "商品"
@@ -52,13 +120,85 @@ class Product(models.Model):
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 記錄載入時的搜尋欄位，儲存時據此判斷是否需要更新搜尋索引
+        instance._loaded_search_fields = (instance.__dict__.get('name'), instance.__dict__.get('description'))
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        # 記錄載入時的價格，儲存時據此判斷是否改價（價格欄位未載入時不會被儲存）
+        instance._loaded_price = instance.__dict__.get('price')
+        # 記錄載入時的庫存與狀態，儲存時據此判斷是否需要通知追蹤者
+        instance._loaded_stock = instance.__dict__.get('stock')
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
+    @cached_property
+    def available_stock(self):
+        """可售庫存（庫存扣除尚未到期的保留量）"""
+        from .reservations import available_stock
+        return available_stock([self.pk])[self.pk]
+    
     @property
     def average_rating(self):
-        """計算平均評分"""
-        ratings = self.reviews.all()
-        if ratings.exists():
-            return sum(r.rating for r in ratings) / ratings.count()
-        return 0
+        """平均評分（讀取彙總欄位，不查詢評價）"""
+        return self.rating_average
+    
+    @property
+    def rating_histogram(self):
+        """各星等評價數量，由五星到一星"""
+        return {star: getattr(self, f'rating_{star}_count') for star in range(5, 0, -1)}
+
+
+class ProductSearchDocument(models.Model):
+    """商品搜尋文件（斷詞後的內容，由資料庫全文索引引用）"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='search_document', verbose_name="商品")
+    name_tokens = models.TextField(blank=True, verbose_name="名稱詞元")
+    description_tokens = models.TextField(blank=True, verbose_name="描述詞元")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
+    
+    class Meta:
+        verbose_name = "商品搜尋文件"
+        verbose_name_plural = "商品搜尋文件"
+    
+    def __str__(self):
+        return f"{self.product_id} 的搜尋文件"
+
+
+class RelatedProduct(models.Model):
+    """相關商品（由共同購買／共同收藏離線計算的相似度前 N 名）"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbours', verbose_name="商品")
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name="相關商品")
+    score = models.FloatField(verbose_name="相似度")
+    rank = models.PositiveSmallIntegerField(verbose_name="排名")
+    
+    class Meta:
+        verbose_name = "相關商品"
+        verbose_name_plural = "相關商品"
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', 'rank']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} → {self.related_id} ({self.score:.3f})"
+
+
+class RelatedProductBuild(models.Model):
+    """相關商品計算紀錄，增量計算以最近一次的訂單與收藏 ID 作為起點"""
+    is_full = models.BooleanField(default=False, verbose_name="完整重建")
+    last_order_id = models.PositiveBigIntegerField(default=0, verbose_name="已處理的最後訂單 ID")
+    last_favorite_id = models.PositiveBigIntegerField(default=0, verbose_name="已處理的最後收藏 ID")
+    products_updated = models.PositiveIntegerField(default=0, verbose_name="更新商品數")
+    built_at = models.DateTimeField(auto_now_add=True, verbose_name="計算時間")
+    
+    class Meta:
+        verbose_name = "相關商品計算紀錄"
+        verbose_name_plural = "相關商品計算紀錄"
+        ordering = ['-built_at', '-id']
+    
+    def __str__(self):
+        return f"{'完整' if self.is_full else '增量'}計算 {self.built_at}"
 
 
 class ProductImage(models.Model):
@@ -83,6 +223,8 @@ class CustomerProfile(models.Model):
     address = models.TextField(blank=True, verbose_name="地址")
     birth_date = models.DateField(null=True, blank=True, verbose_name="生日")
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True, verbose_name="頭像")
+    # 未讀通知數（反正規化，由 database.notifications 維護，repair_unread_counts 定期校正）
+    unread_notifications = models.PositiveIntegerField(default=0, verbose_name="未讀通知數")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
     
@@ -142,11 +284,47 @@ class Order(models.Model):
         verbose_name = "訂單"
         verbose_name_plural = "訂單"
         ordering = ['-created_at']
+        indexes = [
+            # 游標分頁使用 (created_at, id) 作為鍵
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"訂單 {self.order_number}"
 
 
+class StockReservation(models.Model):
+    """庫存保留（進入結帳時保留數量，付款時確認，逾時由背景清理釋放）"""
+    STATUS_CHOICES = [
+        ('held', '保留中'),
+        ('confirmed', '已確認'),
+        ('released', '已釋放'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations', verbose_name="商品")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations', verbose_name="使用者")
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='stock_reservations', verbose_name="訂單")
+    quantity = models.PositiveIntegerField(verbose_name="數量")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held', verbose_name="狀態")
+    expires_at = models.DateTimeField(verbose_name="到期時間")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
+    
+    class Meta:
+        verbose_name = "庫存保留"
+        verbose_name_plural = "庫存保留"
+        indexes = [
+            # 計算可售庫存：各商品尚未到期的保留量
+            models.Index(fields=['product', 'status', 'expires_at']),
+            # 背景清理：找出已到期的保留
+            models.Index(fields=['status', 'expires_at']),
+            models.Index(fields=['user', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} × {self.quantity} ({self.get_status_display()})"
+
+
 class OrderItem(models.Model):
     """訂單項目"""
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', verbose_name="訂單")
@@ -180,6 +358,13 @@ class ProductReview(models.Model):
     
     def __str__(self):
         return f"{self.user.username} 對 {self.product.name} 的評價"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 記錄載入時的商品與評分，供信號計算彙總差值
+        instance._loaded_rating = (instance.__dict__.get('product_id'), instance.__dict__.get('rating'))
+        return instance
 
 
 class Favorite(models.Model):
@@ -212,15 +397,72 @@ class Notification(models.Model):
     title = models.CharField(max_length=200, verbose_name="標題")
     message = models.TextField(verbose_name="訊息")
     is_read = models.BooleanField(default=False, verbose_name="已讀")
+    # 摘要：同類型的通知在時間窗內合併為一筆，標題與訊息為最新一則，payload 保存先前各則（由舊到新）
+    count = models.PositiveIntegerField(default=1, verbose_name="則數")
+    payload = models.JSONField(default=list, blank=True, verbose_name="先前通知")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
     
     class Meta:
         verbose_name = "通知"
         verbose_name_plural = "通知"
-        ordering = ['-created_at']
+        # 摘要併入新的一則時更新 updated_at，依最近活動排序
+        ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', '-updated_at', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.title}"
+    
+    @property
+    def is_digest(self):
+        return self.count > 1
+
+
+class IdNode(models.Model):
+    """編號產生器的節點租約：每個行程租用一個節點，定期續約，租約到期的節點可再配發給其他行程"""
+    node = models.PositiveIntegerField(unique=True, verbose_name="節點編號")
+    hostname = models.CharField(max_length=255, verbose_name="主機名稱")
+    pid = models.PositiveIntegerField(verbose_name="行程 ID")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="配發時間")
+    renewed_at = models.DateTimeField(db_index=True, verbose_name="續約時間")
+    
+    class Meta:
+        verbose_name = "編號產生節點"
+        verbose_name_plural = "編號產生節點"
+    
+    def __str__(self):
+        return f"{self.node} ({self.hostname}:{self.pid})"
+
+
+class IdempotencyKey(models.Model):
+    """冪等鍵：同一表單重複送出時回放第一次的結果，不再重複寫入"""
+    STATUS_CHOICES = [
+        ('processing', '處理中'),
+        ('completed', '已完成'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys', verbose_name="使用者")
+    key = models.CharField(max_length=64, verbose_name="冪等鍵")
+    path = models.CharField(max_length=255, verbose_name="請求路徑")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing', verbose_name="狀態")
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="回應狀態碼")
+    response_location = models.CharField(max_length=500, blank=True, verbose_name="回應轉址")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
+    expires_at = models.DateTimeField(verbose_name="到期時間")
+    
+    class Meta:
+        verbose_name = "冪等鍵"
+        verbose_name_plural = "冪等鍵"
+        unique_together = ['user', 'key']
+        indexes = [
+            # 清理工作：找出已到期的鍵
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}:{self.key} ({self.get_status_display()})"
 
 
 class Coupon(models.Model):
@@ -234,6 +476,7 @@ class Coupon(models.Model):
     valid_from = models.DateTimeField(verbose_name="有效開始時間")
     valid_until = models.DateTimeField(verbose_name="有效結束時間")
     usage_limit = models.IntegerField(null=True, blank=True, verbose_name="使用次數限制")
+    per_user_limit = models.IntegerField(null=True, blank=True, verbose_name="每人使用次數限制")
     used_count = models.IntegerField(default=0, verbose_name="已使用次數")
     is_active = models.BooleanField(default=True, verbose_name="啟用")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
@@ -246,6 +489,26 @@ class Coupon(models.Model):
         return self.code
 
 
+class CouponRedemption(models.Model):
+    """優惠券使用紀錄（每筆使用優惠券的訂單一筆，訂單取消時刪除並歸還使用次數）"""
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='redemptions', verbose_name="優惠券")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coupon_redemptions', verbose_name="使用者")
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='coupon_redemption', verbose_name="訂單")
+    discount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="折扣金額")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="使用時間")
+    
+    class Meta:
+        verbose_name = "優惠券使用紀錄"
+        verbose_name_plural = "優惠券使用紀錄"
+        indexes = [
+            # 檢查每人使用次數
+            models.Index(fields=['coupon', 'user']),
+        ]
+    
+    def __str__(self):
+        return f"{self.coupon_id} - {self.order_id}"
+
+
 class ProductQuestion(models.Model):
     """商品問答"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='questions', verbose_name="商品")
@@ -286,6 +549,27 @@ class ProductTracking(models.Model):
         return f"{self.user.username} 追蹤 {self.product.name}"
 
 
+class PendingProductChange(models.Model):
+    """庫存／狀態變動通知的合併視窗：每項商品一筆，記錄視窗開始時與最新的值，視窗結束發送後刪除"""
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='+', verbose_name="商品"
+    )
+    stock_before = models.IntegerField(null=True, blank=True, verbose_name="視窗開始時庫存")
+    stock_after = models.IntegerField(null=True, blank=True, verbose_name="最新庫存")
+    status_before = models.CharField(max_length=20, null=True, blank=True, verbose_name="視窗開始時狀態")
+    status_after = models.CharField(max_length=20, null=True, blank=True, verbose_name="最新狀態")
+    opened_at = models.DateTimeField(db_index=True, verbose_name="視窗開始時間")
+    # 每次併入變動時遞增，發送時據此確認讀取後沒有新的變動
+    version = models.PositiveIntegerField(default=0, verbose_name="版本")
+    
+    class Meta:
+        verbose_name = "待發送商品變動"
+        verbose_name_plural = "待發送商品變動"
+    
+    def __str__(self):
+        return f"{self.product_id} ({self.opened_at})"
+
+
 class ProductPriceHistory(models.Model):
     """商品價格歷史"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history', verbose_name="商品")
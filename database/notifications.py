@@ -0,0 +1,282 @@
+"""
+通知發送
+大量通知（例如商品改價、補貨通知所有追蹤者）在交易提交後交由背景執行緒處理：
+以 iterator() 串流讀取收件者，並分批 bulk_create，發出異動的請求不需等待。
+同一使用者同類型的未讀通知在 NOTIFICATION_DIGEST_WINDOW 秒內合併為一筆摘要（則數累加、先前內容存入 payload），
+避免頻繁事件讓使用者累積大量通知列。
+每位使用者的未讀數存放在 CustomerProfile.unread_notifications 並快取：新增、已讀、刪除通知時在同一交易中
+以 F() 調整欄位，提交後讓快取失效；其他途徑造成的偏差由 repair_unread_counts 定期校正
+"""
+import logging
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import CustomerProfile, Notification, ProductTracking
+
+logger = logging.getLogger(__name__)
+
+FANOUT_BATCH_SIZE = 1000
+# 摘要最多保存的先前通知則數（則數仍會累加）
+DIGEST_MAX_PAYLOAD = 50
+# 未讀數快取秒數
+UNREAD_CACHE_TIMEOUT = 300
+
+_executor = None
+
+
+def _executor_instance():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'NOTIFICATION_WORKERS', 1),
+            thread_name_prefix='notifications',
+        )
+    return _executor
+
+
+def _run_safely(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('發送通知失敗：%s%r', func.__name__, args)
+    finally:
+        connection.close()
+
+
+def enqueue(func, *args):
+    """交易提交後在背景執行 func(*args)，交易回滾時不執行"""
+    transaction.on_commit(lambda: _executor_instance().submit(_run_safely, func, args))
+
+
+def digest_window():
+    """合併為摘要的時間窗（秒），0 表示不合併"""
+    return getattr(settings, 'NOTIFICATION_DIGEST_WINDOW', 3600)
+
+
+def fold(digest, notification):
+    """將新通知併入摘要：原本的標題與訊息移入 payload，摘要改顯示最新一則"""
+    digest.payload = (digest.payload + [{
+        'title': digest.title,
+        'message': digest.message,
+        'created_at': (digest.updated_at or timezone.now()).isoformat(),
+    }])[-DIGEST_MAX_PAYLOAD:]
+    digest.count += 1
+    digest.title, digest.message = notification.title, notification.message
+    digest.updated_at = timezone.now()
+
+
+def _open_digests(notifications):
+    """各 (使用者, 類型) 在時間窗內最新的未讀通知，一次查詢取得"""
+    since = timezone.now() - timedelta(seconds=digest_window())
+    digests = Notification.objects.filter(
+        user_id__in={notification.user_id for notification in notifications},
+        type__in={notification.type for notification in notifications},
+        is_read=False,
+        # updated_at 不早於 created_at，多加此條件讓查詢能使用 (user, -updated_at, -id) 索引
+        updated_at__gte=since,
+        created_at__gte=since,
+    ).select_for_update().order_by('id')
+    return {(digest.user_id, digest.type): digest for digest in digests}
+
+
+def _fold_into_digests(batch):
+    """可併入既有摘要的通知以 bulk_update 更新（鎖定摘要列避免遺失更新），回傳需要新增的通知"""
+    digests = _open_digests(batch)
+    to_create, to_update = [], {}
+    for notification in batch:
+        key = (notification.user_id, notification.type)
+        digest = digests.get(key)
+        if digest is None:
+            digests[key] = notification
+            to_create.append(notification)
+            continue
+        fold(digest, notification)
+        if digest.pk:
+            to_update[digest.pk] = digest
+    if to_update:
+        Notification.objects.bulk_update(to_update.values(), ['title', 'message', 'count', 'payload', 'updated_at'])
+    return to_create
+
+
+def _write_batch(batch):
+    """寫入一批通知並調整收件者的未讀數（併入未讀摘要的不增加）"""
+    with transaction.atomic():
+        to_create = _fold_into_digests(batch) if digest_window() else batch
+        Notification.objects.bulk_create(to_create)
+        adjust_unread(Counter(notification.user_id for notification in to_create))
+
+
+def notify(user, type, title, message):
+    """發送一則通知，時間窗內已有同類型的未讀通知時併入該摘要"""
+    user_id = getattr(user, 'pk', user)
+    _write_batch([Notification(user_id=user_id, type=type, title=title, message=message)])
+
+
+def bulk_create_notifications(notifications, batch_size=None):
+    """分批寫入一連串 Notification（同樣併入摘要），回傳通知則數"""
+    batch_size = batch_size or FANOUT_BATCH_SIZE
+    sent, batch = 0, []
+    for notification in notifications:
+        batch.append(notification)
+        if len(batch) >= batch_size:
+            _write_batch(batch)
+            sent, batch = sent + len(batch), []
+    if batch:
+        _write_batch(batch)
+        sent += len(batch)
+    return sent
+
+
+def bulk_notify(user_ids, type, title, message, batch_size=None):
+    """對一連串使用者發送相同的通知，分批寫入，回傳發送數"""
+    return bulk_create_notifications(
+        (Notification(user_id=user_id, type=type, title=title, message=message) for user_id in user_ids),
+        batch_size,
+    )
+
+
+def fan_out_price_change(product_id, product_name, price):
+    """通知追蹤價格的顧客商品已改價，回傳發送數"""
+    trackers = (
+        ProductTracking.objects.filter(product_id=product_id, track_price=True)
+        .values_list('user_id', flat=True)
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+    return bulk_notify(
+        trackers,
+        type='promotion',
+        title='商品價格變動',
+        message=f'您追蹤的商品 {product_name} 價格已變動為 NT$ {price}',
+    )
+
+
+def fan_out_product_change(product_id, product_name, stock_message=None, status_message=None):
+    """
+    通知追蹤庫存或狀態的顧客商品變動，同時追蹤兩者的顧客合併為一則通知，回傳發送數
+    """
+    tracked = Q()
+    if stock_message:
+        tracked |= Q(track_stock=True)
+    if status_message:
+        tracked |= Q(track_status=True)
+    if not tracked:
+        return 0
+    trackers = (
+        ProductTracking.objects.filter(tracked, product_id=product_id)
+        .values_list('user_id', 'track_stock', 'track_status')
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+
+    def notifications():
+        for user_id, track_stock, track_status in trackers:
+            parts = [
+                message for message, wanted in ((stock_message, track_stock), (status_message, track_status))
+                if message and wanted
+            ]
+            yield Notification(
+                user_id=user_id,
+                type='system',
+                title='追蹤商品異動',
+                message=f"您追蹤的商品 {product_name} {'；'.join(parts)}",
+            )
+
+    return bulk_create_notifications(notifications())
+
+
+def _unread_cache_key(user_id):
+    return f'unread_notifications:{user_id}'
+
+
+def _unread_subquery():
+    unread = (
+        Notification.objects.filter(user=OuterRef('user'), is_read=False)
+        .order_by().values('user').annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(unread, output_field=IntegerField()), Value(0))
+
+
+def unread_count(user):
+    """使用者的未讀通知數：依序讀取快取、CustomerProfile 欄位，尚無顧客資料時依實際筆數建立"""
+    key = _unread_cache_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = CustomerProfile.objects.filter(user=user).values_list('unread_notifications', flat=True).first()
+        if count is None:
+            count = Notification.objects.filter(user=user, is_read=False).count()
+            CustomerProfile.objects.get_or_create(user=user, defaults={'unread_notifications': count})
+        cache.set(key, count, UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def adjust_unread(deltas):
+    """
+    依 {使用者 ID: 增減量} 調整未讀數欄位，相同增減量的使用者合併為一個 UPDATE，交易提交後讓快取失效。
+    尚無顧客資料的使用者略過，於 unread_count 第一次讀取時依實際筆數建立
+    """
+    groups = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            groups[delta].append(user_id)
+    for delta, user_ids in groups.items():
+        CustomerProfile.objects.filter(user_id__in=user_ids).update(
+            unread_notifications=Greatest(F('unread_notifications') + delta, 0)
+        )
+    keys = [_unread_cache_key(user_id) for user_ids in groups.values() for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def mark_read(user, notification_ids=None):
+    """
+    將使用者的通知標記為已讀（notification_ids 為 None 時為全部未讀），
+    以單一 UPDATE 完成並扣除未讀數，回傳實際變更的筆數
+    """
+    notifications = Notification.objects.filter(user=user, is_read=False)
+    if notification_ids is not None:
+        notifications = notifications.filter(pk__in=notification_ids)
+    with transaction.atomic():
+        updated = notifications.update(is_read=True)
+        adjust_unread({user.pk: -updated})
+    return updated
+
+
+def delete_read(user, older_than):
+    """
+    以單一 DELETE 刪除使用者最後更新早於 older_than（timedelta）之前的已讀通知，回傳刪除筆數。
+    已讀通知不計入未讀數，不需調整計數
+    """
+    cutoff = timezone.now() - older_than
+    deleted, _ = Notification.objects.filter(user=user, is_read=True, updated_at__lt=cutoff).delete()
+    return deleted
+
+
+def delete_notifications(notifications):
+    """刪除通知查詢集並扣除其中未讀的筆數，回傳刪除筆數"""
+    with transaction.atomic():
+        unread = dict(
+            notifications.filter(is_read=False).order_by().values_list('user_id').annotate(total=Count('pk'))
+        )
+        deleted, _ = notifications.delete()
+        adjust_unread({user_id: -total for user_id, total in unread.items()})
+    return deleted
+
+
+def repair_unread_counts():
+    """以實際未讀筆數校正與欄位不一致的顧客資料並讓其快取失效，回傳校正的筆數"""
+    stale = list(
+        CustomerProfile.objects.annotate(actual=_unread_subquery())
+        .exclude(unread_notifications=F('actual'))
+        .values_list('user_id', flat=True)
+    )
+    if stale:
+        CustomerProfile.objects.filter(user_id__in=stale).update(unread_notifications=_unread_subquery())
+        cache.delete_many([_unread_cache_key(user_id) for user_id in stale])
+    return len(stale)
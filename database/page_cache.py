@@ -0,0 +1,179 @@
+"""
+匿名使用者頁面快取與條件式 GET
+以網址與查詢字串為鍵，並加上商品／分類的版本號；資料異動時只遞增受影響的版本，
+舊版本的頁面不需逐一刪除，自然因鍵不再被使用而過期。
+同一組版本號也作為 ETag，瀏覽器重新驗證時直接回應 304，不查詢資料庫也不渲染模板。
+不提供 Last-Modified：評價、問答、評分彙總、相關商品等異動不會更新商品的 updated_at，
+只依時間判斷會讓只送 If-Modified-Since 的用戶端拿到過期內容
+"""
+import hashlib
+import secrets
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .categories import TREE_VERSION_KEY, get_category_tree
+from .models import Product
+
+CATALOG_VERSION_KEY = 'page_version:catalog'
+
+
+def product_version_key(pk):
+    return f'page_version:product:{pk}'
+
+
+def category_version_key(pk):
+    return f'page_version:category:{pk}'
+
+
+def _new_version():
+    # 時間加上隨機值：快取被清空後不會沿用舊的版本號，並行的兩次異動也不會寫入相同的版本
+    return f'{time.time_ns():x}-{secrets.token_hex(4)}'
+
+
+def get_versions(keys):
+    """取得各版本號，不存在的鍵以目前時間初始化"""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(keys):
+    """寫入新的唯一版本；不使用 incr（檔案快取的 incr 為先讀後寫，並行遞增可能寫入相同的值）"""
+    cache.set_many({key: _new_version() for key in keys}, None)
+
+
+def category_keys(category_ids):
+    """分類本身及其所有祖先分類的版本鍵（子分類商品異動也會影響祖先分類的列表）"""
+    tree = get_category_tree()
+    keys = set()
+    for category_id in category_ids:
+        node = tree.get(category_id)
+        ancestors = [int(segment) for segment in node.path.split('/') if segment] if node else [category_id]
+        keys.update(category_version_key(pk) for pk in ancestors)
+    return keys
+
+
+def expire_product_pages(product_ids, category_ids=None, listings=True):
+    """
+    交易提交後讓商品頁的快取失效；listings 為 True 時一併讓所屬分類（含祖先）及全部商品列表失效。
+    category_ids 可直接指定（例如含商品換分類前的舊分類）；為 None 時由資料庫查出商品目前的分類。
+    """
+    product_ids = set(product_ids)
+    if not listings:
+        category_ids = set()
+    elif category_ids is None:
+        category_ids = set(
+            Product.objects.filter(pk__in=product_ids).exclude(category=None)
+            .values_list('category_id', flat=True)
+        )
+
+    def expire():
+        keys = {product_version_key(pk) for pk in product_ids}
+        if listings:
+            keys |= category_keys(set(category_ids) - {None})
+            keys.add(CATALOG_VERSION_KEY)
+        bump_versions(sorted(keys))
+
+    transaction.on_commit(expire)
+
+
+def _is_anonymous_get(request):
+    """未登入且沒有待顯示訊息的 GET；匿名購物車非空時導覽列有購物車徽章，也不使用共用快取"""
+    return (
+        request.method == 'GET'
+        and not request.user.is_authenticated
+        and not getattr(request, 'anonymous_cart', None)
+        and not len(get_messages(request))
+    )
+
+
+def _is_shareable(request, response):
+    """回應與使用者無關（未設定 Cookie、未使用 CSRF token）才能快取或附加驗證碼"""
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def _conditional(request, etag, get_response):
+    """If-None-Match 相符時直接回應 304，否則呼叫 get_response 並附加 ETag"""
+    etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = get_response()
+        if not _is_shareable(request, response):
+            return response
+    response.headers.setdefault('ETag', etag)
+    # 每次都向伺服器重新驗證，避免瀏覽器以啟發式快取顯示過期頁面
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def cache_anonymous_page(validators, timeout=None):
+    """
+    對匿名 GET 請求快取整個回應並支援條件式 GET。
+    validators(request, *args, **kwargs) 回傳頁面所依賴的版本鍵；
+    分類樹版本一律加入，因為導覽列包含分類選單。
+    下列情況不處理：已登入、非 GET、有待顯示的訊息；回應設定了 Cookie 或使用了 CSRF token 時不快取。
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _is_anonymous_get(request):
+                return view_func(request, *args, **kwargs)
+
+            keys = validators(request, *args, **kwargs)
+            versions = ':'.join(str(version) for version in get_versions([TREE_VERSION_KEY] + list(keys)))
+            digest = hashlib.md5(f'{request.get_full_path()}|{versions}'.encode()).hexdigest()
+            cache_key = f'page:{view_func.__name__}:{digest}'
+
+            def get_response():
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+                response = view_func(request, *args, **kwargs)
+                if _is_shareable(request, response):
+                    page_timeout = timeout if timeout is not None else getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+                    cache.set(cache_key, (response.content, response['Content-Type']), page_timeout)
+                return response
+
+            etag = digest
+            if timeout is not None:
+                # 指定較短的快取時間代表頁面可能依賴未納入版本的資料，ETag 也依同一時間窗輪替
+                etag = f'{digest}-{int(time.time() // timeout)}'
+            return _conditional(request, etag, get_response)
+        return wrapper
+    return decorator
+
+
+def conditional_anonymous_page(validators):
+    """
+    只做條件式 GET（不快取回應）。validators(request, *args, **kwargs) 回傳
+    ETag 來源字串（須涵蓋頁面顯示的所有資料）；回傳 None 表示資料不存在，交由視圖處理。
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _is_anonymous_get(request):
+                return view_func(request, *args, **kwargs)
+            source = validators(request, *args, **kwargs)
+            if source is None:
+                return view_func(request, *args, **kwargs)
+            etag = hashlib.md5(f'{request.get_full_path()}|{source}'.encode()).hexdigest()
+            return _conditional(request, etag, lambda: view_func(request, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,182 @@
+"""
+游標（keyset）分頁
+以排序欄位的值作為游標，避免 COUNT(*) 與 OFFSET 造成深層分頁變慢
+"""
+import hashlib
+
+from django.core import signing
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+
+CURSOR_PARAM = 'cursor'
+CURSOR_SALT = 'database.pagination.cursor'
+
+# 總筆數快取秒數
+COUNT_CACHE_TIMEOUT = 60
+
+
+class InvalidCursor(Exception):
+    """游標無法解碼或與排序欄位不符"""
+
+
+class CursorPage:
+    """單頁結果，提供與 Django Page 相近的介面"""
+
+    def __init__(self, paginator, object_list, next_cursor, previous_cursor):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def total_count(self):
+        return self.paginator.total_count
+
+
+class CursorPaginator:
+    """
+    依 ordering 欄位（預設 -created_at, -id）做 keyset 分頁。
+    count 可為 None（不計算總數）、'cached'（快取的精確總數）
+    或 'estimate'（PostgreSQL 未過濾時使用統計估計值，否則同 cached）。
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), count=None):
+        ordering = tuple(ordering)
+        if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            # 以主鍵作為最後的排序鍵，確保游標唯一
+            ordering += ('-id' if ordering and ordering[-1].startswith('-') else 'id',)
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self.count_mode = count
+        self._total_count = None
+
+    def get_page(self, cursor):
+        """取得游標所指的頁面，游標無效時回到第一頁"""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
+
+    def page(self, cursor):
+        direction, values = self._decode(cursor) if cursor else ('next', None)
+        ordering = self.ordering if direction == 'next' else _reverse(self.ordering)
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'next':
+            has_next, has_previous = has_more, values is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        next_cursor = self._encode('next', rows[-1]) if rows and has_next else None
+        previous_cursor = self._encode('previous', rows[0]) if rows and has_previous else None
+        return CursorPage(self, rows, next_cursor, previous_cursor)
+
+    @property
+    def total_count(self):
+        """依 count 設定回傳總筆數，未啟用時為 None"""
+        if self.count_mode is None:
+            return None
+        if self._total_count is None:
+            if self.count_mode == 'estimate':
+                self._total_count = self._estimated_count()
+            if self._total_count is None:
+                self._total_count = self._cached_count()
+        return self._total_count
+
+    def _cached_count(self):
+        sql, params = self.queryset.order_by().query.sql_with_params()
+        digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+        return cache.get_or_set(f'cursor_count:{digest}', self.queryset.order_by().count, COUNT_CACHE_TIMEOUT)
+
+    def _estimated_count(self):
+        query = self.queryset.query
+        if connection.vendor != 'postgresql' or query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [self.queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] >= 0 else None
+
+    def _after(self, ordering, values):
+        """組合「排在游標之後」的條件：(a > x) OR (a = x AND b > y) ..."""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[index]})
+            for previous_field, value in zip(ordering[:index], values):
+                clause &= Q(**{previous_field.lstrip('-'): value})
+            condition |= clause
+        return condition
+
+    def _encode(self, direction, obj):
+        values = [_serialize(getattr(obj, field.lstrip('-'))) for field in self.ordering]
+        return signing.dumps([direction[0], values], salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, cursor):
+        try:
+            direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        if direction not in ('n', 'p') or len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        try:
+            values = [self._to_python(field, value) for field, value in zip(self.ordering, values)]
+        except Exception:
+            raise InvalidCursor(cursor)
+        return ('next' if direction == 'n' else 'previous'), values
+
+    def _to_python(self, field, value):
+        name = field.lstrip('-')
+        if name == 'pk':
+            model_field = self.queryset.model._meta.pk
+        elif name in self.queryset.query.annotations:
+            model_field = self.queryset.query.annotations[name].output_field
+        else:
+            model_field = self.queryset.model._meta.get_field(name)
+        return model_field.to_python(value)
+
+
+def _reverse(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+def _serialize(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
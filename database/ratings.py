@@ -0,0 +1,108 @@
+"""
+商品評分彙總
+以增量方式維護 Product 上的評分總和、數量、平均與星等分布
+"""
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from .models import Product, ProductReview
+
+RATING_STARS = range(1, 6)
+
+
+def apply_rating_delta(product_id, old_rating=None, new_rating=None):
+    """以單一 UPDATE 套用評分變動（新增：old=None；刪除：new=None）"""
+    if product_id is None or old_rating == new_rating:
+        return
+
+    count_delta = (new_rating is not None) - (old_rating is not None)
+    new_sum = F('rating_sum') + ((new_rating or 0) - (old_rating or 0))
+    new_count = F('rating_count') + count_delta
+
+    updates = {
+        'rating_sum': new_sum,
+        'rating_count': new_count,
+        # UPDATE 右側取的是舊值，因此可直接用新總和 / 新數量計算平均
+        'rating_average': Case(
+            When(rating_count__gt=-count_delta, then=Cast(new_sum, FloatField()) / new_count),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    }
+    if old_rating is not None:
+        field = f'rating_{old_rating}_count'
+        updates[field] = F(field) - 1
+    if new_rating is not None:
+        field = f'rating_{new_rating}_count'
+        updates[field] = F(field) + 1
+
+    Product.objects.filter(pk=product_id).update(**updates)
+
+
+def compute_rating_aggregates(product_ids=None):
+    """由評價資料重新計算彙總，回傳 {product_id: 欄位值}"""
+    reviews = ProductReview.objects.order_by()
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+
+    annotations = {
+        'rating_sum': Sum('rating'),
+        'rating_count': Count('id'),
+    }
+    for star in RATING_STARS:
+        annotations[f'rating_{star}_count'] = Count('id', filter=Q(rating=star))
+
+    aggregates = {}
+    for row in reviews.values('product_id').annotate(**annotations):
+        product_id = row.pop('product_id')
+        row['rating_average'] = row['rating_sum'] / row['rating_count']
+        aggregates[product_id] = row
+    return aggregates
+
+
+def empty_rating_aggregates():
+    """沒有任何評價時的彙總欄位值"""
+    values = {'rating_sum': 0, 'rating_count': 0, 'rating_average': 0.0}
+    for star in RATING_STARS:
+        values[f'rating_{star}_count'] = 0
+    return values
+
+
+def _matches(product, expected):
+    for field, value in expected.items():
+        current = getattr(product, field)
+        if field == 'rating_average':
+            if abs(current - value) > 1e-9:
+                return False
+        elif current != value:
+            return False
+    return True
+
+
+def refresh_rating_aggregates(product_ids=None, batch_size=500):
+    """重新計算並寫回評分彙總，僅更新數值不一致的商品，回傳修正筆數"""
+    aggregates = compute_rating_aggregates(product_ids)
+    empty = empty_rating_aggregates()
+    fields = list(empty)
+
+    products = Product.objects.order_by('pk').only('pk', *fields)
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+
+    stale = []
+    fixed = 0
+    for product in products.iterator(chunk_size=batch_size):
+        expected = aggregates.get(product.pk, empty)
+        if _matches(product, expected):
+            continue
+        for field in fields:
+            setattr(product, field, expected[field])
+        stale.append(product)
+        if len(stale) >= batch_size:
+            Product.objects.bulk_update(stale, fields)
+            fixed += len(stale)
+            stale = []
+    if stale:
+        Product.objects.bulk_update(stale, fields)
+        fixed += len(stale)
+    return fixed
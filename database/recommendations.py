@@ -0,0 +1,181 @@
+"""
+相關商品推薦（離線計算）
+以訂單與收藏組成「籃子 × 商品」稀疏矩陣，計算加權共同出現的餘弦相似度，
+每項商品只保存前 N 名鄰居，商品頁以一次索引查詢讀取
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max
+from scipy import sparse
+
+from .models import Favorite, Order, OrderItem, Product, RelatedProduct, RelatedProductBuild
+from .page_cache import expire_product_pages
+
+# 共同購買的權重高於共同收藏
+PURCHASE_WEIGHT = 1.0
+FAVORITE_WEIGHT = 0.5
+
+TOP_N = 8
+
+# 商品數超過此值的籃子（大宗採購、大量收藏）幾乎與所有商品共同出現，不列入計算
+MAX_BASKET_SIZE = 50
+
+EXCLUDED_ORDER_STATUSES = ['cancelled', 'refunded']
+
+
+def _purchases():
+    return OrderItem.objects.exclude(order__status__in=EXCLUDED_ORDER_STATUSES)
+
+
+def _load_baskets(product_ids=None):
+    """
+    讀取（包含指定商品的）所有籃子，回傳 (籃子 × 商品 0/1 矩陣, 每列權重, 欄位對應的商品 ID)。
+    每筆訂單為一個籃子，每位使用者的收藏為一個籃子。
+    """
+    purchases = _purchases()
+    favorites = Favorite.objects.all()
+    if product_ids is not None:
+        purchases = purchases.filter(order__in=OrderItem.objects.filter(product__in=product_ids).values('order'))
+        favorites = favorites.filter(user__in=Favorite.objects.filter(product__in=product_ids).values('user'))
+
+    pairs = [(('o', order_id), product_id) for order_id, product_id in purchases.values_list('order_id', 'product_id')]
+    pairs += [(('f', user_id), product_id) for user_id, product_id in favorites.values_list('user_id', 'product_id')]
+    if not pairs:
+        return None, None, []
+
+    basket_index, column_index = {}, {}
+    rows = np.fromiter((basket_index.setdefault(basket, len(basket_index)) for basket, _ in pairs), dtype=np.int64)
+    cols = np.fromiter((column_index.setdefault(pk, len(column_index)) for _, pk in pairs), dtype=np.int64)
+
+    matrix = sparse.coo_matrix(
+        (np.ones(len(pairs)), (rows, cols)), shape=(len(basket_index), len(column_index))
+    ).tocsr()
+    # 同一籃子重複的商品只算一次
+    matrix.data[:] = 1.0
+
+    weights = np.array([PURCHASE_WEIGHT if kind == 'o' else FAVORITE_WEIGHT for kind, _ in basket_index])
+    sizes = np.diff(matrix.indptr)
+    weights[sizes > MAX_BASKET_SIZE] = 0.0
+    return matrix, weights, list(column_index)
+
+
+def _occurrences(product_ids):
+    """各商品在所有籃子中的加權出現次數"""
+    totals = dict.fromkeys(product_ids, 0.0)
+    purchase_counts = (
+        _purchases().filter(product__in=product_ids)
+        .values_list('product_id').annotate(count=Count('order', distinct=True))
+    )
+    for pk, count in purchase_counts:
+        totals[pk] += count * PURCHASE_WEIGHT
+    favorite_counts = Favorite.objects.filter(product__in=product_ids).values_list('product_id').annotate(count=Count('pk'))
+    for pk, count in favorite_counts:
+        totals[pk] += count * FAVORITE_WEIGHT
+    return np.array([totals[pk] for pk in product_ids])
+
+
+def compute_neighbours(product_ids=None, top_n=TOP_N):
+    """
+    計算商品的前 N 名相似商品，回傳 {商品 ID: [(相關商品 ID, 分數), ...]}。
+    product_ids 為 None 時計算全部商品；否則只讀取包含這些商品的籃子並只計算這些商品。
+    """
+    matrix, weights, columns = _load_baskets(product_ids)
+    if matrix is None:
+        return {}
+
+    # 共同出現矩陣 C = Bᵀ W B，對角線為各商品的加權出現次數
+    cooccurrence = (matrix.T @ sparse.diags(weights) @ matrix).tocsr()
+    occurrences = cooccurrence.diagonal()
+    if product_ids is None:
+        targets = range(len(columns))
+    else:
+        wanted = set(product_ids)
+        targets = [index for index, pk in enumerate(columns) if pk in wanted]
+        # 只讀取了包含目標商品的籃子，其他商品的出現次數需另外查詢（含大籃子，為近似值）
+        others = [index for index, pk in enumerate(columns) if pk not in wanted]
+        if others:
+            occurrences[others] = _occurrences([columns[index] for index in others])
+
+    with np.errstate(divide='ignore'):
+        scale = np.where(occurrences > 0, 1.0 / np.sqrt(occurrences), 0.0)
+    similarity = (sparse.diags(scale) @ cooccurrence @ sparse.diags(scale)).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+
+    neighbours = {}
+    for row in targets:
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        if start == end:
+            continue
+        scores, indices = similarity.data[start:end], similarity.indices[start:end]
+        best = np.argsort(-scores, kind='stable')[:top_n]
+        neighbours[columns[row]] = [(columns[indices[i]], float(scores[i])) for i in best]
+    return neighbours
+
+
+def store_neighbours(product_ids, neighbours):
+    """以計算結果取代這些商品原本的相關商品"""
+    rows = [
+        RelatedProduct(product_id=pk, related_id=related_id, score=score, rank=rank)
+        for pk, items in neighbours.items()
+        for rank, (related_id, score) in enumerate(items, start=1)
+    ]
+    with transaction.atomic():
+        existing = RelatedProduct.objects.all()
+        if product_ids is not None:
+            existing = existing.filter(product_id__in=product_ids)
+        changed = set(neighbours) | set(existing.values_list('product_id', flat=True).distinct())
+        existing.delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+        expire_product_pages(changed, listings=False)
+    return len(rows)
+
+
+def build_related_products(full=False, top_n=TOP_N):
+    """
+    更新相關商品並寫入計算紀錄。
+    增量模式只重算上次計算後有新訂單或新收藏的商品；取消訂單或移除收藏只在完整重建時反映，
+    因此建議每日執行一次完整重建。
+    """
+    last_build = None if full else RelatedProductBuild.objects.first()
+    watermarks = {
+        'last_order_id': Order.objects.aggregate(last=Max('id'))['last'] or 0,
+        'last_favorite_id': Favorite.objects.aggregate(last=Max('id'))['last'] or 0,
+    }
+
+    if last_build is None:
+        product_ids = None
+    else:
+        product_ids = set(
+            OrderItem.objects.filter(
+                order_id__gt=last_build.last_order_id, order_id__lte=watermarks['last_order_id']
+            ).values_list('product_id', flat=True)
+        ) | set(
+            Favorite.objects.filter(
+                id__gt=last_build.last_favorite_id, id__lte=watermarks['last_favorite_id']
+            ).values_list('product_id', flat=True)
+        )
+
+    if product_ids is None or product_ids:
+        neighbours = compute_neighbours(None if product_ids is None else list(product_ids), top_n=top_n)
+        store_neighbours(product_ids, neighbours)
+        updated = len(neighbours) if product_ids is None else len(product_ids)
+    else:
+        updated = 0
+
+    return RelatedProductBuild.objects.create(is_full=last_build is None, products_updated=updated, **watermarks)
+
+
+def get_related_products(product, limit=4):
+    """讀取預先計算的相關商品；尚無計算結果時退回同分類的商品"""
+    neighbours = (
+        RelatedProduct.objects.filter(product=product, related__status='active')
+        .select_related('related').order_by('rank')[:limit]
+    )
+    products = [neighbour.related for neighbour in neighbours]
+    if products:
+        return products
+    return list(
+        Product.objects.filter(category=product.category, status='active')
+        .exclude(pk=product.pk)[:limit]
+    )
@@ -0,0 +1,244 @@
+"""
+庫存保留
+進入結帳時為購物車商品建立有期限的保留，可售庫存 = 庫存 - 尚未到期的保留量。
+只有建立保留與付款確認時短暫鎖定商品列，下單過程不再長時間持有熱門商品的列鎖；
+未付款的保留到期後自動失效，背景清理執行緒再將其標記為釋放並取消逾時訂單
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .coupons import void_redemptions
+from .models import Notification, Order, Product, StockReservation
+from .notifications import bulk_create_notifications
+from .page_cache import expire_product_pages
+from .stock_alerts import record_sales
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationError(Exception):
+    """庫存保留或確認失敗，訊息可直接顯示給使用者"""
+
+
+class InsufficientStock(ReservationError):
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f"{'、'.join(product.name for product in products)} 庫存不足")
+
+
+class OrderNotPayable(ReservationError):
+    """訂單已不是待付款狀態（例如逾時被取消）"""
+
+
+def hold_ttl():
+    """進入結帳時的保留秒數"""
+    return getattr(settings, 'STOCK_HOLD_TTL', 600)
+
+
+def payment_hold_ttl():
+    """下單後等待付款的保留秒數"""
+    return getattr(settings, 'STOCK_PAYMENT_HOLD_TTL', 1800)
+
+
+def live_holds():
+    return StockReservation.objects.filter(status='held', expires_at__gt=timezone.now())
+
+
+def held_quantities(product_ids, exclude=None):
+    """各商品尚未到期的保留量；exclude 為要排除的保留條件（例如自己的保留）"""
+    holds = live_holds().filter(product__in=product_ids)
+    if exclude is not None:
+        holds = holds.exclude(exclude)
+    return dict(holds.values_list('product_id').annotate(total=Sum('quantity')))
+
+
+def available_stock(product_ids, user=None):
+    """
+    各商品的可售庫存（單一查詢，保留量以相關子查詢加總）。
+    指定 user 時不扣除該使用者進入結帳時的保留，讓使用者仍可調整自己的購物車
+    """
+    holds = live_holds().filter(product=OuterRef('pk'))
+    if user is not None:
+        holds = holds.exclude(_unattached(user))
+    held = holds.values('product').annotate(total=Sum('quantity')).values('total')
+    return dict(
+        Product.objects.filter(pk__in=product_ids)
+        .annotate(available=F('stock') - Coalesce(Subquery(held), 0))
+        .values_list('pk', 'available')
+    )
+
+
+def _lock_and_check(quantities, exclude):
+    """依主鍵順序鎖定商品列（避免死結），確認扣除他人保留後仍足夠，回傳鎖定的商品"""
+    products = list(Product.objects.select_for_update().filter(pk__in=quantities).order_by('pk').only('name', 'stock'))
+    held = held_quantities(quantities, exclude=exclude)
+    short = [product for product in products if product.stock - held.get(product.pk, 0) < quantities[product.pk]]
+    if short or len(products) != len(quantities):
+        raise InsufficientStock(short)
+    return products
+
+
+def _unattached(user):
+    """使用者進入結帳時建立、尚未對應訂單的保留"""
+    return Q(user=user, order__isnull=True)
+
+
+def hold_stock(user, quantities, ttl=None, order=None):
+    """
+    為 {商品 ID: 數量} 建立保留，取代使用者先前尚未對應訂單的保留，回傳到期時間。
+    可售數量不足時拋出 InsufficientStock。
+    """
+    if not quantities:
+        return None
+    expires_at = timezone.now() + timedelta(seconds=ttl or hold_ttl())
+    with transaction.atomic():
+        _lock_and_check(quantities, exclude=_unattached(user))
+        StockReservation.objects.filter(_unattached(user), status='held').delete()
+        StockReservation.objects.bulk_create([
+            StockReservation(product_id=pk, user=user, order=order, quantity=quantity, expires_at=expires_at)
+            for pk, quantity in quantities.items()
+        ])
+        expire_product_pages(quantities, listings=False)
+    sweeper.ensure_started()
+    return expires_at
+
+
+def attach_holds(user, quantities, order):
+    """
+    將使用者尚未到期的結帳保留轉給訂單並延長到付款期限，不需鎖定商品列。
+    保留與訂單數量不一致（購物車已變動或保留已到期）時回傳 False，由呼叫端改以 hold_stock 重新保留。
+    """
+    holds = live_holds().filter(_unattached(user))
+    held = dict(holds.values_list('product_id').annotate(total=Sum('quantity')))
+    if held != quantities:
+        return False
+    expires_at = timezone.now() + timedelta(seconds=payment_hold_ttl())
+    holds.update(order=order, expires_at=expires_at)
+    return True
+
+
+def decrement_stock(quantities):
+    """
+    以單一 UPDATE 扣除多項商品庫存：
+    UPDATE product SET stock = stock - CASE id ... END WHERE id IN (...) AND stock >= CASE id ... END
+    任一商品庫存不足時拋出 InsufficientStock（呼叫端的交易負責回滾）。
+    """
+    def per_product():
+        return Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+            output_field=IntegerField(),
+        )
+
+    if not quantities:
+        return
+    updated = Product.objects.filter(pk__in=quantities, stock__gte=per_product()).update(
+        stock=F('stock') - per_product()
+    )
+    if updated != len(quantities):
+        short = [
+            product for product in Product.objects.filter(pk__in=quantities).only('name', 'stock')
+            if product.stock < quantities[product.pk]
+        ]
+        raise InsufficientStock(short)
+
+
+def confirm_order(order):
+    """
+    付款時確認訂單：扣除庫存、將保留標記為已確認，並把訂單由待付款改為已付款。
+    保留已到期時只要可售數量仍足夠也能確認；庫存不足或訂單已被取消時拋出 ReservationError 並回滾。
+    """
+    quantities = dict(order.items.values_list('product_id').annotate(total=Sum('quantity')))
+    with transaction.atomic():
+        products = _lock_and_check(quantities, exclude=Q(order=order))
+        decrement_stock(quantities)
+        StockReservation.objects.filter(order=order, status='held').update(status='confirmed')
+        if not Order.objects.filter(pk=order.pk, status='pending').update(status='paid', updated_at=timezone.now()):
+            raise OrderNotPayable(f'訂單 {order.order_number} 已無法付款')
+        order.status = 'paid'
+        sold_out = list(Product.objects.filter(pk__in=quantities, stock=0).values_list('pk', flat=True))
+        expire_product_pages(quantities, listings=False)
+        if sold_out:
+            expire_product_pages(sold_out)
+        # 通知記錄失敗不影響已提交的付款（robust：例外只記錄於日誌）
+        transaction.on_commit(lambda: record_sales(products, quantities), robust=True)
+
+
+def release_order_holds(order):
+    """訂單取消時立即釋放其尚未確認的保留，不等保留到期；回傳釋放的保留數"""
+    holds = StockReservation.objects.filter(order=order, status='held')
+    product_ids = set(holds.values_list('product_id', flat=True))
+    released = holds.update(status='released')
+    if product_ids:
+        expire_product_pages(product_ids, listings=False)
+    return released
+
+
+def release_expired_holds():
+    """
+    將到期的保留標記為釋放，並取消保留已全部到期的待付款訂單。
+    回傳 (釋放的保留數, 取消的訂單數)。
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        expired = StockReservation.objects.filter(status='held', expires_at__lte=now)
+        product_ids = set(expired.values_list('product_id', flat=True))
+        order_ids = set(expired.exclude(order=None).values_list('order_id', flat=True))
+        released = expired.update(status='released')
+
+        # 仍有未到期保留的訂單（例如剛重新保留）不取消
+        order_ids -= set(live_holds().filter(order__in=order_ids).values_list('order_id', flat=True))
+        pending = list(Order.objects.filter(pk__in=order_ids, status='pending').values_list('pk', flat=True))
+        cancelled = Order.objects.filter(pk__in=pending, status='pending').update(status='cancelled', updated_at=now)
+        void_redemptions(pending)
+        orders = Order.objects.filter(pk__in=pending, status='cancelled', updated_at=now).only('user_id', 'order_number')
+        bulk_create_notifications(
+            Notification(
+                user_id=order.user_id,
+                type='order',
+                title='訂單已取消',
+                message=f'您的訂單 {order.order_number} 逾時未付款，已自動取消'
+            )
+            for order in orders
+        )
+        if product_ids:
+            expire_product_pages(product_ids, listings=False)
+    return released, cancelled
+
+
+class HoldSweeper:
+    """背景清理到期保留的執行緒，於第一次建立保留時啟動"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def ensure_started(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='stock-hold-sweeper', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        interval = getattr(settings, 'STOCK_HOLD_SWEEP_INTERVAL', 60)
+        while True:
+            time.sleep(interval)
+            try:
+                release_expired_holds()
+            except Exception:
+                logger.exception('釋放到期庫存保留失敗')
+            finally:
+                connections.close_all()
+
+
+sweeper = HoldSweeper()
+
@@ -0,0 +1,182 @@
+"""
+商品全文搜尋
+以 CJK 二元切詞（bigram）建立倒排索引：
+SQLite 使用 FTS5 外部內容表，PostgreSQL 使用 tsvector GIN 索引
+"""
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Product, ProductSearchDocument
+
+FTS_TABLE = 'database_productsearch_fts'
+DOCUMENT_TABLE = 'database_productsearchdocument'
+
+# 每次搜尋最多取回的排序結果數量
+SEARCH_RESULT_LIMIT = 1000
+
+# 名稱權重高於描述
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# 平假名、片假名、中日韓統一表意文字（含擴充 A 與相容字）、韓文音節
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_CJK_RE = re.compile(f'[{_CJK}]')
+_TOKEN_RE = re.compile(f'[{_CJK}]+|(?:(?![{_CJK}])[^\\W_])+')
+
+_PG_VECTOR = (
+    "setweight(to_tsvector('simple', name_tokens), 'A') || "
+    "setweight(to_tsvector('simple', description_tokens), 'B')"
+)
+
+
+def _normalize(text):
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def tokenize(text):
+    """切詞：CJK 連續字元切為重疊二元詞並保留末字，其他文字以單字為詞"""
+    tokens = []
+    for run in _TOKEN_RE.findall(_normalize(text)):
+        if _is_cjk(run[0]):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _is_cjk(char):
+    return bool(_CJK_RE.match(char))
+
+
+def _query_terms(query):
+    """將查詢切為 (詞元, 是否前綴比對) 的清單"""
+    terms = []
+    for run in _TOKEN_RE.findall(_normalize(query)):
+        if _is_cjk(run[0]):
+            if len(run) == 1:
+                # 單一 CJK 字元以前綴比對所有以此字開頭的二元詞
+                terms.append((run, True))
+            else:
+                terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+        else:
+            # 非 CJK 的詞以前綴比對，例如 iphone 可找到 iphone15
+            terms.append((run, True))
+    return terms
+
+
+_fts_available = {}
+
+
+def search_backend():
+    """目前資料庫可用的全文索引類型，不支援時回傳 None"""
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor != 'sqlite':
+        return None
+    database_name = str(connection.settings_dict['NAME'])
+    if not _fts_available.get(database_name):
+        # 僅快取「已建立」的結果，遷移完成後不需重新啟動即可生效
+        _fts_available[database_name] = FTS_TABLE in connection.introspection.table_names()
+    return 'sqlite' if _fts_available[database_name] else None
+
+
+def build_document(product):
+    return ProductSearchDocument(
+        product_id=product.pk,
+        name_tokens=' '.join(tokenize(product.name)),
+        description_tokens=' '.join(tokenize(product.description)),
+    )
+
+
+def index_product(product):
+    """新增或更新單一商品的搜尋文件"""
+    document = build_document(product)
+    ProductSearchDocument.objects.update_or_create(
+        product_id=product.pk,
+        defaults={
+            'name_tokens': document.name_tokens,
+            'description_tokens': document.description_tokens,
+        },
+    )
+
+
+def rebuild_index(chunk_size=500, stdout=None):
+    """分批重建所有商品的搜尋文件，回傳處理筆數"""
+    total = 0
+    last_pk = 0
+    while True:
+        chunk = list(
+            Product.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'name', 'description')[:chunk_size]
+        )
+        if not chunk:
+            break
+        with transaction.atomic():
+            pks = [product.pk for product in chunk]
+            ProductSearchDocument.objects.filter(product_id__in=pks).delete()
+            ProductSearchDocument.objects.bulk_create([build_document(product) for product in chunk])
+        last_pk = pks[-1]
+        total += len(chunk)
+        if stdout:
+            stdout.write(f'已索引 {total} 項商品')
+
+    if search_backend() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def ranked_product_ids(query, limit=SEARCH_RESULT_LIMIT):
+    """依相關度排序的商品 ID；無法使用全文索引時回傳 None"""
+    backend = search_backend()
+    if backend is None:
+        return None
+    terms = _query_terms(query)
+    if not terms:
+        return []
+
+    if backend == 'sqlite':
+        match = ' AND '.join(f'"{term}"' + ('*' if prefix else '') for term, prefix in terms)
+        sql = (
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}) LIMIT %s'
+        )
+    else:
+        match = ' & '.join(term + (':*' if prefix else '') for term, prefix in terms)
+        sql = (
+            f"SELECT product_id FROM {DOCUMENT_TABLE} "
+            f"WHERE ({_PG_VECTOR}) @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank({_PG_VECTOR}, to_tsquery('simple', %s)) DESC LIMIT %s"
+        )
+    params = [match, limit] if backend == 'sqlite' else [match, match, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_products(queryset, query, order_by_rank=True):
+    """
+    以全文索引過濾商品查詢集，必要時依相關度排序。
+    依相關度排序時一律帶有 search_rank（無結果或無法使用全文索引時為 0），呼叫端可直接以其分頁
+    """
+    product_ids = ranked_product_ids(query)
+    if product_ids is None:
+        queryset = queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+    else:
+        queryset = queryset.filter(pk__in=product_ids)
+    if not order_by_rank:
+        return queryset
+
+    if product_ids:
+        rank = Case(
+            *[When(pk=pk, then=position) for position, pk in enumerate(product_ids)],
+            output_field=IntegerField(),
+        )
+    else:
+        rank = Value(0, output_field=IntegerField())
+    return queryset.annotate(search_rank=rank).order_by('search_rank')
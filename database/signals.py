@@ -1,38 +1,148 @@
 """
 資料庫信號處理器
-用於自動追蹤商品價格變動
+用於自動追蹤商品價格、庫存與狀態變動、維護評分彙總與搜尋索引、分類樹、頁面與優惠券快取失效、產生圖片變體
 """
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Product, ProductPriceHistory, ProductTracking, Notification
+from .models import (
+    Category, Coupon, Product, ProductPriceHistory, ProductReview, ProductQuestion
+)
+from .categories import invalidate_category_tree
+from .coupons import invalidate_coupon
+from .images import IMAGE_FIELDS, schedule_variants
+from .notifications import enqueue, fan_out_price_change
+from .page_cache import expire_product_pages
+from .ratings import apply_rating_delta, refresh_rating_aggregates
+from .search import index_product
+from .stock_alerts import record_product_change
+
+SEARCH_FIELDS = {'name', 'description'}
+ALERT_FIELDS = {'stock', 'status'}
+
+
+@receiver(pre_save, sender=Product)
+def track_price_change(sender, instance, update_fields=None, **kwargs):
+    """
+    追蹤商品價格變動：與載入時的價格比較（不需另外查詢），變動時記錄價格歷史，
+    並在交易提交後由背景工作通知追蹤此商品的顧客
+    """
+    if not instance.pk or (update_fields is not None and 'price' not in update_fields):
+        return
+    if hasattr(instance, '_loaded_price'):
+        old_price = instance._loaded_price
+    else:
+        # 未經資料庫載入（例如手動指定主鍵）時才查詢原價格
+        old_price = Product.objects.filter(pk=instance.pk).values_list('price', flat=True).first()
+    if old_price is None or old_price == instance.price:
+        return
+
+    ProductPriceHistory.objects.create(product=instance, price=instance.price)
+    enqueue(fan_out_price_change, instance.pk, instance.name, instance.price)
+    instance._loaded_price = instance.price
 
 
 @receiver(pre_save, sender=Product)
-def track_price_change(sender, instance, **kwargs):
-    """追蹤商品價格變動"""
-    if instance.pk:  # 更新現有商品
-        try:
-            old_product = Product.objects.get(pk=instance.pk)
-            if old_product.price != instance.price:
-                # 記錄價格歷史
-                ProductPriceHistory.objects.create(
-                    product=instance,
-                    price=instance.price
-                )
-                
-                # 通知追蹤此商品的顧客
-                trackings = ProductTracking.objects.filter(
-                    product=instance,
-                    track_price=True
-                )
-                
-                for tracking in trackings:
-                    Notification.objects.create(
-                        user=tracking.user,
-                        type='promotion',
-                        title='商品價格變動',
-                        message=f'您追蹤的商品 {instance.name} 價格已變動為 NT$ {instance.price}'
-                    )
-        except Product.DoesNotExist:
-            pass
+def track_stock_and_status_change(sender, instance, update_fields=None, **kwargs):
+    """庫存或狀態變動時於交易提交後記錄，由 stock_alerts 合併後通知追蹤者"""
+    if not instance.pk or (update_fields is not None and not ALERT_FIELDS & set(update_fields)):
+        return
+    if hasattr(instance, '_loaded_stock'):
+        old_stock, old_status = instance._loaded_stock, instance._loaded_status
+    else:
+        loaded = Product.objects.filter(pk=instance.pk).values_list('stock', 'status').first()
+        old_stock, old_status = loaded or (None, None)
+    stock = (old_stock, instance.stock) if old_stock is not None and old_stock != instance.stock else None
+    status = (old_status, instance.status) if old_status is not None and old_status != instance.status else None
+    if stock or status:
+        pk = instance.pk
+        transaction.on_commit(lambda: record_product_change(pk, stock=stock, status=status), robust=True)
+    instance._loaded_stock, instance._loaded_status = instance.stock, instance.status
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, created, update_fields=None, **kwargs):
+    """商品名稱或描述變動時更新搜尋文件"""
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    current = (instance.name, instance.description)
+    if created or getattr(instance, '_loaded_search_fields', None) != current:
+        index_product(instance)
+        instance._loaded_search_fields = current
+
+
+@receiver(post_save, sender=ProductReview)
+def update_rating_on_review_save(sender, instance, created, **kwargs):
+    """評價新增或修改時更新商品評分彙總"""
+    old_product_id, old_rating = getattr(instance, '_loaded_rating', (None, None))
+    if created:
+        apply_rating_delta(instance.product_id, new_rating=instance.rating)
+    elif old_product_id is None or old_rating is None:
+        # 非由資料庫載入、或載入時延遲了 product／rating 欄位的實例無法得知舊評分，改為重新計算
+        refresh_rating_aggregates({old_product_id, instance.product_id} - {None})
+    elif old_product_id != instance.product_id:
+        apply_rating_delta(old_product_id, old_rating=old_rating)
+        apply_rating_delta(instance.product_id, new_rating=instance.rating)
+    else:
+        apply_rating_delta(instance.product_id, old_rating=old_rating, new_rating=instance.rating)
+    instance._loaded_rating = (instance.product_id, instance.rating)
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_rating_on_review_delete(sender, instance, **kwargs):
+    """評價刪除時扣除商品評分彙總"""
+    if hasattr(instance, '_loaded_rating'):
+        product_id, rating = instance._loaded_rating
+    else:
+        product_id, rating = instance.product_id, instance.rating
+    if product_id is not None and rating is None:
+        # 載入時延遲了 rating 欄位，評價已刪除，由剩餘評價重新計算
+        refresh_rating_aggregates([product_id])
+    else:
+        apply_rating_delta(product_id, old_rating=rating)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def expire_category_tree(sender, **kwargs):
+    """分類異動提交後讓分類樹快取失效"""
+    transaction.on_commit(invalidate_category_tree)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def expire_product_page_cache(sender, instance, **kwargs):
+    """商品新增、修改或刪除後讓商品頁與所屬分類列表的快取失效（含換分類前的舊分類）"""
+    category_ids = {instance.category_id, getattr(instance, '_loaded_category_id', None)}
+    expire_product_pages([instance.pk], category_ids)
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def expire_review_page_cache(sender, instance, **kwargs):
+    """評價異動會改變商品評分，商品頁與列表都需失效"""
+    expire_product_pages([instance.product_id])
+
+
+@receiver(post_save, sender=ProductQuestion)
+@receiver(post_delete, sender=ProductQuestion)
+def expire_question_page_cache(sender, instance, **kwargs):
+    """問答只顯示在商品詳情頁"""
+    expire_product_pages([instance.product_id], listings=False)
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def expire_coupon_cache(sender, instance, **kwargs):
+    """優惠券異動提交後讓快取失效"""
+    transaction.on_commit(lambda: invalidate_coupon(instance.code))
+
+
+def generate_image_variants(sender, instance, **kwargs):
+    """圖片上傳後在背景產生縮圖與 WebP 變體"""
+    schedule_variants(getattr(instance, IMAGE_FIELDS[sender._meta.label]).name)
+
 
+for label in IMAGE_FIELDS:
+    post_save.connect(generate_image_variants, sender=label, dispatch_uid=f'image_variants:{label}')
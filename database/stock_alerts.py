@@ -0,0 +1,144 @@
+"""
+庫存與狀態變動通知
+變動時在資料表 PendingProductChange 中記錄每項商品視窗開始時與最新的庫存、狀態（所有行程共用同一個視窗），
+視窗（STOCK_ALERT_WINDOW 秒）結束後才依淨變化判斷事件（補貨、庫存偏低、售完、狀態變更）並通知追蹤者。
+搶購期間庫存反覆跳動會合併為一次結果，每位追蹤者每項商品每個視窗最多收到一則通知。
+視窗由網站行程的背景執行緒或 flush_stock_alerts 命令發送，多個行程同時發送時以版本號認領，不會重複通知
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import PendingProductChange, Product
+from .notifications import fan_out_product_change
+
+logger = logging.getLogger(__name__)
+
+
+def alert_window():
+    return getattr(settings, 'STOCK_ALERT_WINDOW', 300)
+
+
+def low_stock_threshold():
+    return getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
+
+
+def describe_stock(before, after, threshold):
+    """庫存淨變化對應的通知內容，無需通知時回傳 None"""
+    if before <= 0 < after:
+        return f'已補貨，目前庫存 {after} 件'
+    if before > 0 >= after:
+        return '已售完'
+    if before > threshold >= after:
+        return f'庫存僅剩 {after} 件'
+    return None
+
+
+def describe_status(before, after):
+    if before == after:
+        return None
+    return f'狀態已變更為「{dict(Product.STATUS_CHOICES).get(after, after)}」'
+
+
+def record_product_change(product_id, stock=None, status=None):
+    """
+    記錄商品庫存／狀態變動，stock／status 為 (變動前, 變動後)，未變動的欄位傳 None。
+    視窗已開啟時只更新最新值（保留視窗開始時的值），否則開啟新視窗；呼叫端應在交易提交後呼叫
+    """
+    fields = {}
+    if stock is not None:
+        fields['stock_before'], fields['stock_after'] = stock
+    if status is not None:
+        fields['status_before'], fields['status_after'] = status
+    updates = {
+        name: Coalesce(name, Value(value)) if name.endswith('_before') else value
+        for name, value in fields.items()
+    }
+    updates['version'] = F('version') + 1
+
+    pending = PendingProductChange.objects.filter(product_id=product_id)
+    if not pending.update(**updates):
+        try:
+            with transaction.atomic():
+                PendingProductChange.objects.create(product_id=product_id, opened_at=timezone.now(), **fields)
+        except IntegrityError:
+            # 其他行程同時開啟了視窗，併入該視窗
+            pending.update(**updates)
+    sweeper.ensure_started()
+
+
+def record_sales(products, quantities):
+    """付款扣庫存後記錄變動，products 為扣除前鎖定並載入庫存的商品"""
+    for product in products:
+        record_product_change(product.pk, stock=(product.stock, product.stock - quantities[product.pk]))
+
+
+def flush_product_changes(force=False):
+    """通知視窗已結束的商品（force 時為全部），回傳發送的通知數"""
+    due = PendingProductChange.objects.select_related('product').only(
+        'opened_at', 'version', 'stock_before', 'stock_after', 'status_before', 'status_after', 'product__name',
+    )
+    if not force:
+        due = due.filter(opened_at__lte=timezone.now() - timedelta(seconds=alert_window()))
+
+    threshold = low_stock_threshold()
+    sent = 0
+    for change in list(due):
+        # 以讀取時的版本認領：期間又有變動或已被其他行程發送時刪除不到，留待下次依最新值發送
+        claimed, _ = PendingProductChange.objects.filter(
+            pk=change.pk, version=change.version, opened_at=change.opened_at
+        ).delete()
+        if not claimed:
+            continue
+        stock_message = (
+            describe_stock(change.stock_before, change.stock_after, threshold)
+            if change.stock_before is not None else None
+        )
+        status_message = (
+            describe_status(change.status_before, change.status_after)
+            if change.status_before is not None else None
+        )
+        if not (stock_message or status_message):
+            continue
+        try:
+            sent += fan_out_product_change(change.product_id, change.product.name, stock_message, status_message)
+        except Exception:
+            logger.exception('發送商品 %s 的庫存／狀態通知失敗', change.product_id)
+    return sent
+
+
+class StockAlertSweeper:
+    """定期發送已結束視窗的背景執行緒，於第一次記錄變動時啟動"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def ensure_started(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='stock-alert-sweeper', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        interval = getattr(settings, 'STOCK_ALERT_SWEEP_INTERVAL', 30)
+        while True:
+            time.sleep(interval)
+            try:
+                flush_product_changes()
+            except Exception:
+                logger.exception('發送庫存／狀態通知失敗')
+            finally:
+                connections.close_all()
+
+
+sweeper = StockAlertSweeper()
@@ -0,0 +1,45 @@
+"""
+圖片 srcset 模板標籤
+
+    {% load image_tags %}
+    {% responsive_image product.image sizes="(max-width: 768px) 100vw, 33vw" class="card-img-top" alt=product.name %}
+"""
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from database.images import srcset
+
+register = template.Library()
+
+
+@register.filter(name='srcset')
+def srcset_filter(fieldfile):
+    """原格式變體的 srcset"""
+    return srcset(fieldfile)
+
+
+@register.filter
+def webp_srcset(fieldfile):
+    """WebP 變體的 srcset"""
+    return srcset(fieldfile, webp=True)
+
+
+@register.simple_tag
+def responsive_image(fieldfile, sizes='100vw', **attrs):
+    """
+    輸出含 WebP 來源與 srcset 的 <picture>；變體尚未產生時輸出一般的 <img>。
+    <picture> 設為 display: contents，不影響原本針對 img 的版面樣式。
+    """
+    if not fieldfile:
+        return ''
+    fallback = srcset(fieldfile)
+    if not fallback:
+        return format_html('<img src="{}"{}>', fieldfile.url, flatatt(attrs))
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}>'
+        '</picture>',
+        srcset(fieldfile, webp=True), sizes, fieldfile.url, fallback, sizes, flatatt(attrs),
+    )
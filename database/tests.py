@@ -1,3 +1,536 @@
-from django.test import TestCase
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .ids import ORDER_PREFIX, IdGenerator, NodeExhausted, id_datetime, id_range, new_id
+from .images import generate_variants, srcset
+from .models import (
+    Category, CustomerProfile, Favorite, IdNode, Notification, Order, OrderItem, PendingProductChange, Product,
+    ProductPriceHistory, ProductReview, ProductTracking, RelatedProduct,
+)
+from .notifications import (
+    bulk_notify, delete_notifications, fan_out_price_change, mark_read, notify, repair_unread_counts, unread_count,
+)
+from .page_cache import bump_versions, get_versions, product_version_key
+from .pricing import CouponRule, Line, price_cart, price_carts
+from .recommendations import build_related_products, compute_neighbours, get_related_products
+from .search import search_products
+from .stock_alerts import flush_product_changes, record_product_change
+
+
+class IdGeneratorTests(TestCase):
+    """編號產生器：同一行程嚴格遞增、不同節點不重複、可依時間範圍查詢"""
+
+    @override_settings(ID_NODE=3)
+    def test_monotonic_across_threads_and_clock_skew(self):
+        # 固定節點：此測試只檢查遞增，各執行緒不應寫入節點租約
+        generator = IdGenerator()
+        values = []
+
+        def worker():
+            values.extend(generator.next_value() for _ in range(5000))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(values)), 20000)
+
+        # 時鐘倒退時仍遞增
+        last = generator.next_value()
+        with mock.patch('database.ids.time.time_ns', return_value=0):
+            self.assertGreater(generator.next_value(), last)
+
+    def test_nodes_are_allocated_per_process(self):
+        allocated = IdNode.objects.count()
+        first, second = IdGenerator(), IdGenerator()
+        self.assertNotEqual((first.next_value() >> 16) & 0xFFFF, (second.next_value() >> 16) & 0xFFFF)
+        self.assertEqual(IdNode.objects.count(), allocated + 2)
+        with override_settings(ID_NODE=7):
+            self.assertEqual((IdGenerator().next_value() >> 16) & 0xFFFF, 7)
+
+    def test_node_from_rolled_back_transaction_is_reallocated(self):
+        generator = IdGenerator()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            node = (generator.next_value() >> 16) & 0xFFFF
+            raise RuntimeError
+        # 回滾後同一節點配發給了其他行程
+        IdNode.objects.create(node=node, hostname='other', pid=1, renewed_at=timezone.now())
+        self.assertNotEqual((generator.next_value() >> 16) & 0xFFFF, node)
+
+    def test_expired_leases_are_reused_and_lost_leases_replaced(self):
+        stale = timezone.now() - timedelta(seconds=601)
+        IdNode.objects.bulk_create([
+            IdNode(node=0, hostname='dead', pid=1, renewed_at=stale),
+            IdNode(node=1, hostname='live', pid=2, renewed_at=timezone.now()),
+        ])
+        generator = IdGenerator()
+        self.assertEqual((generator.next_value() >> 16) & 0xFFFF, 0)
+        self.assertFalse(IdNode.objects.filter(hostname='dead').exists())
+
+        # 行程暫停過久，節點已轉給其他行程：續約失敗時改租其他節點
+        IdNode.objects.filter(node=0).update(hostname='other', pid=3)
+        generator._renew_at = 0
+        self.assertEqual((generator.next_value() >> 16) & 0xFFFF, 2)
+
+    def test_exhausted_nodes_fail_loudly(self):
+        IdNode.objects.bulk_create([
+            IdNode(node=node, hostname='live', pid=node, renewed_at=timezone.now()) for node in range(2)
+        ])
+        with mock.patch('database.ids.MAX_NODES', 2), self.assertRaises(NodeExhausted):
+            IdGenerator().next_value()
+
+    def test_time_range(self):
+        now = timezone.now()
+        value = new_id(ORDER_PREFIX)
+        low, high = id_range(ORDER_PREFIX, now - timedelta(seconds=1), now + timedelta(seconds=1))
+        self.assertTrue(low <= value < high)
+        self.assertLess(abs(id_datetime(value, ORDER_PREFIX) - now), timedelta(seconds=1))
+        self.assertEqual(len(value), len(ORDER_PREFIX) + 16)
+
+
+class PricingTests(TestCase):
+    """定價模組：逐一與批次計算結果一致，折扣四捨五入到分且不超過小計"""
+
+    carts = [
+        [Line(Decimal('19.99'), 3)],
+        [Line(Decimal('100'), 1), Line(Decimal('0.05'), 7)],
+        [Line(Decimal('5'), 1)],
+    ]
+
+    def test_percentage_rule(self):
+        rule = CouponRule(percentage=True, value=1250, min_purchase=1000, max_discount=1000)
+        quotes = [price_cart(lines, rule) for lines in self.carts]
+        self.assertEqual(quotes[0].discount, Decimal('7.50'))   # 59.97 × 12.5% = 7.49625
+        self.assertEqual(quotes[1].discount, Decimal('10.00'))  # 上限 10 元
+        self.assertEqual(quotes[2].coupon_error, '未達最低消費 10.00 元')
+        subtotal, discount, total = price_carts(self.carts, rule)
+        self.assertEqual(list(total), [int(quote.total * 100) for quote in quotes])
+
+    def test_fixed_discount_never_exceeds_subtotal(self):
+        rule = CouponRule(percentage=False, value=5000)
+        self.assertEqual(price_cart(self.carts[2], rule).total, Decimal('0.00'))
+        self.assertEqual(list(price_carts(self.carts, rule)[2]), [997, 5035, 0])
+
+
+class _InlineExecutor:
+    def submit(self, func, *args):
+        func(*args)
+
+
+class PriceChangeNotificationTests(TestCase):
+    """改價：以載入時的價格判斷（不另外查詢），提交後分批通知追蹤者"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='商品', description='', price=100, stock=5)
+        users = User.objects.bulk_create([User(username=f'tracker{i}') for i in range(25)])
+        ProductTracking.objects.bulk_create([ProductTracking(user=user, product=self.product) for user in users])
+        ProductTracking.objects.filter(user=users[0]).update(track_price=False)
+
+    def test_price_change_is_fanned_out_after_commit(self):
+        product = Product.objects.get(pk=self.product.pk)
+        with mock.patch('database.notifications._executor_instance', return_value=_InlineExecutor()):
+            with self.captureOnCommitCallbacks(execute=True):
+                with CaptureQueriesContext(connection) as queries:
+                    product.stock = 4
+                    product.save()
+                self.assertFalse([query for query in queries if 'price' in query['sql'] and query['sql'].startswith('SELECT')])
+            self.assertFalse(ProductPriceHistory.objects.exists())
+
+            with self.captureOnCommitCallbacks(execute=True):
+                product.price = 80
+                product.save()
+        self.assertEqual(ProductPriceHistory.objects.get().price, 80)
+        self.assertEqual(Notification.objects.filter(title='商品價格變動').count(), 24)
+
+    def test_fan_out_in_batches(self):
+        with mock.patch('database.notifications.FANOUT_BATCH_SIZE', 10):
+            with CaptureQueriesContext(connection) as queries:
+                sent = fan_out_price_change(self.product.pk, self.product.name, 90)
+        self.assertEqual(sent, 24)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 3)
+
+
+class RatingAggregateTests(TestCase):
+    """評分彙總：評價新增、修改、移到其他商品與刪除時以差值更新，可由命令修復"""
+
+    def setUp(self):
+        self.products = [Product.objects.create(name=f'商品{i}', description='', price=100) for i in range(2)]
+        self.users = User.objects.bulk_create([User(username=f'reviewer{i}') for i in range(2)])
+
+    def assertAggregates(self, product, count, total, stars):
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_sum), (count, total))
+        self.assertEqual(product.rating_histogram, stars)
+        self.assertAlmostEqual(product.rating_average, total / count if count else 0)
+
+    def test_create_update_move_and_delete(self):
+        first, second = self.products
+        review = ProductReview.objects.create(product=first, user=self.users[0], rating=5, comment='')
+        ProductReview.objects.create(product=first, user=self.users[1], rating=3, comment='')
+        self.assertAggregates(first, 2, 8, {5: 1, 4: 0, 3: 1, 2: 0, 1: 0})
+
+        review = ProductReview.objects.get(pk=review.pk)
+        review.rating = 4
+        review.save()
+        self.assertAggregates(first, 2, 7, {5: 0, 4: 1, 3: 1, 2: 0, 1: 0})
+
+        review.product = second
+        review.save()
+        self.assertAggregates(first, 1, 3, {5: 0, 4: 0, 3: 1, 2: 0, 1: 0})
+        self.assertAggregates(second, 1, 4, {5: 0, 4: 1, 3: 0, 2: 0, 1: 0})
+
+        review.delete()
+        self.assertAggregates(second, 0, 0, {5: 0, 4: 0, 3: 0, 2: 0, 1: 0})
+
+    def test_deferred_rating_is_not_counted_as_new_review(self):
+        product = self.products[0]
+        review = ProductReview.objects.create(product=product, user=self.users[0], rating=4, comment='')
+        deferred = ProductReview.objects.only('id', 'product').get(pk=review.pk)
+        deferred.comment = '更新'
+        deferred.save()
+        self.assertAggregates(product, 1, 4, {5: 0, 4: 1, 3: 0, 2: 0, 1: 0})
+        ProductReview.objects.only('id', 'product').get(pk=review.pk).delete()
+        self.assertAggregates(product, 0, 0, {5: 0, 4: 0, 3: 0, 2: 0, 1: 0})
+
+    def test_rebuild_command_repairs_drift(self):
+        product = self.products[0]
+        ProductReview.objects.create(product=product, user=self.users[0], rating=2, comment='')
+        Product.objects.filter(pk=product.pk).update(rating_count=7, rating_sum=1, rating_2_count=0)
+        out = StringIO()
+        call_command('rebuild_rating_aggregates', stdout=out)
+        self.assertIn('修正 1 項商品', out.getvalue())
+        self.assertAggregates(product, 1, 2, {5: 0, 4: 0, 3: 0, 2: 1, 1: 0})
+
+
+class StockAlertTests(TestCase):
+    """庫存／狀態變動：視窗內的反覆變動依淨變化合併，每位追蹤者每項商品每個視窗一則通知"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='商品', description='', price=100, stock=0)
+        users = User.objects.bulk_create([User(username=f'tracker{i}') for i in range(3)])
+        ProductTracking.objects.bulk_create([ProductTracking(user=user, product=self.product) for user in users])
+        ProductTracking.objects.filter(user=users[1]).update(track_stock=False)
+        ProductTracking.objects.filter(user=users[2]).update(track_stock=False, track_status=False)
+        patcher = mock.patch('database.stock_alerts.sweeper.ensure_started')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _at(self, moment):
+        return mock.patch('database.stock_alerts.timezone.now', return_value=moment)
+
+    @override_settings(STOCK_ALERT_WINDOW=300)
+    def test_flapping_is_coalesced_within_window(self):
+        opened = timezone.now()
+        with self._at(opened):
+            for before, after in [(0, 3), (3, 0), (0, 2), (2, 1)]:
+                record_product_change(self.product.pk, stock=(before, after))
+        with self._at(opened + timedelta(seconds=200)):
+            self.assertEqual(flush_product_changes(), 0)
+        with self._at(opened + timedelta(seconds=300)):
+            self.assertEqual(flush_product_changes(), 1)
+        self.assertEqual(Notification.objects.get().message, '您追蹤的商品 商品 已補貨，目前庫存 1 件')
+        self.assertFalse(PendingProductChange.objects.exists())
+
+    def test_window_is_shared_through_database(self):
+        record_product_change(self.product.pk, stock=(0, 3))
+        record_product_change(self.product.pk, status=('active', 'inactive'))
+        change = PendingProductChange.objects.get()
+        self.assertEqual(
+            (change.stock_before, change.stock_after, change.status_before, change.status_after, change.version),
+            (0, 3, 'active', 'inactive', 1),
+        )
+
+    def test_no_net_change_sends_nothing(self):
+        record_product_change(self.product.pk, stock=(5, 0))
+        record_product_change(self.product.pk, stock=(0, 5))
+        self.assertEqual(flush_product_changes(force=True), 0)
+        self.assertFalse(PendingProductChange.objects.exists())
+
+    def test_save_records_stock_and_status_after_commit(self):
+        product = Product.objects.get(pk=self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.stock, product.status = 10, 'inactive'
+            product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.stock = 3
+            product.save(update_fields=['stock'])
+        self.assertEqual(flush_product_changes(force=True), 2)
+        messages = dict(Notification.objects.values_list('user__username', 'message'))
+        self.assertEqual(messages, {
+            'tracker0': '您追蹤的商品 商品 已補貨，目前庫存 3 件；狀態已變更為「下架」',
+            'tracker1': '您追蹤的商品 商品 狀態已變更為「下架」',
+        })
+
+
+class NotificationDigestTests(TestCase):
+    """通知摘要：時間窗內同類型的未讀通知合併為一筆，已讀或逾時後另開新的一筆"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='buyer')
+
+    def test_same_type_is_folded_into_unread_digest(self):
+        for number in range(3):
+            notify(self.user, type='order', title='訂單已建立', message=f'訂單 {number}')
+        notify(self.user, type='payment', title='付款成功', message='付款')
+        digest = Notification.objects.get(type='order')
+        self.assertEqual((digest.count, digest.message), (3, '訂單 2'))
+        self.assertEqual([item['message'] for item in digest.payload], ['訂單 0', '訂單 1'])
+
+        Notification.objects.filter(pk=digest.pk).update(is_read=True)
+        notify(self.user, type='order', title='訂單已建立', message='訂單 3')
+        self.assertEqual(Notification.objects.filter(type='order').count(), 2)
+
+    @override_settings(NOTIFICATION_DIGEST_WINDOW=60)
+    def test_window_expiry_starts_new_digest(self):
+        notify(self.user, type='order', title='訂單', message='舊')
+        Notification.objects.update(created_at=timezone.now() - timedelta(seconds=120))
+        notify(self.user, type='order', title='訂單', message='新')
+        self.assertEqual(list(Notification.objects.values_list('count', flat=True)), [1, 1])
+
+    def test_fan_out_folds_with_one_lookup_per_batch(self):
+        users = User.objects.bulk_create([User(username=f'fan{i}') for i in range(10)])
+        notify(users[0], type='promotion', title='商品價格變動', message='A')
+        with CaptureQueriesContext(connection) as queries:
+            sent = bulk_notify([user.pk for user in users], 'promotion', '商品價格變動', 'B')
+        self.assertEqual(sent, 10)
+        self.assertEqual(Notification.objects.count(), 10)
+        self.assertEqual(Notification.objects.get(user=users[0]).count, 2)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('SELECT')]), 1)
+
+
+class UnreadCounterTests(TestCase):
+    """未讀數：新增、已讀、刪除時調整欄位並讓快取失效，偏差由校正工作修正"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='reader')
+
+    def test_counter_follows_create_read_and_delete(self):
+        self.assertEqual(unread_count(self.user), 0)
+        self.assertEqual(CustomerProfile.objects.get(user=self.user).unread_notifications, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.user, type='order', title='訂單', message='1')
+            notify(self.user, type='order', title='訂單', message='2')  # 併入未讀摘要，不增加
+            notify(self.user, type='payment', title='付款', message='3')
+        self.assertEqual(unread_count(self.user), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_read(self.user, Notification.objects.filter(type='order').values('pk')), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(unread_count(self.user), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_notifications(Notification.objects.all())
+        self.assertEqual(unread_count(self.user), 0)
+
+    def test_repair_fixes_drift(self):
+        unread_count(self.user)
+        notify(self.user, type='order', title='訂單', message='1')
+        Notification.objects.create(user=self.user, type='system', title='直接寫入', message='')
+        self.assertEqual(repair_unread_counts(), 1)
+        self.assertEqual(unread_count(self.user), 2)
+        self.assertEqual(repair_unread_counts(), 0)
+
+
+class SearchTests(TestCase):
+    """全文搜尋：CJK 以二元詞比對，其他文字以前綴比對"""
+
+    def setUp(self):
+        self.phone = Product.objects.create(name='iPhone15 蘋果手機', description='', price=100, stock=1)
+        Product.objects.create(name='安卓手機', description='', price=100, stock=1)
+
+    def test_word_prefix_and_cjk_bigram(self):
+        self.assertEqual(list(search_products(Product.objects.all(), 'iphone')), [self.phone])
+        self.assertEqual(list(search_products(Product.objects.all(), '蘋果')), [self.phone])
+        self.assertEqual(search_products(Product.objects.all(), 'zzz').count(), 0)
+
+
+class PageVersionTests(TestCase):
+    """頁面版本號：每次異動寫入新的唯一值，不依賴非原子的 incr"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bumps_in_same_instant_get_distinct_versions(self):
+        key = product_version_key(1)
+        seen = set(get_versions([key]))
+        with mock.patch('database.page_cache.time.time_ns', return_value=0):
+            for _ in range(20):
+                bump_versions([key])
+                seen.update(get_versions([key]))
+        self.assertEqual(len(seen), 21)
+
+
+class CategoryPathTests(TestCase):
+    """分類物化路徑：移動分類時以一次 UPDATE 改寫整個子樹的路徑與層級，不可移到自己的子孫之下"""
+
+    def setUp(self):
+        self.root = Category.objects.create(name='根')
+        self.other = Category.objects.create(name='其他')
+        self.child = Category.objects.create(name='子', parent=self.root)
+        self.grandchild = Category.objects.create(name='孫', parent=self.child)
+
+    def _path(self, *categories):
+        return ''.join(f'{category.pk:08d}/' for category in categories)
+
+    def assertTree(self, expected):
+        rows = dict(Category.objects.values_list('pk', 'path'))
+        depths = dict(Category.objects.values_list('pk', 'depth'))
+        for category, ancestors in expected.items():
+            self.assertEqual(rows[category.pk], self._path(*ancestors, category))
+            self.assertEqual(depths[category.pk], len(ancestors))
+
+    def test_move_subtree_under_other_parent_and_back_to_root(self):
+        self.assertTree({self.child: [self.root], self.grandchild: [self.root, self.child]})
+
+        child = Category.objects.get(pk=self.child.pk)
+        child.parent = self.other
+        with CaptureQueriesContext(connection) as queries:
+            child.save()
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 3)
+        self.assertTree({self.child: [self.other], self.grandchild: [self.other, self.child]})
+
+        child.parent = None
+        child.save()
+        self.assertTree({self.child: [], self.grandchild: [self.child]})
+        self.assertEqual(
+            list(Category.objects.get(pk=self.child.pk).get_descendants().order_by('depth')),
+            [self.child, self.grandchild],
+        )
+
+    def test_cannot_move_under_own_descendant(self):
+        root = Category.objects.get(pk=self.root.pk)
+        root.parent = self.grandchild
+        with self.assertRaises(ValidationError):
+            root.full_clean()
+        root.parent = self.other
+        root.full_clean()
+
+
+class RelatedProductTests(TestCase):
+    """相關商品：固定籃子的加權餘弦前 N 名、增量更新只重算有新訂單或收藏的商品、無結果時退回同分類"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='分類')
+        self.a, self.b, self.c, self.d = [
+            Product.objects.create(name=name, description='', price=100, category=self.category) for name in 'ABCD'
+        ]
+        self.buyer, self.fan = User.objects.bulk_create([User(username='buyer'), User(username='fan')])
+        # 訂單權重 1、收藏權重 0.5：出現次數 A=3.5、B=2、C=1、D=0.5
+        self._order(self.a, self.b)
+        self._order(self.a, self.b)
+        self._order(self.a, self.c)
+        self._order(self.b, self.c, self.d, status='cancelled')
+        Favorite.objects.bulk_create([Favorite(user=self.fan, product=self.a), Favorite(user=self.fan, product=self.d)])
+
+    def _order(self, *products, status='paid'):
+        order = Order.objects.create(
+            user=self.buyer, order_number=f'T{Order.objects.count()}', status=status,
+            total_amount=0, shipping_address='', shipping_phone='',
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=100, subtotal=100) for product in products
+        ])
+
+    def assertNeighbours(self, neighbours, product, expected):
+        self.assertEqual([pk for pk, _ in neighbours[product.pk]], [related.pk for related, _ in expected])
+        for (_, score), (_, value) in zip(neighbours[product.pk], expected):
+            self.assertAlmostEqual(score, value)
+
+    def test_weighted_cosine_top_n(self):
+        neighbours = compute_neighbours(top_n=2)
+        # sim(A, B) = 2 / √(3.5 × 2)，取消的訂單不計
+        self.assertNeighbours(neighbours, self.a, [(self.b, 2 / 7 ** 0.5), (self.c, 1 / 3.5 ** 0.5)])
+        self.assertNeighbours(neighbours, self.b, [(self.a, 2 / 7 ** 0.5)])
+        self.assertNeighbours(neighbours, self.d, [(self.a, 0.5 / 1.75 ** 0.5)])
+        self.assertEqual(compute_neighbours([self.d.pk]), {self.d.pk: neighbours[self.d.pk]})
+
+    def test_incremental_build_only_recomputes_new_baskets(self):
+        full = build_related_products()
+        self.assertTrue(full.is_full)
+        self.assertEqual(full.products_updated, 4)
+        before = list(RelatedProduct.objects.filter(product=self.a).values_list('related_id', 'score'))
+
+        self._order(self.c, self.d)
+        build = build_related_products()
+        self.assertFalse(build.is_full)
+        self.assertEqual(build.products_updated, 2)
+        self.assertEqual(list(RelatedProduct.objects.filter(product=self.a).values_list('related_id', 'score')), before)
+        # C 出現 2 次、D 出現 1.5 次，A 的出現次數另外查詢（3.5）
+        rows = RelatedProduct.objects.filter(product=self.c).order_by('rank').values_list('related_id', 'score')
+        self.assertEqual([pk for pk, _ in rows], [self.d.pk, self.a.pk])
+        self.assertAlmostEqual(rows[0][1], 1 / 3 ** 0.5)
+        self.assertAlmostEqual(rows[1][1], 1 / 7 ** 0.5)
+
+        self.assertEqual(build_related_products().products_updated, 0)
+
+    def test_get_related_products_falls_back_to_category(self):
+        build_related_products()
+        Product.objects.filter(pk=self.c.pk).update(status='inactive')
+        self.assertEqual(get_related_products(self.a), [self.b, self.d])
+        lonely = Product.objects.create(name='E', description='', price=100, category=self.category)
+        self.assertEqual(set(get_related_products(lonely)), {self.a, self.b, self.d})
+
+
+class ImageVariantTests(TestCase):
+    """圖片變體：只產生小於原圖的寬度加原尺寸 WebP，已存在的不重產，srcset 依變體組合"""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = FileSystemStorage(location=directory.name, base_url='/media/')
+        buffer = BytesIO()
+        Image.new('RGB', (500, 250), 'red').save(buffer, 'JPEG')
+        self.name = self.storage.save('products/a.jpg', ContentFile(buffer.getvalue()))
+        patcher = mock.patch.object(Product._meta.get_field('image'), 'storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_generate_variants(self):
+        self.assertEqual(srcset(Product(image=self.name).image), '')
+        cache.clear()
+
+        variants = generate_variants(self.name, self.storage)
+        self.assertEqual(variants, {'widths': [200, 400], 'width': 500, 'extension': 'jpg'})
+        self.assertEqual(
+            sorted(self.storage.listdir('products')[1]),
+            ['a.jpg', 'a.w200.jpg', 'a.w200.webp', 'a.w400.jpg', 'a.w400.webp', 'a.w500.webp'],
+        )
+        with self.storage.open('products/a.w200.webp') as file:
+            self.assertEqual(Image.open(file).size, (200, 100))
+
+        with mock.patch.object(self.storage, 'save') as save:
+            generate_variants(self.name, self.storage)
+        save.assert_not_called()
+
+    def test_srcset(self):
+        generate_variants(self.name, self.storage)
+        image = Product(image=self.name).image
+        expected = (
+            '/media/products/a.w200.jpg 200w, /media/products/a.w400.jpg 400w, /media/products/a.jpg 500w',
+            '/media/products/a.w200.webp 200w, /media/products/a.w400.webp 400w, /media/products/a.w500.webp 500w',
+        )
+        self.assertEqual((srcset(image), srcset(image, webp=True)), expected)
+        # 快取遺失時由儲存空間的檔案還原
+        cache.clear()
+        self.assertEqual((srcset(image), srcset(image, webp=True)), expected)
+        self.assertEqual(srcset(Product().image), '')
@@ -55,6 +55,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "customer.middleware.AnonymousCartMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -71,6 +72,9 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "database.context_processors.category_tree",
+                "customer.context_processors.cart_summary",
+                "customer.context_processors.unread_notifications",
             ],
         },
     },
@@ -90,6 +94,30 @@ DATABASES = {
 }
 
 
+# Cache
+# 頁面版本、分類樹、面向數量、購物車摘要、未讀通知數等快取的失效必須讓所有行程看到，
+# 因此使用跨行程共用的快取：預設為同一主機所有行程共用的檔案快取（SQLite 本身即限單一主機；
+# 不使用資料庫快取以免快取寫入與訂單交易爭用 SQLite 的寫入鎖），多主機部署時設定 REDIS_URL 改用 Redis
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+            # 預設上限 300 筆遠低於頁面、分面、購物車、未讀數、分頁總數與圖片變體的鍵數，
+            # 超過時每次寫入都會隨機刪除三分之一（含版本鍵）
+            "OPTIONS": {"MAX_ENTRIES": int(os.environ.get('CACHE_MAX_ENTRIES', 100000))},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -154,3 +182,42 @@ CKEDITOR_CONFIGS = {
 LOGOUT_REDIRECT_URL = '/'
 
 LOGIN_REDIRECT_URL = '/profile/'
+
+# 瀏覽次數寫回資料庫的間隔（秒）
+VIEW_COUNT_FLUSH_INTERVAL = 10
+
+# 匿名使用者商品頁面快取秒數（商品列表另以篩選面向的快取時間為上限）
+PAGE_CACHE_TIMEOUT = 600
+
+# 上傳圖片後產生縮圖與 WebP 變體的背景執行緒數
+IMAGE_VARIANT_WORKERS = 2
+
+# 庫存保留：進入結帳保留秒數、下單後等待付款的保留秒數、背景釋放到期保留的間隔（秒）
+STOCK_HOLD_TTL = 600
+STOCK_PAYMENT_HOLD_TTL = 1800
+STOCK_HOLD_SWEEP_INTERVAL = 60
+
+# 背景發送大量通知（例如改價通知所有追蹤者）的執行緒數
+NOTIFICATION_WORKERS = 1
+
+# 同一使用者同類型的未讀通知在這段時間（秒）內合併為一筆摘要，0 表示不合併
+NOTIFICATION_DIGEST_WINDOW = 3600
+
+# 庫存／狀態變動通知：合併變動的視窗秒數（每位追蹤者每項商品每個視窗最多一則），以及「庫存偏低」的門檻
+STOCK_ALERT_WINDOW = 300
+LOW_STOCK_THRESHOLD = 5
+# 背景執行緒檢查視窗是否結束的間隔（秒）；視窗狀態存於資料庫，也可由 flush_stock_alerts 命令發送
+STOCK_ALERT_SWEEP_INTERVAL = 30
+
+# 結帳與付款表單冪等鍵的保存秒數（到期後由 purge_idempotency_keys 清理）
+IDEMPOTENCY_KEY_TTL = 86400
+
+# 熱門商品入場控制：每項商品每秒放行人數、無人排隊時可瞬間放行的人數、放行後免排隊的秒數
+ADMISSION_RATE = 5
+ADMISSION_BURST = 20
+ADMISSION_PASS_TTL = 300
+
+# 訂單／交易／退款編號產生器的節點編號（0–65535）；未設定時每個行程自動向資料庫配發
+# ID_NODE = 1
+# 自動配發節點的租約秒數，使用中的行程每四分之一租約續約一次，到期的節點可再配發
+ID_NODE_LEASE = 600
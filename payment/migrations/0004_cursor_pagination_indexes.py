@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database", "0006_cursor_pagination_indexes"),
+        ("payment", "0003_paymentaccount"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="paymenttransaction",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="payment_pay_user_id_da5fd7_idx",
+            ),
+        ),
+    ]
@@ -51,6 +51,9 @@ class PaymentTransaction(models.Model):
         verbose_name = "支付交易"
         verbose_name_plural = "支付交易"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"交易 {self.transaction_id} - {self.amount}"
@@ -14,6 +14,7 @@ urlpatterns = [
     
     # 客服功能
     path('faq/', views.faq_list, name='faq_list'),
+    path('faq/<int:faq_id>/viewed/', views.faq_viewed, name='faq_viewed'),
     path('ticket/create/', views.create_ticket, name='create_ticket'),
     path('tickets/', views.ticket_list, name='ticket_list'),
     path('ticket/<int:ticket_id>/', views.ticket_detail, name='ticket_detail'),
@@ -5,11 +5,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction as db_transaction
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from database.models import Order, Notification
+from database.models import Order
+from database.notifications import notify
+from database.counters import record_view
+from database.ids import REFUND_PREFIX, TRANSACTION_PREFIX, new_id
+from database.idempotency import idempotent, new_idempotency_key
+from database.pagination import CursorPaginator
+from database.reservations import ReservationError, confirm_order
 from .models import PaymentMethod, PaymentTransaction, Refund, CustomerServiceTicket, CustomerServiceMessage, FAQ, PaymentAccount
-import uuid
 from datetime import datetime
 
 
@@ -21,6 +27,7 @@ def payment_methods(request):
 
 
 @login_required
+@idempotent
 def process_payment(request, order_id):
     """處理支付"""
     order = get_object_or_404(Order, pk=order_id, user=request.user)
@@ -33,35 +40,38 @@ def process_payment(request, order_id):
         payment_method_id = request.POST.get('payment_method')
         payment_method = get_object_or_404(PaymentMethod, pk=payment_method_id, is_active=True)
         
-        # 建立交易記錄
-        transaction_id = f"TXN{datetime.now().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
-        transaction = PaymentTransaction.objects.create(
-            order=order,
-            user=request.user,
-            payment_method=payment_method,
-            transaction_id=transaction_id,
-            amount=order.total_amount,
-            status='processing'
-        )
-        
-        # 模擬支付處理（實際應整合第三方支付API）
-        # 這裡簡化處理，直接標記為完成
-        transaction.status = 'completed'
-        transaction.completed_at = datetime.now()
-        transaction.save()
-        
-        # 更新訂單狀態
-        order.status = 'paid'
-        order.save()
-        
-        # 建立通知
-        from database.models import Notification
-        Notification.objects.create(
-            user=request.user,
-            type='payment',
-            title='付款成功',
-            message=f'您的訂單 {order.order_number} 付款成功，金額 {order.total_amount} 元'
-        )
+        # 扣除庫存、訂單改為已付款與交易記錄在同一交易中完成，任一步失敗時全部回滾
+        try:
+            with db_transaction.atomic():
+                confirm_order(order)
+                
+                # 建立交易記錄
+                transaction_id = new_id(TRANSACTION_PREFIX)
+                transaction = PaymentTransaction.objects.create(
+                    order=order,
+                    user=request.user,
+                    payment_method=payment_method,
+                    transaction_id=transaction_id,
+                    amount=order.total_amount,
+                    status='processing'
+                )
+                
+                # 模擬支付處理（實際應整合第三方支付API）
+                # 這裡簡化處理，直接標記為完成
+                transaction.status = 'completed'
+                transaction.completed_at = datetime.now()
+                transaction.save()
+                
+                # 建立通知
+                notify(
+                    request.user,
+                    type='payment',
+                    title='付款成功',
+                    message=f'您的訂單 {order.order_number} 付款成功，金額 {order.total_amount} 元'
+                )
+        except ReservationError as e:
+            messages.error(request, str(e))
+            return redirect('customer:order_detail', order_id=order_id)
         
         messages.success(request, '付款成功')
         return redirect('payment:payment_detail', transaction_id=transaction.id)
@@ -70,6 +80,7 @@ def process_payment(request, order_id):
     context = {
         'order': order,
         'methods': methods,
+        'idempotency_key': new_idempotency_key(),
     }
     return render(request, 'payment/process_payment.html', context)
 
@@ -87,12 +98,10 @@ def payment_detail(request, transaction_id):
 @login_required
 def transaction_history(request):
     """交易記錄"""
-    transactions = PaymentTransaction.objects.filter(user=request.user).order_by('-created_at')
+    transactions = PaymentTransaction.objects.filter(user=request.user).select_related('order', 'payment_method')
     
-    from django.core.paginator import Paginator
-    paginator = Paginator(transactions, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(transactions, 20)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'transactions': page_obj,
@@ -132,7 +141,7 @@ def request_refund(request, order_id):
             return redirect('customer:order_detail', order_id=order_id)
         
         # 建立退款記錄
-        refund_id = f"REF{datetime.now().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
+        refund_id = new_id(REFUND_PREFIX)
         refund = Refund.objects.create(
             payment_transaction=payment_transaction,
             order=order,
@@ -143,9 +152,8 @@ def request_refund(request, order_id):
         )
         
         # 建立通知
-        from database.models import Notification
-        Notification.objects.create(
-            user=request.user,
+        notify(
+            request.user,
             type='payment',
             title='退款申請已提交',
             message=f'您的退款申請 {refund_id} 已提交，我們將盡快處理'
@@ -202,6 +210,15 @@ def faq_list(request):
     return render(request, 'payment/faq_list.html', context)
 
 
+@login_required
+@require_POST
+def faq_viewed(request, faq_id):
+    """記錄常見問題瀏覽次數"""
+    faq = get_object_or_404(FAQ, pk=faq_id, is_active=True)
+    record_view(FAQ, faq.pk)
+    return JsonResponse({'success': True})
+
+
 @login_required
 def create_ticket(request):
     """建立客服工單"""
@@ -226,8 +243,8 @@ def create_ticket(request):
             status='open'
         )
         
-        Notification.objects.create(
-            user=request.user,
+        notify(
+            request.user,
             type='system',
             title='客服工單已建立',
             message=f'您的客服工單 #{ticket.id} 已建立，我們將盡快處理'
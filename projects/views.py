@@ -3,10 +3,11 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.forms import formset_factory, inlineformset_factory
-from django.db.models import Q
+from django.db.models import Count, Q
 from .models import Project, ProjectImage, Folder, Bookmark
 from .forms import ProjectForm, ProjectImageForm, FolderForm, BookmarkForm, UserEmailForm
 from django.contrib import messages
+from database.page_cache import conditional_anonymous_page
 
 # Create your views here.
 
@@ -80,6 +81,20 @@ def edit_project(request, pk):
     }
     return render(request, 'projects/project_form.html', context)
 
+def _project_detail_validators(request, pk):
+    # ETag 涵蓋頁面顯示的專案欄位、作者、收藏數與每張圖片（含換檔與代表圖設定）
+    project = (
+        Project.objects.filter(pk=pk)
+        .annotate(bookmark_count=Count('bookmarked_by'))
+        .values_list('updated_at', 'author__username', 'bookmark_count')
+        .first()
+    )
+    if project is None:
+        return None
+    images = list(ProjectImage.objects.filter(project_id=pk).order_by('id').values_list('id', 'image', 'is_key_image'))
+    return f'{project}|{images}'
+
+@conditional_anonymous_page(_project_detail_validators)
 def project_detail(request, pk):
     project = get_object_or_404(Project, pk=pk)
     key_images = project.images.filter(is_key_image=True).order_by('id')[:5] # Get up to 5 key images